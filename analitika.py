@@ -1,12 +1,8 @@
 # Импортируем библиотеки:
 import streamlit as st  # основной модуль для создания интерфейса Streamlit
-import pandas as pd     # библиотека для работы с таблицами и Excel-файлами
-import matplotlib.pyplot as plt  # библиотека для построения графиков (используется в дочерних модулях)
 
-# Импортируем функции анализа из отдельных файлов (модулей):
-from ch4_analysis import run as run_ch4     # Анализ СН₄
-from c3plus_calc import run as run_c3       # Анализ С₃+в
-from c5plus_calc import run as run_c5       # Анализ С₅+в
+from data_store import protocol_groups, store_revision, ingest_summary  # база протоколов: группы для фильтров, версия базы, отчёт о загрузках
+from figure_cache import selection_key  # отпечаток выбора для общего кэша графиков
 
 # Главная функция, которая запускает дашборд аналитики
 def run_analytics():
@@ -19,51 +15,73 @@ def run_analytics():
 
     # Если выбран режим "База данных":
     if mode == "База данных":
-        # Загружаем Excel-файл с данными (предполагается, что он лежит рядом)
-        df = pd.read_excel("grid.xlsx")
+        # Индекс групп Месторождение → ДНС → Ступень отбора из базы протоколов (строится один раз на версию базы)
+        index = protocol_groups()
 
-        # Словарь для хранения выбранных фильтров (месторождение, ДНС, ступень)
-        fields = {}
-        if "Месторождение" in df.columns:
-            # Если колонка есть, отображаем мультивыбор месторождений
-            fields['Месторождение'] = st.multiselect("Выберите месторождение:", df['Месторождение'].unique())
-        if "ДНС" in df.columns:
-            # Аналогично для ДНС
-            fields['ДНС'] = st.multiselect("Выберите ДНС:", df['ДНС'].unique())
-        if "Ступень отбора" in df.columns:
-            # Аналогично для ступени отбора
-            fields['Ступень отбора'] = st.multiselect("Выберите ступень отбора:", df['Ступень отбора'].unique())
+        # Отчёт о загрузках: сколько строк выгрузок отклонено проверкой и сколько повторов пропущено
+        history, rejected = ingest_summary()
+        skipped = int(history["rejected"].fillna(0).sum() + history["duplicates"].fillna(0).sum())
+        if skipped:
+            with st.expander(f"📥 Протоколов в базе: {int(history['added'].fillna(0).sum())}; "
+                             f"не загружено строк выгрузок: {skipped}"):
+                st.dataframe(history.drop(columns="id").rename(columns={
+                    "source": "Файл", "loaded_at": "Загружен", "added": "Добавлено",
+                    "duplicates": "Повторы", "rejected": "Отклонено"}), hide_index=True)
+                if len(rejected):
+                    st.dataframe(rejected, hide_index=True)
 
-        # Создаем копию исходного датафрейма для фильтрации
-        filtered_df = df.copy()
+        # Подписи мультивыбора для каждого уровня фильтра
+        labels = {
+            "Месторождение": "Выберите месторождение:",
+            "ДНС": "Выберите ДНС:",
+            "Ступень отбора": "Выберите ступень отбора:",
+        }
 
-        # Применяем фильтры по выбранным значениям
-        for key, values in fields.items():
-            if values:
-                # Оставляем только те строки, где значения соответствуют выбранным
-                filtered_df = filtered_df[filtered_df[key].isin(values)]
+        # Словарь для хранения выбранных фильтров (месторождение, ДНС, ступень).
+        # Варианты каждого следующего уровня берутся из индекса с учётом уже выбранных значений.
+        fields = {}
+        for level in index.levels:
+            fields[level] = st.multiselect(labels[level], index.options(level, fields))
 
-        # Сохраняем отфильтрованный датафрейм в сессию, чтобы использовать в других модулях
-        st.session_state["filtered_df"] = filtered_df
+        # В сессии храним только выбор и его отпечаток. Сами строки и производные величины модули анализа
+        # берут из общего для всех сессий кэша (data_store.select_grid / select_fractions),
+        # а графики — из кэша картинок по отпечатку.
+        st.session_state["filter_selection"] = fields
+        st.session_state["filter_key"] = selection_key(fields, store_revision())
 
-        # Блок с выбором типа анализа: СН₄, С₃+в, С₅+в
+        # Блок с выбором типа анализа: СН₄, С₃+в, С₅+в, динамика по датам протоколов
         st.write("## Выберите тип анализа:")
-        col1, col2, col3 = st.columns(3)  # Разбиваем на 3 колонки
+        col1, col2, col3, col4 = st.columns(4)  # Разбиваем на 4 колонки
 
-        # Кнопка запуска анализа СН₄
+        # Кнопки выбора анализа. Выбор запоминается в сессии: постраничная таблица результатов
+        # перезапускает страницу при листании и сортировке, и анализ должен остаться на экране.
         with col1:
             if st.button("Анализ СН₄"):
-                run_ch4()  # запускаем соответствующий модуль
-
-        # Кнопка запуска анализа С₃+в
+                st.session_state["analysis"] = "ch4"
         with col2:
             if st.button("Анализ С₃+в"):
-                run_c3()
-
-        # Кнопка запуска анализа С₅+в
+                st.session_state["analysis"] = "c3plus"
         with col3:
             if st.button("Анализ С₅+в"):
-                run_c5()
+                st.session_state["analysis"] = "c5plus"
+        with col4:
+            if st.button("Динамика"):
+                st.session_state["analysis"] = "trends"
+
+        # Модули анализа (и matplotlib) импортируются только при запуске анализа
+        analysis = st.session_state.get("analysis")
+        if analysis == "ch4":
+            from ch4_analysis import run as run_ch4
+            run_ch4()
+        elif analysis == "c3plus":
+            from c3plus_calc import run as run_c3
+            run_c3()
+        elif analysis == "c5plus":
+            from c5plus_calc import run as run_c5
+            run_c5()
+        elif analysis == "trends":
+            from trends_analysis import run as run_trends
+            run_trends()
 
     # Если выбран режим "Ручной ввод":
     elif mode == "Ручной ввод":
@@ -0,0 +1,263 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+# Масштабирование расчётных ядер на синтетических данных, без Streamlit:
+#  - fractions — агрегаты состава (С₃+в., С₅+в., молярная масса) по таблице протоколов;
+#  - ch4_bins — подсчёт CH₄ по интервалам гистограммы (и pd.cut + value_counts для сравнения);
+#  - methanol_demand — предельное влагосодержание по таблице насыщения и расход метанола по группам;
+#  - hydrate_risk — температура гидратообразования и концентрация метанола по составу каждой строки;
+#  - hydraulic_profile — профиль давления для N вариантов участка;
+#  - gas_properties — Z, плотность и вязкость одного состава в N точках (P, T) по таблице свойств;
+#  - route_length_* — протяжённость маршрута из N точек (как calculate_length карты трубопроводов),
+#    route_length_geopy — прежний поточечный расчёт geopy для сравнения;
+#  - nearest_segment — ближайшая точка маршрута из N точек для 1000 точек запроса (индекс строится до замера).
+# Для каждого размера — лучшее время из --repeat прогонов и пиковая память (tracemalloc, отдельный прогон),
+# а также контрольная сумма результата. python -m bench.kernels сравнивает всё с bench/kernels_baseline.json
+# и завершается с кодом 1 при росте времени или памяти больше допуска либо при изменении результата.
+# Обновить базовые значения: python -m bench.kernels --update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "bench", "kernels_baseline.json")
+SEED = 20240101
+RESULT_RTOL = 1e-6  # Допуск на контрольную сумму результата
+
+CH4_BINS = [0, 20, 40, 60, 70, 80, 90, 100]  # Интервалы гистограммы страницы «Анализ СН₄»
+GRID_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+ROUTE_SIZES = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6]
+VARIANT_SIZES = [10, 10 ** 2, 10 ** 3, 10 ** 4]
+NEAREST_QUERIES = 1000
+
+
+# ===== Синтетические данные =====
+
+def synthetic_grid(rows, seed=SEED):
+    # Таблица протоколов: компоненты в % об. (сумма 100), метан 70–98 %, ~2 % пропусков
+    from composition import COMPONENTS
+
+    rng = np.random.default_rng(seed)
+    heavy = rng.gamma(0.6, 1.0, size=(rows, len(COMPONENTS)))
+    methane = COMPONENTS.index("Метан")
+    heavy[:, methane] = 0
+    heavy *= (100 - rng.uniform(70, 98, rows))[:, None] / heavy.sum(axis=1, keepdims=True)
+    heavy[:, methane] = 100 - heavy.sum(axis=1)
+    heavy[rng.random(heavy.shape) < 0.02] = np.nan
+    return pd.DataFrame(heavy, columns=COMPONENTS)
+
+
+def synthetic_route(points, seed=SEED):
+    # Маршрут (широта, долгота) — случайное блуждание с шагом ~50–500 м в районе месторождений ХМАО
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.002, size=(points, 2)) + [0.001, 0.0015]
+    return np.cumsum(steps, axis=0) + [61.0, 73.0]
+
+
+def synthetic_conditions(groups, seed=SEED):
+    # Условия по группам в рабочей области страницы метанола
+    rng = np.random.default_rng(seed)
+    return {
+        "temperature": rng.uniform(0, 60, groups),
+        "pressure": rng.uniform(1, 10, groups),
+        "water": rng.uniform(0, 40, groups),
+        "flow": rng.uniform(1e4, 1e6, groups),
+        "density": rng.uniform(0.7, 1.1, groups),
+    }
+
+
+def synthetic_sections(variants, seed=SEED):
+    # Варианты участка: давление (МПа), расход (тыс. м³/сут), внутренний диаметр (м), длина (м)
+    rng = np.random.default_rng(seed)
+    return (rng.uniform(3, 8, variants), rng.uniform(200, 2000, variants),
+            rng.uniform(0.2, 0.7, variants), rng.uniform(1e3, 3e4, variants))
+
+
+# ===== Ядра: подготовка данных (не замеряется) и расчёт (замеряется) =====
+
+def _fractions(rows):
+    from composition import compute_fractions, C3PLUS, C5PLUS
+
+    df = synthetic_grid(rows)
+    return lambda: compute_fractions(df)[[C3PLUS, C5PLUS]].to_numpy()
+
+
+def _ch4_bins(rows):
+    from binning import interval_counts
+
+    values = synthetic_grid(rows)["Метан"].to_numpy()
+    return lambda: interval_counts(CH4_BINS, values)
+
+
+def _ch4_bins_pandas(rows):
+    values = synthetic_grid(rows)["Метан"]
+    return lambda: pd.cut(values, bins=CH4_BINS, include_lowest=True).value_counts(sort=False).to_numpy()
+
+
+def _methanol_demand(groups):
+    from humidity import saturation_table, saturation_water_content_array
+    from methanol_batch import methanol_demand
+
+    saturation_table()  # Таблица насыщения строится один раз на процесс — в замер не входит
+    c = synthetic_conditions(groups)
+
+    def run():
+        max_water = saturation_water_content_array(c["temperature"] + 273.15, c["pressure"] * 1e6)
+        return methanol_demand(c["water"], max_water, c["flow"], c["density"])["Метанол, л/сут"]
+    return run
+
+
+def _hydrate_risk(rows):
+    from hydrates import hydrate_risk, METHANOL_WT
+
+    df = synthetic_grid(rows)
+    pressure = synthetic_conditions(rows)["pressure"]
+    return lambda: hydrate_risk(df, pressure, 5.0)[METHANOL_WT].to_numpy()
+
+
+def _gas_properties(points):
+    from gas_properties import mole_fractions
+    from property_tables import properties
+
+    fractions = mole_fractions(synthetic_grid(1))[0]
+    c = synthetic_conditions(points)
+    return lambda: properties(fractions, c["pressure"], c["temperature"] + 273.15)["density"]
+
+
+def _hydraulic_profile(variants):
+    from hydraulics import solve_profile
+
+    pressure, flow, diameter, length = synthetic_sections(variants)
+    return lambda: solve_profile(pressure, flow, diameter, length, 20.0, 5.0)["pressure_out"]
+
+
+def _route_length(method):
+    def prepare(points):
+        from geodesy import segment_lengths
+
+        path = synthetic_route(points)
+        return lambda: segment_lengths(path, method).sum()
+    return prepare
+
+
+def _route_length_geopy(points):
+    from geopy.distance import geodesic
+
+    path = synthetic_route(points).tolist()
+    return lambda: sum(geodesic(path[i - 1], path[i]).km for i in range(1, len(path)))
+
+
+def _nearest_segment(points):
+    from spatial_index import SegmentIndex
+
+    path = synthetic_route(points)
+    index = SegmentIndex([path])
+    rng = np.random.default_rng(SEED)
+    query = path[rng.integers(0, points, NEAREST_QUERIES)] + rng.normal(0, 0.01, size=(NEAREST_QUERIES, 2))
+    return lambda: index.nearest(query[:, 0], query[:, 1])["along"]
+
+
+# Ядро → (подготовка, размеры по умолчанию, дополнительные размеры для --full)
+KERNELS = {
+    "fractions": (_fractions, GRID_SIZES, [10 ** 7]),
+    "ch4_bins": (_ch4_bins, GRID_SIZES, [10 ** 7]),
+    "ch4_bins_pandas": (_ch4_bins_pandas, GRID_SIZES, [10 ** 7]),
+    "methanol_demand": (_methanol_demand, GRID_SIZES, [10 ** 7]),
+    "hydrate_risk": (_hydrate_risk, GRID_SIZES, [10 ** 7]),
+    "gas_properties": (_gas_properties, GRID_SIZES, [10 ** 7]),
+    "hydraulic_profile": (_hydraulic_profile, VARIANT_SIZES, [10 ** 5]),
+    "route_length_geodesic": (_route_length("geodesic"), ROUTE_SIZES, []),
+    "route_length_haversine": (_route_length("haversine"), ROUTE_SIZES, []),
+    "route_length_geopy": (_route_length_geopy, ROUTE_SIZES[:3], [10 ** 5]),
+    "nearest_segment": (_nearest_segment, ROUTE_SIZES, []),
+}
+
+
+def checksum(result):
+    return float(np.nansum(np.asarray(result, dtype=float)))
+
+
+def measure(prepare, size, repeat=3):
+    # Лучшее время из repeat прогонов, пиковая память одного прогона (МиБ) и контрольная сумма
+    run = prepare(size)
+    result = run()  # Прогрев: ленивые импорты и кэши
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        run()
+        times.append(perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"time": min(times), "peak_mb": peak / 2 ** 20, "checksum": checksum(result)}
+
+
+def compare(result, base, tolerance):
+    # Причины регрессии относительно базовых значений (пустой список — всё в порядке)
+    failures = []
+    # Небольшой абсолютный запас на шум замера быстрых ядер
+    if result["time"] > base["time"] * (1 + tolerance) + 0.005:
+        failures.append(f"время {result['time']:.4f} с > {base['time']:.4f} с")
+    if result["peak_mb"] > base["peak_mb"] * (1 + tolerance) + 1:
+        failures.append(f"память {result['peak_mb']:.1f} МиБ > {base['peak_mb']:.1f} МиБ")
+    if not np.isclose(result["checksum"], base["checksum"], rtol=RESULT_RTOL, equal_nan=True):
+        failures.append(f"результат {result['checksum']:.6g} ≠ {base['checksum']:.6g}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время и память расчётных ядер на синтетических данных")
+    parser.add_argument("kernels", nargs="*", default=list(KERNELS), help="Что замерять (по умолчанию всё)")
+    parser.add_argument("--full", action="store_true",
+                        help="Добавить самые большие размеры (10⁷ строк таблицы, нужно ~8 ГБ памяти)")
+    parser.add_argument("--max-size", type=int, help="Пропустить размеры больше этого")
+    parser.add_argument("--repeat", type=int, default=3, help="Число замеров (берётся лучший)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимый рост времени и памяти, доля")
+    parser.add_argument("--update", action="store_true", help="Записать результат как базовый")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    failures = []
+    for name in args.kernels:
+        prepare, sizes, full_sizes = KERNELS[name]
+        for size in sizes + (full_sizes if args.full else []):
+            if args.max_size and size > args.max_size:
+                continue
+            result = measure(prepare, size, args.repeat)
+            base = baseline.get(name, {}).get(str(size))
+            line = f"{name:24s} {size:>9d} {result['time']:9.4f} с {result['peak_mb']:9.1f} МиБ"
+            if base:
+                line += f"  (базовое {base['time']:.4f} с, {base['peak_mb']:.1f} МиБ)"
+                failures += [f"{name} [{size}]: {reason}" for reason in compare(result, base, args.tolerance)]
+            print(line, flush=True)
+            baseline.setdefault(name, {})[str(size)] = {
+                "time": round(result["time"], 5), "peak_mb": round(result["peak_mb"], 2),
+                "checksum": result["checksum"]}
+
+    if "streamlit" in sys.modules:
+        failures.append("расчётные ядра загрузили streamlit")
+
+    if args.update:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"Базовые значения записаны в {BASELINE_PATH}")
+    elif failures:
+        print("Регрессия расчётных ядер:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import os
+import pickle
+import sys
+import tracemalloc
+
+import pandas as pd
+
+# Память на одну сессию страницы «Аналитика»: N сессий (AppTest) живут одновременно в одном процессе,
+# каждая выбирает месторождение и запускает анализ. Замеряется размер st.session_state каждой сессии
+# и прирост памяти процесса (tracemalloc) на сессию после прогрева общих кэшей.
+# Прирост включает служебные объекты AppTest (дерево элементов страницы), поэтому важен не он сам,
+# а его изменение; состояние сессии должно оставаться небольшим — python -m bench.session_memory
+# завершается с кодом 1, если оно больше --max-state.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = "import analitika\nanalitika.run_analytics()\n"
+ANALYSES = ["Анализ СН₄", "Анализ С₃+в", "Анализ С₅+в"]
+
+
+def value_size(value):
+    # Размер значения состояния: таблицы — по памяти колонок, остальное — по размеру pickle
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) \
+            else int(value.memory_usage(deep=True))
+    try:
+        return len(pickle.dumps(value))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+def state_size(app):
+    return sum(value_size(value) for value in app.session_state.to_dict().values())
+
+
+def open_session(number, fields):
+    # Сессия: выбор месторождения (по кругу) и запуск одного из анализов
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_string(SCRIPT, default_timeout=120).run()
+    app.multiselect[0].select(fields[number % len(fields)]).run()
+    label = ANALYSES[number % len(ANALYSES)]
+    next(button for button in app.button if button.label == label).click().run()
+    if app.exception:
+        raise RuntimeError(f"сессия {number}: {app.exception[0].message}")
+    return app
+
+
+def measure(sessions, fields_count):
+    os.chdir(ROOT)
+    sys.path.insert(0, ROOT)
+    from data_store import protocol_groups
+
+    fields = protocol_groups().options("Месторождение")[:fields_count]
+    # Прогрев: общие кэши (строки выбора, фракции, гистограммы) заполняются первыми сессиями
+    warm = [open_session(number, fields) for number in range(len(fields) * len(ANALYSES))]
+
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    apps = [open_session(number, fields) for number in range(sessions)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    sizes = [state_size(app) for app in apps]
+    largest = max(apps[sizes.index(max(sizes))].session_state.to_dict().items(),
+                  key=lambda item: value_size(item[1]))
+    del warm
+    return {
+        "sessions": sessions,
+        "state_mean": sum(sizes) / len(sizes),
+        "state_max": max(sizes),
+        "largest_key": largest[0],
+        "traced_per_session": (current - start) / sessions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Память на одну сессию страницы аналитики")
+    parser.add_argument("--sessions", type=int, default=8, help="Число одновременных сессий")
+    parser.add_argument("--fields", type=int, default=3, help="Сколько разных месторождений выбирают сессии")
+    parser.add_argument("--max-state", type=int, default=16 * 1024, help="Допустимый размер состояния сессии, байт")
+    args = parser.parse_args()
+
+    result = measure(args.sessions, args.fields)
+    print(f"Сессий: {result['sessions']}")
+    print(f"Состояние сессии: среднее {result['state_mean'] / 1024:.1f} КиБ, "
+          f"максимум {result['state_max'] / 1024:.1f} КиБ (больше всего — «{result['largest_key']}»)")
+    print(f"Прирост памяти процесса на сессию: {result['traced_per_session'] / 1024:.1f} КиБ")
+    if result["state_max"] > args.max_state:
+        print(f"Состояние сессии больше {args.max_state / 1024:.1f} КиБ")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Профиль холодного старта дашборда: время импорта модулей страниц и первой отрисовки home.py
+# в отдельном (чистом) интерпретаторе и список загруженных «тяжёлых» зависимостей.
+# Защита от регрессий: python -m bench.startup сравнивает результат с bench/startup_baseline.json
+# и завершается с кодом 1, если время выросло больше допуска или страница загрузила лишнее.
+# Обновить базовые значения: python -m bench.startup --update
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, "bench", "startup_baseline.json")
+
+# Зависимости, которые должны загружаться только страницей, где они нужны
+HEAVY_MODULES = ["CoolProp", "folium", "geopy", "xlsxwriter", "matplotlib.pyplot", "scipy"]
+
+# Цель замера → код, который выполняется в чистом интерпретаторе (время — только его)
+TARGETS = {
+    "home": "from streamlit.testing.v1 import AppTest\n"
+            "app = AppTest.from_file('home.py', default_timeout=60)\n"
+            "#START\n"
+            "app.run()\n",
+    "analitika": "#START\nimport analitika\n",
+    "gidravlika": "#START\nimport gidravlika\n",
+    "methanol": "#START\nimport methanol\n",
+    "methanol_batch": "#START\nimport methanol_batch\n",
+}
+
+_PROBE = """
+import json, sys, time
+{setup}
+before = set(sys.modules)
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {heavy!r} if name in sys.modules and name not in before]
+print(json.dumps({{"time": elapsed, "heavy": loaded}}))
+"""
+
+
+def measure(target, repeat=3):
+    # Лучшее из repeat замеров (каждый — новый процесс) и загруженные тяжёлые модули
+    setup, body = TARGETS[target].split("#START\n")
+    code = _PROBE.format(setup=setup, body=body, heavy=HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=ROOT, MPLBACKEND="Agg")
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError(f"{target}: {out.stderr.strip().splitlines()[-1] if out.stderr else out.returncode}")
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {"time": min(run["time"] for run in runs), "heavy": runs[0]["heavy"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время холодного старта страниц дашборда")
+    parser.add_argument("targets", nargs="*", default=list(TARGETS), help="Что замерять (по умолчанию всё)")
+    parser.add_argument("--repeat", type=int, default=3, help="Число замеров (берётся лучший)")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Допустимый рост времени, доля")
+    parser.add_argument("--update", action="store_true", help="Записать результат как базовый")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results, failures = {}, []
+    for target in args.targets:
+        result = measure(target, args.repeat)
+        results[target] = round(result["time"], 3)
+        extra = sorted(result["heavy"])
+        base = baseline.get(target)
+        line = f"{target:16s} {result['time']:7.3f} с"
+        if base:
+            line += f"  (базовое {base:.3f} с)"
+            # Небольшой абсолютный запас на шум замера быстрых импортов
+            if result["time"] > base * (1 + args.tolerance) + 0.05:
+                failures.append(f"{target}: {result['time']:.3f} с > {base:.3f} с")
+        if extra:
+            line += "  лишние зависимости: " + ", ".join(extra)
+            failures.append(f"{target}: загружены {', '.join(extra)}")
+        print(line)
+
+    if args.update:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"Базовые значения записаны в {BASELINE_PATH}")
+    elif failures:
+        print("Регрессия времени старта:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
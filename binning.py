@@ -0,0 +1,21 @@
+import numpy as np
+
+# Подсчёт значений по интервалам (a, b] — как pd.cut, но одним searchsorted и bincount.
+# Чистые функции без Streamlit: ими пользуются кэш гистограмм (figure_cache) и замеры bench.kernels.
+
+
+def interval_labels(edges):
+    return [f"{edges[i]:g}–{edges[i + 1]:g}" for i in range(len(edges) - 1)]
+
+
+def interval_counts(edges, values, include_lowest=True):
+    # Число значений в каждом интервале (a, b]; include_lowest — левая граница первого интервала включается.
+    # Пропуски и значения вне границ не считаются.
+    edges = np.asarray(edges, dtype=float)
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    position = np.searchsorted(edges, values, side="left")
+    if include_lowest:
+        position[values == edges[0]] = 1
+    inside = (position >= 1) & (position < len(edges))
+    return np.bincount(position[inside] - 1, minlength=len(edges) - 1)
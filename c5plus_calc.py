@@ -1,12 +1,14 @@
 import streamlit as st  # Импортируем библиотеку Streamlit для создания веб-приложения
-import matplotlib.pyplot as plt  # Импортируем библиотеку matplotlib для построения графиков
-import numpy as np  # Импортируем библиотеку NumPy для численных вычислений (не используется в коде)
-import pandas as pd  # Импортируем pandas для работы с таблицами
+
+from composition import missing_components, C5PLUS_COMPONENTS, C5PLUS
+from data_store import select_grid, select_fractions  # Общий кэш строк выбора и фракций состава
+from figure_cache import show_histogram  # Кэшированная отрисовка гистограмм
+from table_view import show_table  # Постраничный вывод таблиц
 
 def run():
-    # Получаем отфильтрованные данные из session_state
-    df = st.session_state.get("filtered_df", None)
-    if df is None or df.empty:
+    # Строки выбора из общего кэша (в session_state хранится только выбор фильтров)
+    df = select_grid(st.session_state.get("filter_selection"))
+    if df.empty:
         st.warning("Нет данных для анализа.")  # Предупреждение, если данных нет
         return
 
@@ -14,90 +16,42 @@ def run():
     st.info(f"🔢 Количество записей для анализа: {len(df)}")  # Вывод количества записей
 
     # Список компонентов, входящих в С₅+в.
-    components = ["и-Пентан", "н-Пентан", "Гексаны", "Гептаны", "Октаны"]
+    components = C5PLUS_COMPONENTS
 
     # Проверяем наличие всех компонентов в DataFrame
-    for comp in components:
-        if comp not in df.columns:
-            st.warning(f"Компонент {comp} не найден в данных.")  # Предупреждение, если компонент отсутствует
-            return
-
-    # Молярные массы (г/моль) для расчета массовой концентрации
-    molar_masses = {
-        "и-Пентан": 72.15,
-        "н-Пентан": 72.15,
-        "Гексаны": 86.18,
-        "Гептаны": 100.2,
-        "Октаны": 114.23
-    }
-
-    Vm = 0.022414  # м³/моль — молярный объём газа при нормальных условиях
-
-    # Расчет массовой концентрации каждого компонента (в г/м³)
-    for comp in components:
-        df[comp + "_g_m3"] = df[comp] / 100 * molar_masses[comp] / Vm  # Преобразуем объёмную долю в массовую концентрацию
+    for comp in missing_components(df, components):
+        st.warning(f"Компонент {comp} не найден в данных.")  # Предупреждение, если компонент отсутствует
+        return
 
-    # Суммируем массовые концентрации по всем компонентам → получаем С₅+в.
-    df["С5+в."] = df[[f"{c}_g_m3" for c in components]].sum(axis=1)  # Итоговое значение С₅+в.
+    # Массовая концентрация С₅+в. (г/м³) из общего кэша фракций выбора (одна копия на все сессии)
+    c5plus = select_fractions(st.session_state.get("filter_selection"))[C5PLUS]
 
     # 📈 Выводим базовую статистику по С₅+в.
     st.markdown("### 📈 Статистика по С₅+в.")
     col1, col2, col3 = st.columns(3)  # Создаем три колонки для вывода статистики
-    col1.metric("Среднее", f"{df['С5+в.'].mean():.2f} г/м³")  # Среднее значение
-    col2.metric("Максимум", f"{df['С5+в.'].max():.2f} г/м³")  # Максимальное значение
-    col3.metric("Минимум", f"{df['С5+в.'].min():.2f} г/м³")  # Минимальное значение
+    col1.metric("Среднее", f"{c5plus.mean():.2f} г/м³")  # Среднее значение
+    col2.metric("Максимум", f"{c5plus.max():.2f} г/м³")  # Максимальное значение
+    col3.metric("Минимум", f"{c5plus.min():.2f} г/м³")  # Минимальное значение
 
     # 📊 Горизонтальная гистограмма по интервалам (50, 100, 150 …)
     st.markdown("### 📊 Распределение концентрации С₅+в.")
 
     step = 50  # Шаг интервалов в г/м³
-    max_value = df["С5+в."].max()  # Находим максимальное значение
+    max_value = c5plus.max()  # Находим максимальное значение
     bins = list(range(0, int(max_value) + step, step))  # Формируем интервалы
 
-    # Группируем данные по интервалам (категоризируем значения)
-    df["interval"] = pd.cut(df["С5+в."], bins=bins)  # Разбиваем данные на интервалы
-
-    # Считаем количество записей в каждом интервале
-    counts = df["interval"].value_counts().sort_index()  # Считаем частоты интервалов
-
-    # Отфильтровываем пустые интервалы (где count == 0)
-    counts = counts[counts > 0]  # Убираем нулевые интервалы
-
-    # Строим горизонтальную гистограмму
-    fig, ax = plt.subplots(figsize=(10, 6))  # Создаем фигуру и ось для графика
-
-    for i, (interval, count) in enumerate(counts.items()):  # Для каждого интервала
-        label = f"{int(interval.left)}–{int(interval.right)}"  # Формируем подпись интервала
-        ax.barh(y=label, width=count, height=0.8, color='blue', edgecolor='black')  # Рисуем горизонтальный столбик
-        ax.text(count + 0.5, i, str(count), va='center', fontsize=10)  # Подписываем количество отборов
-
-    ax.set_title("Распределение содержания С₅+в. (г/м³)")  # Заголовок графика
-    ax.set_xlabel("Количество отборов")  # Подпись оси X
-    ax.set_ylabel("Интервалы С₅+в., г/м³")  # Подпись оси Y
-
-    st.pyplot(fig)  # Отображаем график в Streamlit
+    # Горизонтальная гистограмма по интервалам (нулевые интервалы убираются); подсчёт и картинка
+    # берутся из общего для всех сессий кэша по выбору фильтров и границам интервалов
+    show_histogram(C5PLUS, bins, c5plus, color="blue", edgecolor="black", height=0.8, figsize=(10, 6),
+                   fontsize=10, include_lowest=False,
+                   title="Распределение содержания С₅+в. (г/м³)",
+                   xlabel="Количество отборов", ylabel="Интервалы С₅+в., г/м³")
 
     # 🧾 Таблица с результатами
     display_cols = [col for col in ["Месторождение", "ДНС", "Ступень отбора", "Дата протокола"] if col in df.columns]  # Определяем доступные колонки для отображения
-    df_display = df[display_cols + components + ["С5+в."]].copy()  # Формируем таблицу для отображения
-    df_display["С5+в."] = df_display["С5+в."].round(2)  # Округляем значения С₅+в.
-
-    # Добавляем CSS для красивой таблицы
-    st.markdown("""
-        <style>
-            .scroll-free-table table {
-                width: 100% !important;
-                table-layout: auto !important;
-                border-collapse: collapse;
-            }
-            .scroll-free-table th, .scroll-free-table td {
-                text-align: left;
-                padding: 6px 10px;
-                font-size: 14px;
-                border: 1px solid #ddd;
-            }
-        </style>
-    """, unsafe_allow_html=True)
+    df_display = df[display_cols + components].assign(**{C5PLUS: c5plus.round(2)})  # Формируем таблицу для отображения с округлёнными С₅+в.
 
-    # Отображаем HTML-таблицу с данными
-    st.markdown(f'<div class="scroll-free-table">{df_display.to_html(index=False)}</div>', unsafe_allow_html=True)
\ No newline at end of file
+    # Постраничная таблица: в браузер передаётся только видимая страница, поиск и сортировка — на сервере
+    filter_key = st.session_state.get("filter_key")
+    show_table(df_display, key="c5plus_table", summary_columns=components + [C5PLUS],
+               data_key=f"{filter_key}:c5plus" if filter_key else None)
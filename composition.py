@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Расчёт фракций компонентного состава газа.
+# Таблица молярных масс хранится вектором, а все агрегаты (CH₄, C₂, С₃+в., С₅+в., молярная масса,
+# плотность при н.у.) считаются одним матричным произведением по блоку компонентов.
+# Исходная таблица не изменяется: результат возвращается отдельным DataFrame с тем же индексом.
+
+# Компоненты выгрузки (% об.) и их молярные массы, г/моль
+COMPONENTS = [
+    "Водород", "Гелий", "Кислород", "Азот", "Диоксид углерода",
+    "Метан", "Этан", "Пропан", "и-Бутан", "н-Бутан", "нео-Пентан", "и-Пентан", "н-Пентан",
+    "Гексаны", "Бензол", "Толуол", "Гептаны", "Октаны",
+]
+MOLAR_MASSES = np.array([
+    2.016, 4.003, 31.999, 28.013, 44.01,
+    16.043, 30.07, 44.1, 58.12, 58.12, 72.15, 72.15, 72.15,
+    86.18, 78.11, 92.14, 100.2, 114.23,
+])
+
+# Состав фракций С₃+в. и С₅+в. (как в исходных расчётах страниц анализа)
+C3PLUS_COMPONENTS = ["Пропан", "и-Бутан", "н-Бутан", "и-Пентан", "н-Пентан", "Гексаны", "Гептаны", "Октаны"]
+C5PLUS_COMPONENTS = ["и-Пентан", "н-Пентан", "Гексаны", "Гептаны", "Октаны"]
+
+Vm = 0.022414  # м³/моль — молярный объём газа при нормальных условиях
+
+# Названия колонок результата
+CH4 = "Метан (%)"
+C2 = "Этан (%)"
+C3PLUS = "С3+в."                       # г/м³
+C5PLUS = "С5+в."                       # г/м³
+MOLAR_MASS = "Молярная масса (г/моль)"
+DENSITY_NC = "Плотность н.у. (кг/м³)"
+
+
+def _weights(components):
+    # Вектор-маска компонентов фракции
+    return np.isin(COMPONENTS, components).astype(float)
+
+
+def _mass_weights(components):
+    # Перевод % об. в г/м³: (об.% / 100) * молярная масса / молярный объём
+    return _weights(components) * MOLAR_MASSES / 100 / Vm
+
+
+# Матрица весов: строки — компоненты, колонки — агрегаты. Последние две колонки —
+# числитель молярной массы (Σ xᵢ·Mᵢ) и сумма долей (Σ xᵢ) для нормировки состава.
+_AGGREGATES = [CH4, C2, C3PLUS, C5PLUS]
+_WEIGHTS = np.column_stack([
+    _weights(["Метан"]),
+    _weights(["Этан"]),
+    _mass_weights(C3PLUS_COMPONENTS),
+    _mass_weights(C5PLUS_COMPONENTS),
+    MOLAR_MASSES,
+    np.ones(len(COMPONENTS)),
+])
+
+
+def missing_components(df, components=COMPONENTS):
+    # Компоненты, которых нет в таблице
+    return [comp for comp in components if comp not in df.columns]
+
+
+def component_matrix(df):
+    # Блок компонентов (строки × COMPONENTS), отсутствующие колонки — нули
+    matrix = np.zeros((len(df), len(COMPONENTS)))
+    for i, comp in enumerate(COMPONENTS):
+        if comp in df.columns:
+            matrix[:, i] = pd.to_numeric(df[comp], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    return matrix
+
+
+def compute_fractions(df):
+    # Все агрегаты состава для каждой строки одним произведением (строки × компоненты) @ (компоненты × агрегаты)
+    matrix = component_matrix(df)
+    known = ~np.isnan(matrix)
+    totals = np.nan_to_num(matrix) @ _WEIGHTS
+
+    # Агрегат, у которого в строке нет ни одного заполненного компонента, — пропуск, а не ноль
+    present = known.astype(float) @ (_WEIGHTS != 0)
+    totals[present == 0] = np.nan
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        molar_mass = totals[:, 4] / totals[:, 5]
+
+    result = pd.DataFrame(totals[:, :4], columns=_AGGREGATES, index=df.index)
+    result[MOLAR_MASS] = molar_mass
+    result[DENSITY_NC] = molar_mass / (Vm * 1000)  # кг/м³: М (г/моль) / 22.414 (л/моль)
+    return result
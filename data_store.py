@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import threading
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+from composition import compute_fractions
+from grid_index import GridIndex
+from instrumentation import cached, timed
+import protocol_store
+
+# Слой доступа к таблице протоколов (лист 'dhtmlxGrid').
+# Основной источник — хранилище протоколов (protocol_store, SQLite): страницы берут из него группы
+# для фильтров и строки по выбору (запрос по индексу), а вся таблица читается один раз на версию базы.
+# Строки выбора и производные величины (фракции состава) хранятся в общем для сессий кэше,
+# в состоянии сессии остаётся только сам выбор.
+# Пустая база при первом запуске заполняется выгрузкой GRID_PATH.
+# Отдельный файл Excel (явный source) разбирается один раз, дальше читается из колоночного кэша
+# на диске (Parquet). Внутри процесса хранится один общий экземпляр, который страницы используют только для чтения.
+
+GRID_PATH = "grid.xlsx"        # Таблица протоколов по умолчанию (лежит рядом с приложением)
+GRID_SHEET = "dhtmlxGrid"      # Лист выгрузки из лабораторной системы
+CACHE_DIR = ".cache"           # Каталог для колоночных копий
+CACHE_FORMAT = 1               # Версия формата кэша: увеличиваем при изменении подготовки таблицы
+CACHE_KEEP = 8                 # Сколько колоночных копий хранить на диске
+SELECTION_ENTRIES = 64         # Сколько разных выборов (и их производных величин) держать в общем кэше
+
+_seed_lock = threading.Lock()  # Первичное заполнение базы — один раз на процесс, а не в каждой сессии
+
+CATEGORY_COLUMNS = ["Месторождение", "ДНС", "Ступень отбора"]  # Колонки фильтров → category
+DATE_COLUMNS = ["Дата протокола", "Дата приема пробы"]           # Даты в выгрузке хранятся строками ДД.ММ.ГГГГ
+
+
+def _sha1_file(path):
+    # Хэш содержимого файла (читаем блоками, чтобы не держать весь файл в памяти)
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path):
+    # Отпечаток исходного файла. Пока mtime и размер совпадают с сохранёнными, хэш не пересчитывается;
+    # если файл изменился, хэш считается заново и кэш пересобирается автоматически.
+    stat = os.stat(path)
+    meta_path = os.path.join(CACHE_DIR, os.path.basename(path) + ".meta.json")
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["mtime_ns"] == stat.st_mtime_ns and meta["size"] == stat.st_size:
+            return meta["sha1"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    sha1 = _sha1_file(path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": sha1}, f)
+    return sha1
+
+
+def prepare_grid(df):
+    # Типизация таблицы: колонки фильтров — категории, даты — datetime
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], format="%d.%m.%Y", errors="coerce")
+    return df
+
+
+def _cache_path(digest, sheet_name):
+    return os.path.join(CACHE_DIR, f"grid-{digest}-{sheet_name}-v{CACHE_FORMAT}.parquet")
+
+
+def _read_columnar(path):
+    try:
+        return pd.read_parquet(path)
+    except ImportError:
+        # Без pyarrow/fastparquet держим копию в pickle — тоже без разбора Excel
+        return pd.read_pickle(path)
+
+
+def _write_columnar(df, path):
+    tmp_path = path + ".tmp"
+    try:
+        df.to_parquet(tmp_path, index=False)
+    except ImportError:
+        df.to_pickle(tmp_path)
+    os.replace(tmp_path, path)  # Атомарная замена: параллельные сессии не увидят недописанный файл
+
+
+def _cleanup_cache():
+    # Удаляем самые старые колоночные копии, оставляя CACHE_KEEP последних
+    files = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR)
+             if name.startswith("grid-") and name.endswith(".parquet")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[CACHE_KEEP:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@cached("data_store.load_excel", st.cache_resource(max_entries=CACHE_KEEP, show_spinner="Загрузка таблицы протоколов..."))
+def _load_cached(digest, sheet_name, _source):
+    # Один общий экземпляр таблицы на процесс для каждого отпечатка исходного файла
+    path = _cache_path(digest, sheet_name)
+    if os.path.exists(path):
+        return _read_columnar(path)
+
+    df = prepare_grid(pd.read_excel(_source, sheet_name=sheet_name))
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    _write_columnar(df, path)
+    _cleanup_cache()
+    return df
+
+
+def _resolve(source):
+    # Отпечаток источника и объект для чтения: путь к xlsx или загруженный файл (st.file_uploader)
+    if isinstance(source, (str, os.PathLike)):
+        return file_fingerprint(source), source
+    data = source.getvalue()
+    return hashlib.sha1(data).hexdigest(), BytesIO(data)
+
+
+def load_grid(source=None, sheet_name=GRID_SHEET):
+    # Возвращает таблицу протоколов (по умолчанию — всю базу, иначе — файл source). Результат общий
+    # для всех сессий: изменять его нельзя, производные колонки считаются в копиях.
+    if source is None:
+        return _store_cached(store_revision(), protocol_store.STORE_PATH)
+    digest, readable = _resolve(source)
+    return _load_cached(digest, sheet_name, _source=readable)
+
+
+@st.cache_resource(max_entries=CACHE_KEEP)
+def _index_cached(digest, sheet_name, _df):
+    return GridIndex(_df)
+
+
+def load_grid_index(source=None, sheet_name=GRID_SHEET):
+    # Таблица протоколов и её индекс Месторождение → ДНС → Ступень отбора (строится один раз на набор данных)
+    if source is None:
+        digest = store_revision()
+        df = _store_cached(digest, protocol_store.STORE_PATH)
+        return df, _index_cached(digest, protocol_store.STORE_PATH, _df=df)
+    digest, readable = _resolve(source)
+    df = _load_cached(digest, sheet_name, _source=readable)
+    return df, _index_cached(digest, sheet_name, _df=df)
+
+
+@timed("data_store.store_revision")
+def store_revision(path=protocol_store.STORE_PATH):
+    # Версия базы протоколов — ключ всех кэшей, построенных по её содержимому.
+    # Пустая база (первый запуск) заполняется выгрузкой по умолчанию.
+    # Отчёт о заполнении (отклонённые строки) сохраняется в базе — см. ingest_summary.
+    revision = protocol_store.revision(path)
+    if revision.startswith(("empty", "0:")) and os.path.exists(GRID_PATH):
+        with _seed_lock:
+            revision = protocol_store.revision(path)
+            if revision.startswith(("empty", "0:")):
+                protocol_store.ingest_file(GRID_PATH, path)  # Файл, уже загруженный другим процессом, пропускается
+                revision = protocol_store.revision(path)
+    return revision
+
+
+@cached("data_store.load_store", st.cache_resource(max_entries=CACHE_KEEP, show_spinner="Загрузка протоколов из базы..."))
+def _store_cached(revision, path):
+    return protocol_store.query(path=path)
+
+
+@cached("data_store.groups", st.cache_resource(max_entries=CACHE_KEEP))
+def _groups_cached(revision, path):
+    return GridIndex(protocol_store.groups(path))
+
+
+def protocol_groups(path=protocol_store.STORE_PATH):
+    # Индекс групп Месторождение → ДНС → Ступень отбора для выпадающих списков (без чтения строк протоколов)
+    return _groups_cached(store_revision(path), path)
+
+
+@cached("data_store.ingest_log", st.cache_data(max_entries=CACHE_KEEP))
+def _ingest_log_cached(revision, path):
+    return protocol_store.ingest_log(path)
+
+
+def ingest_summary(path=protocol_store.STORE_PATH):
+    # История загрузок в базу и отклонённые при загрузке строки (для отчёта на страницах)
+    return _ingest_log_cached(store_revision(path), path)
+
+
+def _selection_json(selection):
+    # Выбор в виде строки-ключа кэша: только заполненные уровни, значения отсортированы
+    normalized = {level: sorted((None if pd.isna(value) else str(value) for value in values), key=str)
+                  for level, values in (selection or {}).items() if values}
+    return json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+
+
+@cached("data_store.select", st.cache_resource(max_entries=SELECTION_ENTRIES, show_spinner=False))
+def _select_cached(revision, path, selection):
+    selection = json.loads(selection)
+    if not selection:
+        return _store_cached(revision, path)
+    return protocol_store.query(selection, path=path)
+
+
+@cached("data_store.fractions", st.cache_resource(max_entries=SELECTION_ENTRIES, show_spinner=False))
+def _fractions_cached(revision, path, selection):
+    return compute_fractions(_select_cached(revision, path, selection))
+
+
+def select_grid(selection=None, path=protocol_store.STORE_PATH):
+    # Протоколы по выбору {уровень: значения} — запрос к базе по индексу групп; пустой выбор — вся база.
+    # Один общий объект на процесс для одинакового выбора: изменять нельзя, колонки добавляются в копиях.
+    return _select_cached(store_revision(path), path, _selection_json(selection))
+
+
+def select_fractions(selection=None, path=protocol_store.STORE_PATH):
+    # Фракции состава (composition.compute_fractions) для строк выбора — общий кэш, строки те же, что у select_grid
+    return _fractions_cached(store_revision(path), path, _selection_json(selection))
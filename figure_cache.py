@@ -0,0 +1,68 @@
+import hashlib
+import json
+from io import BytesIO
+
+import pandas as pd
+import streamlit as st
+
+from binning import interval_counts, interval_labels
+from instrumentation import cached
+
+# Общий для всех сессий кэш гистограмм состава газа.
+# Подсчёт по интервалам и готовая картинка (PNG/SVG) кэшируются по отпечатку выборки
+# (файл протоколов + выбранные фильтры) и границам интервалов: одинаковый выбор разных
+# пользователей рисуется один раз. Фигуры строятся через matplotlib.figure.Figure без pyplot,
+# поэтому не регистрируются в глобальном списке фигур и освобождаются сразу после сохранения.
+
+FIGURE_DPI = 200          # Как у st.pyplot
+CACHE_ENTRIES = 256       # Сколько разных выборок держать в кэше
+
+
+def selection_key(selection, source=""):
+    # Отпечаток выборки: источник данных (например, хэш файла) + выбранные значения фильтров
+    normalized = {level: sorted(str(value) for value in values) for level, values in selection.items()}
+    payload = json.dumps([source, normalized], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def values_key(values):
+    # Отпечаток по самим значениям — когда выборка пришла не со страницы аналитики
+    return hashlib.sha1(pd.util.hash_pandas_object(pd.Series(values), index=False).values.tobytes()).hexdigest()
+
+
+@cached("figure_cache.binned_counts", st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False))
+def binned_counts(key, edges, _values, include_lowest=True):
+    # Число значений по интервалам (a, b] (как pd.cut); пустые интервалы убираются.
+    # Ключ кэша — key и edges; сами значения (_values) не хэшируются.
+    counts = interval_counts(edges, _values, include_lowest)
+    labels = interval_labels(edges)
+    return [label for label, count in zip(labels, counts) if count], [int(count) for count in counts if count]
+
+
+@cached("figure_cache.histogram_image", st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False))
+def histogram_image(key, edges, _values, title, xlabel, ylabel, color="blue", edgecolor=None, height=0.8,
+                    figsize=(10, 5), fontsize=9, include_lowest=True, fmt="png"):
+    # Горизонтальная гистограмма по интервалам; возвращает байты картинки (png или svg)
+    from matplotlib.figure import Figure
+
+    labels, counts = binned_counts(key, edges, _values, include_lowest)
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
+    ax.barh(labels, counts, height=height, color=color, edgecolor=edgecolor)
+    for i, count in enumerate(counts):
+        ax.text(count + 0.5, i, str(count), va="center", fontsize=fontsize)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=FIGURE_DPI, bbox_inches="tight")
+    fig.clear()
+    return buffer.getvalue()
+
+
+def show_histogram(name, edges, values, **style):
+    # Гистограмма выборки из st.session_state (ключ фильтра страницы аналитики) + имя величины
+    key = st.session_state.get("filter_key") or values_key(values)
+    image = histogram_image(f"{key}:{name}", tuple(float(edge) for edge in edges), values, **style)
+    st.image(image, width="stretch")
@@ -0,0 +1,122 @@
+import numpy as np
+
+from composition import component_matrix
+
+# Свойства природного газа по компонентному составу: псевдокритические параметры, коэффициент
+# сжимаемости Z и вязкость. Все функции работают с числами и массивами (broadcast).
+
+R = 8.314462618          # Универсальная газовая постоянная, Дж/(моль·К)
+M_AIR = 28.964           # Молярная масса воздуха, г/моль
+T_STD = 293.15           # Стандартные условия (ГОСТ 2939): 20 °C
+P_STD = 101325.0         # ... и 101.325 кПа
+
+# Критические температуры (К) и давления (МПа) компонентов, в порядке composition.COMPONENTS
+CRITICAL_T = np.array([
+    33.19, 5.19, 154.58, 126.19, 304.13,
+    190.56, 305.32, 369.83, 407.8, 425.12, 433.8, 460.4, 469.7,
+    507.6, 562.05, 591.75, 540.2, 568.7,
+])
+CRITICAL_P = np.array([
+    1.313, 0.227, 5.043, 3.396, 7.377,
+    4.599, 4.872, 4.248, 3.640, 3.796, 3.196, 3.380, 3.370,
+    3.025, 4.895, 4.108, 2.740, 2.490,
+])
+
+
+def mole_fractions(df):
+    # Мольные доли компонентов (строки × COMPONENTS), нормированные на сумму; пропуски — нули
+    matrix = np.nan_to_num(component_matrix(df))
+    totals = matrix.sum(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(totals > 0, matrix / totals, np.nan)
+
+
+def pseudo_critical(fractions):
+    # Псевдокритические T (К) и P (МПа) смеси по правилу Кея; fractions — (..., компоненты)
+    fractions = np.asarray(fractions, dtype=float)
+    return fractions @ CRITICAL_T, fractions @ CRITICAL_P
+
+
+def pseudo_critical_from_gravity(gravity):
+    # Псевдокритические T (К) и P (МПа) по относительной плотности газа (корреляция Саттона)
+    gravity = np.asarray(gravity, dtype=float)
+    Tpc_R = 169.2 + 349.5 * gravity - 74.0 * gravity ** 2     # °R
+    Ppc_psi = 756.8 - 131.0 * gravity - 3.6 * gravity ** 2    # psia
+    return Tpc_R * 5 / 9, Ppc_psi * 0.00689476
+
+
+def molar_mass_from_density(density_std):
+    # Молярная масса (г/моль) по плотности газа при стандартных условиях (кг/м³)
+    return np.asarray(density_std, dtype=float) * R * T_STD / P_STD * 1000
+
+
+def z_factor(P_MPa, T_K, Tpc, Ppc):
+    # Коэффициент сжимаемости по формуле Папея (приведённые давление до ~15, температура 1.05–3)
+    Ppr = np.asarray(P_MPa, dtype=float) / Ppc
+    Tpr = np.asarray(T_K, dtype=float) / Tpc
+    return 1 - 3.52 * Ppr / 10 ** (0.9813 * Tpr) + 0.274 * Ppr ** 2 / 10 ** (0.8157 * Tpr)
+
+
+def gas_density(P_MPa, T_K, molar_mass, Z):
+    # Плотность реального газа, кг/м³
+    return np.asarray(P_MPa) * 1e6 * np.asarray(molar_mass) / 1000 / (np.asarray(Z) * R * np.asarray(T_K))
+
+
+# Коэффициенты уравнения Дранчука — Абу-Кассема (аппроксимация диаграммы Стэндинга — Катца)
+_DAK = [0.3265, -1.0700, -0.5339, 0.01569, -0.05165, 0.5475, -0.7361, 0.1844, 0.1056, 0.6134, 0.7210]
+DAK_RHO_MAX = 3.0    # Верхняя граница приведённой плотности
+DAK_SCAN = 60        # Узлов сетки при поиске отрезка с корнем
+
+
+def _dak_residual(rho, C1, C2, C3, C4, target):
+    # Невязка уравнения Дранчука — Абу-Кассема по приведённой плотности и её производная
+    A11 = _DAK[10]
+    e = np.exp(-A11 * rho ** 2)
+    F = 1 + C1 * rho + C2 * rho ** 2 - C3 * rho ** 5 + C4 * rho ** 2 * (1 + A11 * rho ** 2) * e - target / rho
+    dF = (C1 + 2 * C2 * rho - 5 * C3 * rho ** 4
+          + C4 * e * (2 * rho + 2 * A11 * rho ** 3 - 2 * A11 ** 2 * rho ** 5) + target / rho ** 2)
+    return F, dF
+
+
+def z_factor_dak(P_MPa, T_K, Tpc, Ppc, iterations=40):
+    # Коэффициент сжимаемости по Дранчуку — Абу-Кассему (приведённые давление до 30, температура 1–3).
+    # Уравнение для приведённой плотности решается сразу для всего массива. При Tpr < 1 (жирные газы)
+    # у него несколько корней: берётся наименьший (газовая фаза) — его отрезок находится перебором
+    # по сетке плотностей, дальше метод Ньютона с запасным делением отрезка пополам.
+    A1, A2, A3, A4, A5, A6, A7, A8, A9, A10, A11 = _DAK
+    Ppr = np.asarray(P_MPa, dtype=float) / Ppc
+    Tpr = np.asarray(T_K, dtype=float) / Tpc
+    Ppr, Tpr = np.broadcast_arrays(Ppr, Tpr)
+    C1 = A1 + A2 / Tpr + A3 / Tpr ** 3 + A4 / Tpr ** 4 + A5 / Tpr ** 5
+    C2 = A6 + A7 / Tpr + A8 / Tpr ** 2
+    C3 = A9 * (A7 / Tpr + A8 / Tpr ** 2)
+    C4 = A10 / Tpr ** 3
+    target = 0.27 * Ppr / Tpr
+
+    # Первая смена знака невязки на сетке плотностей 0…DAK_RHO_MAX
+    grid = np.linspace(0.0, DAK_RHO_MAX, DAK_SCAN + 1)[1:]
+    F, _ = _dak_residual(grid, *(np.asarray(c)[..., None] for c in (C1, C2, C3, C4, target)))
+    first = np.argmax(F >= 0, axis=-1)
+    first = np.where((F >= 0).any(axis=-1), first, DAK_SCAN - 1)
+    lo = np.where(first > 0, grid[first - 1], 1e-9)
+    hi = grid[first]
+
+    rho = np.clip(target, lo, hi)  # Начальное приближение — идеальный газ (Z = 1), если он в отрезке
+    for _ in range(iterations):
+        F, dF = _dak_residual(rho, C1, C2, C3, C4, target)
+        lo = np.where(F < 0, rho, lo)
+        hi = np.where(F < 0, hi, rho)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            step = rho - F / dF
+        rho = np.where((step > lo) & (step < hi), step, (lo + hi) / 2)
+    return target / rho
+
+
+def viscosity_lge(T_K, density, molar_mass):
+    # Динамическая вязкость газа по Ли — Гонсалесу — Икину, Па·с (плотность — кг/м³ при тех же P и T)
+    T_R = np.asarray(T_K, dtype=float) * 1.8
+    M = np.asarray(molar_mass, dtype=float)
+    K = (9.379 + 0.01607 * M) * T_R ** 1.5 / (209.2 + 19.26 * M + T_R)
+    X = 3.448 + 986.4 / T_R + 0.01009 * M
+    Y = 2.447 - 0.2224 * X
+    return 1e-4 * K * np.exp(X * (np.asarray(density, dtype=float) / 1000) ** Y) * 1e-3
@@ -0,0 +1,102 @@
+import numpy as np
+
+from instrumentation import timed
+
+# Векторный расчёт длин маршрутов по координатам (широта, долгота в градусах).
+# Все отрезки всех маршрутов считаются одной операцией над массивами.
+# Режимы: "geodesic" — формула Винсенти на эллипсоиде WGS-84 (точность уровня geopy.geodesic),
+#          "haversine" — быстрая формула гаверсинусов на сфере (погрешность до ~0.5 %).
+
+WGS84_A = 6378137.0                 # Большая полуось, м
+WGS84_F = 1 / 298.257223563         # Сжатие
+WGS84_B = WGS84_A * (1 - WGS84_F)   # Малая полуось, м
+EARTH_RADIUS_KM = 6371.0088         # Средний радиус Земли для сферической формулы
+
+METHODS = ["geodesic", "haversine"]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    # Расстояние по большому кругу, км
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=float)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def vincenty(lat1, lon1, lat2, lon2, max_iter=100, tol=1e-12):
+    # Обратная задача Винсенти на эллипсоиде WGS-84, км. Итерации выполняются сразу для всего массива;
+    # для редких несошедшихся пар (почти антиподальные точки) используется geopy.geodesic (Карни).
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(*(np.atleast_1d(np.asarray(v, dtype=float))
+                                                   for v in (lat1, lon1, lat2, lon2)))
+    f = WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1, sinU2, cosU2 = np.sin(U1), np.cos(U1), np.sin(U2), np.cos(U2)
+
+    lam = L.copy()
+    active = np.ones(L.shape, dtype=bool)
+    sin_sigma = cos_sigma = sigma = cos2_alpha = cos_2sigma_m = np.zeros(L.shape)
+    for _ in range(max_iter):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.sqrt((cosU2 * sin_lam) ** 2 + (cosU1 * sinU2 - sinU1 * cosU2 * cos_lam) ** 2)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sin_alpha = np.where(sin_sigma > 0, cosU1 * cosU2 * sin_lam / sin_sigma, 0.0)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha > 0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha, 0.0)
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_new = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        active = np.abs(lam_new - lam) > tol
+        lam = lam_new
+        if not active.any():
+            break
+
+    u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distance = WGS84_B * A * (sigma - delta_sigma) / 1000
+
+    if active.any():
+        from geopy.distance import geodesic
+        for idx in zip(*np.nonzero(active)):
+            distance[idx] = geodesic((lat1[idx], lon1[idx]), (lat2[idx], lon2[idx])).km
+    return distance
+
+
+def segment_lengths(coords, method="geodesic"):
+    # Длины отрезков между соседними точками массива coords[n, 2] (широта, долгота), км
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) < 2:
+        return np.zeros(0)
+    distance = vincenty if method == "geodesic" else haversine
+    return distance(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+
+
+@timed("geodesy.cumulative_lengths")
+def cumulative_lengths(paths, method="geodesic"):
+    # Накопленная длина вдоль каждого маршрута (массив длиной len(path), первый элемент 0), км.
+    # Координаты всех маршрутов склеиваются, отрезки считаются одним вызовом,
+    # а «отрезки» между концом одного маршрута и началом следующего отбрасываются.
+    arrays = [np.asarray(path, dtype=float).reshape(-1, 2) for path in paths]
+    if not arrays:
+        return []
+    sizes = np.array([len(a) for a in arrays])
+    lengths = segment_lengths(np.concatenate(arrays), method)
+
+    result = []
+    start = 0
+    for size in sizes:
+        route = lengths[start:start + max(size - 1, 0)]
+        result.append(np.concatenate(([0.0], np.cumsum(route))) if size else np.zeros(0))
+        start += size
+    return result
+
+
+def route_length(path, method="geodesic"):
+    # Полная длина одного маршрута, км
+    return float(segment_lengths(path, method).sum())
@@ -1,11 +1,135 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
 
-@st.cache_data
+from hydraulics import solve_profile, evaluate_sections, FRICTION_METHODS
+from hydraulic_sweep import sweep, capacity, OUTPUT_NAMES, MAX_VARIANTS
+from instrumentation import cached, stage
+from gas_properties import mole_fractions
+from property_tables import properties, standard_density, in_domain
+
+@cached("gidravlika.load_data", st.cache_data)
 def load_data():
     return pd.read_excel("pipe.xlsx", sheet_name="pipe")
 
+@cached("gidravlika.region_network", st.cache_resource)
+def region_network(region):
+    # Граф сети региона (неизменяемый) — общий для всех сессий
+    from pipe_network import build_network
+    return build_network(load_data(), region)
+
+def network_solver(region, density, t_gas, roughness, composition=None):
+    # Решатель хранит предыдущее решение и LU-разложение матрицы Якоби, поэтому он свой у каждой сессии
+    # (st.session_state): при изменении только подач и давлений в узлах расчёт начинается с прошлого решения.
+    # composition — кортеж мольных долей протокола (Z и вязкость по таблице свойств) или None
+    from pipe_network import NetworkSolver
+    params = (region, density, t_gas, roughness, composition)
+    stored = st.session_state.get("network_solver")
+    if stored is None or stored[0] != params:
+        stored = st.session_state["network_solver"] = (params, NetworkSolver(
+            region_network(region), density=density, t_gas=t_gas, roughness=roughness,
+            **gas_options(composition)))
+    return stored[1]
+
+def gas_options(composition):
+    # Параметры газа для расчётов по составу протокола: Z и вязкость — по таблице свойств состава
+    if composition is None:
+        return {}
+    return dict(composition=np.array(composition), viscosity=None)
+
+@cached("gidravlika.response_surface", st.cache_data(max_entries=16))
+def response_surface(diameter, length, pressure_range, flow_range, t_range, t_soil, density, roughness, friction,
+                     isothermal, composition=None):
+    # Поверхность отклика участка на сетке (давление × расход × температура газа); диапазоны —
+    # кортежи (от, до, точек). Срезы по температуре и давлению берутся из кэша без пересчёта.
+    axes = [np.linspace(start, stop, int(count)) for start, stop, count in (pressure_range, flow_range, t_range)]
+    return sweep(diameter, length, *axes, t_soil=t_soil, density=density, roughness=roughness,
+                 friction=friction, isothermal=isothermal, **gas_options(composition))
+
+def range_input(label, start, stop, count, key):
+    # Диапазон значений: от, до, число точек
+    col1, col2, col3 = st.columns(3)
+    start = col1.number_input(f"{label}: от", value=start, key=f"{key}_start")
+    stop = col2.number_input(f"{label}: до", value=stop, key=f"{key}_stop")
+    count = col3.number_input(f"{label}: точек", min_value=1, max_value=500, value=count, key=f"{key}_count")
+    return float(start), float(stop), int(count)
+
+def run_sweep_calc(diameter_m, length, t_soil, density, options):
+    # Сценарный расчёт участка: сетка режимов вместо одной точки
+    st.subheader("📈 Сценарный расчёт участка")
+    pressure_range = range_input("Давление (МПа)", 0.7, 5.0, 40, "sweep_pressure")
+    flow_range = range_input("Расход (тыс. м³/сут)", 100.0, 3000.0, 60, "sweep_flow")
+    t_range = range_input("Температура газа (°C)", 10.0, 40.0, 4, "sweep_t_gas")
+    variants = pressure_range[2] * flow_range[2] * t_range[2]
+    st.caption(f"Вариантов: {variants:,}".replace(",", " "))
+    too_large = variants > MAX_VARIANTS
+    if too_large:
+        st.error(f"❌ Слишком большая сетка: не больше {MAX_VARIANTS:,} вариантов — уменьшите число точек".replace(",", " "))
+
+    if st.button("📈 Рассчитать сетку режимов", disabled=too_large):
+        st.session_state["sweep_params"] = (diameter_m, float(length), pressure_range, flow_range, t_range,
+                                            t_soil, density, options["roughness"], options["friction"],
+                                            options["isothermal"], options["composition"])
+    params = st.session_state.get("sweep_params")
+    if params is None:
+        return
+    if params[:2] != (diameter_m, float(length)):
+        st.info("Сетка режимов рассчитана для другого участка — нажмите кнопку для пересчёта")
+        return
+
+    with st.spinner("Расчёт сетки режимов..."):
+        surface = response_surface(*params)
+
+    # Срезы поверхности: выбор температуры, величины и предела — без пересчёта
+    output = st.radio("Величина:", list(OUTPUT_NAMES), format_func=OUTPUT_NAMES.get, horizontal=True)
+    t_index = st.select_slider("Температура газа (°C):", options=range(len(surface["t_gas"])),
+                               format_func=lambda i: f"{surface['t_gas'][i]:.1f}")
+    values = surface[output][:, :, t_index]
+
+    import matplotlib.pyplot as plt  # matplotlib загружается только при выводе графиков
+    fig, ax = plt.subplots(figsize=(8, 5))
+    mesh = ax.pcolormesh(surface["flow"], surface["pressure"], values, shading="auto", cmap="viridis")
+    fig.colorbar(mesh, ax=ax, label=OUTPUT_NAMES[output])
+    ax.set_xlabel("Расход (тыс. м³/сут)")
+    ax.set_ylabel("Давление на входе (МПа)")
+    ax.set_title("Белая область — расход больше пропускной способности участка")
+    fig.tight_layout()
+    st.pyplot(fig)
+
+    limit = st.number_input("Допустимые потери давления (МПа)", min_value=0.0, value=0.1, format="%.3f")
+    max_flow = capacity(surface, limit)[:, t_index]
+    st.line_chart(pd.DataFrame({"Давление на входе (МПа)": surface["pressure"],
+                                "Пропускная способность (тыс. м³/сут)": max_flow}),
+                  x="Давление на входе (МПа)", y="Пропускная способность (тыс. м³/сут)")
+
+def run_network_calc(region, density, t_gas, roughness, composition=None):
+    # Потокораспределение по всей сети газосбора региона
+    st.subheader("🕸️ Сеть газосбора региона")
+    from pipe_network import boundary_template, boundary_conditions, BOUNDARY_TYPES  # scipy — только для этого блока
+    solver = network_solver(region, density, t_gas, roughness, composition)
+    network = solver.network
+    st.caption(f"Узлов: {len(network.nodes)} · участков: {len(network.start)}. "
+               "Связи между участками определены по названиям начала и конца в колонке «Участок».")
+
+    boundary = st.data_editor(
+        boundary_template(network), key=f"network_boundary_{region}", hide_index=True,
+        disabled=["Узел"], width="stretch",
+        column_config={"Условие": st.column_config.SelectboxColumn("Условие", options=BOUNDARY_TYPES, required=True)},
+    )
+
+    if st.button("🕸️ Рассчитать сеть"):
+        injections, pressures = boundary_conditions(boundary)
+        try:
+            with stage("pipe_network.solve"):
+                nodes, edges = solver.solve(injections, pressures)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
+        st.success(f"✅ Расчет сети выполнен (LU-разложений в этой сессии для текущих параметров газа: {solver.refactorizations})")
+        col1, col2 = st.columns([2, 3])
+        col1.dataframe(nodes.round(4), width="stretch", hide_index=True)
+        col2.dataframe(edges.round(4), width="stretch", hide_index=True)
+
 def run_hydraulic_calc():
     st.title("🔧 Гидравлический расчет трубопровода")
 
@@ -43,35 +167,78 @@ def run_hydraulic_calc():
     t_gas = st.number_input("Температура газа (°C)", min_value=30.0)
     t_soil = st.number_input("Температура грунта (°C)", min_value=-2.0)
     humidity = st.number_input("Содержание влаги (% mol)", min_value=0.02)
-    density = st.number_input("Плотность газа (кг/м³)", min_value=0.9)
+    gas_source = st.radio("Свойства газа", ["Плотность вручную", "По составу протокола"], horizontal=True)
+    composition = None
+    if gas_source == "Плотность вручную":
+        density = st.number_input("Плотность газа (кг/м³)", min_value=0.9)
+    else:
+        # Состав последнего протокола выбранной группы: Z, плотность и вязкость — по таблицам свойств состава
+        from data_store import protocol_groups, select_grid
+        index = protocol_groups()
+        fields = index.options("Месторождение")
+        gas_field = st.selectbox("Месторождение (протоколы):", fields,
+                                 index=fields.index(field.strip()) if field.strip() in fields else 0)
+        gas_dns = st.selectbox("ДНС (протоколы):", index.options("ДНС", {"Месторождение": [gas_field]}))
+        gas_stage = st.selectbox("Ступень отбора:", index.options(
+            "Ступень отбора", {"Месторождение": [gas_field], "ДНС": [gas_dns]}))
+        protocol = select_grid({"Месторождение": [gas_field], "ДНС": [gas_dns], "Ступень отбора": [gas_stage]})
+        if protocol.empty:
+            st.warning("Нет протоколов для выбранной группы.")
+            st.stop()
+        fractions = mole_fractions(protocol.iloc[[-1]])[0]
+        if np.isnan(fractions).any():
+            st.error("❌ В протоколе нет состава газа")
+            return
+        composition = tuple(fractions.tolist())
+        density = float(standard_density(fractions))
+        gas_props = {name: float(value) for name, value in properties(fractions, pressure, t_gas + 273.15).items()}
+        st.caption(f"Последний протокол группы: ρ ст. = {density:.3f} кг/м³ · при {pressure:.2f} МПа и {t_gas:.1f} °C: "
+                   f"Z = {gas_props['z']:.4f}, ρ = {gas_props['density']:.2f} кг/м³, "
+                   f"μ = {gas_props['viscosity'] * 1e6:.2f} мкПа·с. Состав используется в расчёте участка, "
+                   "сценарном расчёте и расчёте сети.")
+        if not in_domain(fractions, t_gas + 273.15):
+            st.caption("Приведённая температура газа ниже области корреляции Дранчука — Абу-Кассема: "
+                       "возможна конденсация, свойства приближённые.")
+
+    # Параметры модели течения
+    with st.expander("⚙️ Параметры расчёта"):
+        roughness = st.number_input("Эквивалентная шероховатость (мм)", min_value=0.0, value=0.03, format="%.3f")
+        friction_names = {"swamee_jain": "Свами — Джейн", "colebrook": "Колбрук"}
+        friction = st.selectbox("Коэффициент трения:", FRICTION_METHODS, format_func=friction_names.get)
+        isothermal = st.checkbox("Изотермическое течение (без остывания газа в грунте)")
 
     st.divider()
 
     if st.button("🚀 Посчитать гидравлику"):
         if all([pressure, flow, t_gas, t_soil, humidity, density]):
             # Перевод единиц и расчёты
-            diameter_m = diameter / 1000  # мм → м
-            velocity = flow * 1000 / (86400 * 3.14 * (diameter_m / 2) ** 2)
-            friction_loss = 0.02 * (length / diameter_m) * (density * velocity ** 2) / 2 / 1e5 / 10  # Примерная формула
+            diameter_m = (diameter - 2 * thickness) / 1000  # внутренний диаметр, мм → м
+            options = dict(density=density, roughness=roughness, friction=friction, isothermal=isothermal)
+            options.update(gas_options(composition))
+            profile = solve_profile(pressure, flow, diameter_m, length, t_gas, t_soil, **options)
+            friction_loss = float(profile["loss"])
+
+            if not np.isfinite(friction_loss):
+                st.error("❌ Расход превышает пропускную способность участка: давление падает до нуля")
+                return
 
             # Вывод метрик
             st.success("✅ Расчет выполнен успешно!")
-            st.metric("Потери давления", f"{friction_loss:.2f} МПа")
-            st.metric("Скорость газа", f"{velocity:.2f} м/с")
-
-            # Визуализация падения давления и скорости
-            step = 10  # шаг по длине, м
-            x_vals = list(range(0, int(length) + step, step))
-            pressure_vals = []
-            velocity_vals = []
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Потери давления", f"{friction_loss:.3f} МПа")
+            col2.metric("Скорость газа на входе", f"{float(profile['velocity_in']):.2f} м/с")
+            col3.metric("Скорость газа на выходе", f"{float(profile['velocity_out']):.2f} м/с")
+            st.caption(f"Давление на выходе: {float(profile['pressure_out']):.3f} МПа · "
+                       f"Re = {float(profile['reynolds']):.3g} · λ = {float(profile['friction']):.4f} · "
+                       f"шагов интегрирования: {len(profile['s']) - 1}")
 
-            for x in x_vals:
-                local_loss = friction_loss * (x / length)
-                local_pressure = pressure - local_loss
-                pressure_vals.append(local_pressure)
-                velocity_vals.append(velocity)  # скорость неизменна при постоянном расходе
+            # Визуализация падения давления и скорости (точки — шаги адаптивного интегрирования)
+            x_vals = profile["x"][0]
+            pressure_vals = profile["pressure"][0]
+            velocity_vals = profile["velocity"][0]
 
             # График
+            import matplotlib.pyplot as plt
             fig, ax1 = plt.subplots(figsize=(8, 5))
             ax1.plot(x_vals, pressure_vals, label="Давление (МПа)", color="blue")
             ax1.set_xlabel("Длина трубы (м)")
@@ -87,8 +254,20 @@ def run_hydraulic_calc():
             fig.tight_layout()
             st.pyplot(fig)
 
+            # Все участки месторождения при тех же условиях — одним векторным расчётом
+            st.subheader("📋 Участки месторождения при тех же условиях")
+            st.dataframe(evaluate_sections(df_field, pressure, flow, t_gas, t_soil, **options),
+                         width="stretch", hide_index=True)
+
         else:
             st.error("❌ Не вся информация указана для расчета гидравлики")
 
+    st.divider()
+    run_sweep_calc((diameter - 2 * thickness) / 1000, length, t_soil, density,
+                   dict(roughness=roughness, friction=friction, isothermal=isothermal, composition=composition))
+
+    st.divider()
+    run_network_calc(region, density, t_gas, roughness, composition)
+
 if __name__ == "__main__":
     run_hydraulic_calc()
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+# Иерархический индекс таблицы протоколов: Месторождение → ДНС → Ступень отбора.
+# Строится один раз на набор данных и хранит позиции строк каждой группы,
+# поэтому фильтрация и списки для выпадающих меню не сканируют всю таблицу.
+
+LEVELS = ["Месторождение", "ДНС", "Ступень отбора"]
+
+
+class GridIndex:
+    def __init__(self, df, levels=LEVELS):
+        self.levels = [col for col in levels if col in df.columns]
+        self.size = len(df)
+
+        # Ключ группы (кортеж значений уровней) → позиции строк в исходной таблице.
+        # sort=False сохраняет порядок первого появления, как у unique().
+        self.groups = {}
+        if self.levels:
+            indices = df.groupby(self.levels, observed=True, sort=False, dropna=False).indices
+            for key, positions in indices.items():
+                key = key if isinstance(key, tuple) else (key,)
+                self.groups[key] = positions
+
+    def _matches(self, key, selection, depth):
+        # Проверяет, подходит ли ключ группы под выбранные значения первых depth уровней
+        for level_no in range(depth):
+            values = selection.get(self.levels[level_no])
+            if values and key[level_no] not in values:
+                return False
+        return True
+
+    def options(self, level, selection=None):
+        # Значения уровня level, доступные при выборе на предыдущих уровнях (пустой выбор = все)
+        selection = selection or {}
+        depth = self.levels.index(level)
+        values = (key[depth] for key in self.groups if self._matches(key, selection, depth))
+        return [value for value in dict.fromkeys(values) if not pd.isna(value)]
+
+    def positions(self, selection=None):
+        # Позиции строк, удовлетворяющих выбору; None — фильтр не задан, подходят все строки
+        selection = selection or {}
+        if not any(selection.get(level) for level in self.levels):
+            return None
+        parts = [positions for key, positions in self.groups.items()
+                 if self._matches(key, selection, len(self.levels))]
+        if not parts:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(parts))  # исходный (хронологический) порядок строк
+
+    def take(self, df, selection=None):
+        # Строки по выбору: позиционная выборка без копирования всей таблицы.
+        # Возвращается новый объект, поэтому добавление колонок не затрагивает общий df.
+        positions = self.positions(selection)
+        if positions is None:
+            return df.iloc[:]
+        return df.iloc[positions]
@@ -1,13 +1,20 @@
+import os
+import base64
+
+# Бэкенд matplotlib без дисплея; сам matplotlib импортируется только страницами с графиками
+os.environ.setdefault("MPLBACKEND", "Agg")
+
 import streamlit as st
 from streamlit_option_menu import option_menu
-import matplotlib
-matplotlib.use('Agg')
-import base64
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import instrumentation  # замеры этапов перезапуска (выключены, пока не включены в панели или DASHBOARD_PROFILE=1)
 
 # Настройки страницы
 st.set_page_config(page_title="Аналитика газа", page_icon="🛠", layout="wide")
 
-# Функция для кодирования изображения в base64
+# Функция для кодирования изображения в base64 (один раз на процесс, а не при каждом перезапуске)
+@st.cache_resource
 def get_image_as_base64(path):
     with open(path, "rb") as f:
         data = f.read()
@@ -38,32 +45,39 @@ with st.sidebar:
         }
     )
 
-if selected == "Главная":
-    st.title("Добро пожаловать Газовичёк 👋")
-    st.write("Это дашборд по анализу гидравлических потерь, потреблению метанола, компонентному составу газа.")
-    st.markdown("## 🔍 Возможности:")
-    st.markdown("- Визуализация состава газа\n- Генерация отчётов\n- Фильтрация по локациям")
+# Перезапуск страницы целиком — один замер; панель профилирования — только при DASHBOARD_ADMIN=1
+ctx = get_script_run_ctx()
+session_id = ctx.session_id if ctx else None
+with instrumentation.page_run(selected, session_id):
+    if selected == "Главная":
+        st.title("Добро пожаловать Газовичёк 👋")
+        st.write("Это дашборд по анализу гидравлических потерь, потреблению метанола, компонентному составу газа.")
+        st.markdown("## 🔍 Возможности:")
+        st.markdown("- Визуализация состава газа\n- Генерация отчётов\n- Фильтрация по локациям")
+
+    elif selected == "Аналитика":
+        import analitika
+        analitika.run_analytics()
 
-elif selected == "Аналитика":
-    import analitika
-    analitika.run_analytics()
+    elif selected == "Гидравлика":
+        import gidravlika
+        gidravlika.run_hydraulic_calc()
 
-elif selected == "Гидравлика":
-    import gidravlika
-    gidravlika.run_hydraulic_calc()
+    elif selected == "Метанол":
+        import methanol
+        methanol.run_methanol_calc()
 
-elif selected == "Метанол":
-    import methanol
-    methanol.run_methanol_calc()
+    elif selected == "Отчеты":
+        import otchety
+        otchety.run_reports()
 
-elif selected == "Отчеты":
-    st.title("✅ Отчеты")
-    st.markdown("Выберите параметры и скачайте PDF/Excel.")
+    elif selected == "Контакты":
+        st.title("📰 Контакты")
+        st.markdown("""
+            Разработчики:  
+            Роман Зинченко, Email: yourname@company.com  
+            Юрий Кудряшов, Email: yourname@company.com
+        """, unsafe_allow_html=True)
 
-elif selected == "Контакты":
-    st.title("📰 Контакты")
-    st.markdown("""
-        Разработчики:  
-        Роман Зинченко, Email: yourname@company.com  
-        Юрий Кудряшов, Email: yourname@company.com
-    """, unsafe_allow_html=True)
+if instrumentation.ADMIN:
+    instrumentation.show_panel(session_id)
@@ -0,0 +1,104 @@
+from functools import lru_cache
+
+import numpy as np
+
+from interpolation import bilinear, in_domain
+from instrumentation import cached, timed
+
+# Влагосодержание газа по модели влажного воздуха CoolProp (HAPropsSI).
+# Вызовы CoolProp дорогие и повторяются при каждом движении ползунков, поэтому:
+#  - прямые расчёты кэшируются (LRU) по квантованным (T, P, RH);
+#  - предельное влагосодержание (RH = 1) в рабочей области ползунков страницы метанола
+#    (1–10 МПа × 0–60 °C) берётся из предрасчитанной таблицы с билинейной интерполяцией.
+# CoolProp импортируется при первом расчёте: сам импорт занимает несколько секунд.
+
+WATER_FACTOR = 1000 * 18.015  # Пересчёт W (кг/кг сухого воздуха) в г/м³, как в исходном расчёте страницы
+
+# Шаги квантования ключа кэша
+T_STEP = 0.01       # К
+P_STEP = 1000.0     # Па
+RH_STEP = 0.001     # доли
+
+CACHE_SIZE = 4096   # Максимум значений в LRU-кэше прямых расчётов
+
+# Сетка таблицы насыщения: температура, К × давление, Па
+TABLE_T = np.linspace(273.15, 333.15, 121)   # 0–60 °C, шаг 0.5 °C
+TABLE_P = np.linspace(1e6, 10e6, 91)         # 1–10 МПа, шаг 0.1 МПа
+
+
+def quantize(value, step):
+    # Округление к ближайшему узлу шага (ключ кэша не зависит от «шума» в младших разрядах)
+    return round(round(value / step) * step, 9)
+
+
+@timed("humidity.coolprop")
+def _direct(T_K, P_Pa, RH):
+    from CoolProp.CoolProp import HAPropsSI     # расчет точки росы и влажности
+    return HAPropsSI("W", "T", T_K, "P", P_Pa, "R", RH) * WATER_FACTOR
+
+
+@cached("humidity.water_content", lru_cache(maxsize=CACHE_SIZE))
+def _water_content_cached(T_K, P_Pa, RH):
+    return _direct(T_K, P_Pa, RH)
+
+
+def water_content(T_K, P_Pa, RH=1.0):
+    # Влагосодержание, г/м³, при температуре T_K (К), давлении P_Pa (Па) и относительной влажности RH.
+    # Ошибки CoolProp (ValueError) пробрасываются вызывающему коду.
+    return _water_content_cached(quantize(T_K, T_STEP), quantize(P_Pa, P_STEP), quantize(RH, RH_STEP))
+
+
+def cache_info():
+    # Статистика LRU-кэша прямых расчётов (hits, misses, maxsize, currsize)
+    return _water_content_cached.cache_info()
+
+
+@cached("humidity.saturation_table", lru_cache(maxsize=1))
+def saturation_table():
+    # Предельное влагосодержание (RH = 1) в узлах сетки TABLE_T × TABLE_P, г/м³.
+    # Считается один раз на процесс при первом обращении.
+    return np.array([[_direct(T_K, P_Pa, 1.0) for P_Pa in TABLE_P] for T_K in TABLE_T])
+
+
+def saturation_water_content(T_K, P_Pa, use_table=True):
+    # Максимальное влагосодержание при 100 % влажности, г/м³.
+    # В области таблицы — интерполяция, вне её — прямой (кэшированный) расчёт CoolProp.
+    if use_table and in_domain(TABLE_T, TABLE_P, T_K, P_Pa):
+        return float(bilinear(TABLE_T, TABLE_P, saturation_table(), T_K, P_Pa))
+    return water_content(T_K, P_Pa, 1.0)
+
+
+def saturation_water_content_array(T_K, P_Pa, use_table=True):
+    # Векторный вариант saturation_water_content для массивов T_K и P_Pa (broadcast).
+    # Точки в области таблицы интерполируются одним проходом, остальные считаются напрямую через кэш.
+    T_K, P_Pa = np.broadcast_arrays(np.asarray(T_K, dtype=float), np.asarray(P_Pa, dtype=float))
+    result = np.full(T_K.shape, np.nan)
+    inside = np.zeros(T_K.shape, dtype=bool)
+    if use_table:
+        inside = ((T_K >= TABLE_T[0]) & (T_K <= TABLE_T[-1]) & (P_Pa >= TABLE_P[0]) & (P_Pa <= TABLE_P[-1]))
+        result[inside] = bilinear(TABLE_T, TABLE_P, saturation_table(), T_K[inside], P_Pa[inside])
+    for idx in zip(*np.nonzero(~inside & ~np.isnan(T_K) & ~np.isnan(P_Pa))):
+        try:
+            result[idx] = water_content(T_K[idx], P_Pa[idx], 1.0)
+        except ValueError:
+            pass  # Вне области модели CoolProp — оставляем пропуск
+    return result
+
+
+def check_accuracy(samples=1000, seed=0):
+    # Сравнение табличной интерполяции с прямыми вызовами CoolProp в случайных точках области.
+    # Возвращает максимальную и среднюю относительную погрешность.
+    rng = np.random.default_rng(seed)
+    T_K = rng.uniform(TABLE_T[0], TABLE_T[-1], samples)
+    P_Pa = rng.uniform(TABLE_P[0], TABLE_P[-1], samples)
+
+    table = bilinear(TABLE_T, TABLE_P, saturation_table(), T_K, P_Pa)
+    direct = np.array([_direct(t, p, 1.0) for t, p in zip(T_K, P_Pa)])
+    rel_error = np.abs(table - direct) / direct
+    return {"max_rel_error": float(rel_error.max()), "mean_rel_error": float(rel_error.mean())}
+
+
+if __name__ == "__main__":
+    accuracy = check_accuracy()
+    print(f"Максимальная относительная погрешность таблицы: {accuracy['max_rel_error']:.3%}")
+    print(f"Средняя относительная погрешность таблицы: {accuracy['mean_rel_error']:.3%}")
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+from composition import MOLAR_MASSES
+from gas_properties import M_AIR, mole_fractions
+
+# Условия гидратообразования по составу газа и потребность в метаноле как ингибиторе.
+#  - Температура гидратообразования — корреляция Мотиея (Motiee, 1991) по давлению и относительной
+#    плотности газа, которая считается по составу (Σ xᵢ·Mᵢ / M воздуха);
+#    область применения: относительная плотность 0.55–1.0, давление до ~30 МПа.
+#  - Концентрация метанола в водной фазе для снижения температуры гидратообразования на ΔT —
+#    по Хаммершмидту (до ~25 масс. %) или по Нильсену — Баклину (логарифм мольной доли воды, выше 25 %);
+#    по умолчанию ("auto") — Хаммершмидт, а там, где он даёт больше HAMMERSCHMIDT_LIMIT, — Нильсен — Баклин.
+# Все функции работают с числами и массивами (broadcast): таблица риска по всем протоколам
+# месторождения считается одним проходом.
+
+MPA_TO_PSI = 145.0377
+METHANOL_MOLAR_MASS = 32.04
+WATER_MOLAR_MASS = 18.015
+HAMMERSCHMIDT_K = 1297.0        # Константа Хаммершмидта для метанола, °C (ΔT = K·W / (M·(100 − W)))
+NIELSEN_BUCKLIN_K = 72.0        # ΔT = −72·ln(x воды), °C
+SAFETY_MARGIN = 3.0             # Запас по температуре гидратообразования, °C
+GRAVITY_RANGE = (0.55, 1.0)     # Область корреляции Мотиея по относительной плотности
+HAMMERSCHMIDT_LIMIT = 25.0      # Область формулы Хаммершмидта, масс. % метанола в водной фазе
+INHIBITOR_METHODS = ["auto", "hammerschmidt", "nielsen_bucklin"]
+
+# Колонки таблицы риска
+GRAVITY = "Относительная плотность газа"
+HYDRATE_T = "Температура гидратообразования (°C)"
+MARGIN = "Запас до гидратообразования (°C)"
+RISK = "Риск гидратообразования"
+METHANOL_WT = "Метанол в водной фазе (масс. %)"
+IN_DOMAIN = "В области корреляции"
+
+
+def gas_gravity(fractions):
+    # Относительная плотность газа по воздуху по мольным долям компонентов (строки × COMPONENTS)
+    return np.asarray(fractions, dtype=float) @ MOLAR_MASSES / M_AIR
+
+
+def hydrate_temperature(P_MPa, gravity):
+    # Температура гидратообразования, °C (корреляция Мотиея в °F и psia)
+    log_p = np.log10(np.asarray(P_MPa, dtype=float) * MPA_TO_PSI)
+    gravity = np.asarray(gravity, dtype=float)
+    t_f = (-238.24469 + 78.99667 * log_p - 5.352544 * log_p ** 2 + 349.473877 * gravity
+           - 150.854675 * gravity ** 2 - 27.604065 * log_p * gravity)
+    return (t_f - 32) * 5 / 9
+
+
+def methanol_concentration(depression, method="auto"):
+    # Массовая доля метанола в водной фазе (%), снижающая температуру гидратообразования на depression (°C);
+    # при depression ≤ 0 ингибитор не нужен (0)
+    depression = np.maximum(np.asarray(depression, dtype=float), 0.0)
+    x_water = np.exp(-depression / NIELSEN_BUCKLIN_K)
+    mass_methanol = (1 - x_water) * METHANOL_MOLAR_MASS
+    nielsen_bucklin = 100 * mass_methanol / (mass_methanol + x_water * WATER_MOLAR_MASS)
+    if method == "nielsen_bucklin":
+        return nielsen_bucklin
+    hammerschmidt = 100 * depression * METHANOL_MOLAR_MASS / (HAMMERSCHMIDT_K + depression * METHANOL_MOLAR_MASS)
+    if method == "hammerschmidt":
+        return hammerschmidt
+    return np.where(hammerschmidt > HAMMERSCHMIDT_LIMIT, nielsen_bucklin, hammerschmidt)
+
+
+def methanol_for_water(water_kg, concentration):
+    # Масса метанола (кг), которая даёт концентрацию concentration (масс. %) в water_kg воды
+    concentration = np.clip(np.asarray(concentration, dtype=float), 0.0, 99.0)
+    return np.asarray(water_kg, dtype=float) * concentration / (100 - concentration)
+
+
+def hydrate_risk(df, P_MPa, T_C, margin=SAFETY_MARGIN, method="auto"):
+    # Таблица риска для всех строк протоколов при давлении P_MPa и температуре T_C (числа или массивы по строкам):
+    # относительная плотность, температура гидратообразования, запас до неё и концентрация метанола,
+    # при которой температура газа остаётся на margin выше температуры гидратообразования
+    gravity = gas_gravity(mole_fractions(df))
+    t_hydrate = hydrate_temperature(P_MPa, gravity)
+    reserve = np.asarray(T_C, dtype=float) - t_hydrate
+    result = pd.DataFrame(index=df.index)
+    result[GRAVITY] = gravity
+    result[HYDRATE_T] = t_hydrate
+    result[MARGIN] = reserve
+    result[RISK] = reserve < margin
+    result[METHANOL_WT] = methanol_concentration(margin - reserve, method)
+    result[IN_DOMAIN] = (gravity >= GRAVITY_RANGE[0]) & (gravity <= GRAVITY_RANGE[1])
+    return result
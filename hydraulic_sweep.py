@@ -0,0 +1,64 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from hydraulics import solve_profile
+
+# Сценарный расчёт участка: полная сетка (давление × расход × температура газа) считается
+# векторно через solve_profile. Сетка режется на блоки; большие сетки считаются в пуле процессов.
+# Результат — поверхности отклика (потери давления, скорости) на осях сетки.
+
+CHUNK_SIZE = 20000          # Вариантов в одном векторном вызове solve_profile
+PARALLEL_THRESHOLD = 50000  # С какого числа вариантов использовать пул процессов
+MAX_VARIANTS = 10 ** 6      # Предел размера сетки: результат держится в памяти общего процесса сервера
+OUTPUTS = ["loss", "pressure_out", "velocity_in", "velocity_out"]
+OUTPUT_NAMES = {
+    "loss": "Потери давления (МПа)",
+    "pressure_out": "Давление на выходе (МПа)",
+    "velocity_in": "Скорость на входе (м/с)",
+    "velocity_out": "Скорость на выходе (м/с)",
+}
+
+
+def _solve_chunk(args):
+    # Один блок вариантов (функция уровня модуля — передаётся в процессы пула)
+    pressure, flow, t_gas, diameter, length, t_soil, density, options = args
+    profile = solve_profile(pressure, flow, diameter, length, t_gas, t_soil, density, **options)
+    return {name: profile[name] for name in OUTPUTS}
+
+
+def sweep(diameter, length, pressures, flows, t_gas, t_soil=None, density=0.9, workers=None, **options):
+    # Поверхности отклика участка на сетке pressures × flows × t_gas (оси — одномерные массивы).
+    # Возвращает оси и массивы OUTPUTS формы (давления, расходы, температуры); NaN — расход больше
+    # пропускной способности участка.
+    axes = [np.atleast_1d(np.asarray(a, dtype=float)) for a in (pressures, flows, t_gas)]
+    variants = int(np.prod([len(a) for a in axes]))
+    if variants > MAX_VARIANTS:
+        raise ValueError(f"Слишком большая сетка режимов: {variants} вариантов (не больше {MAX_VARIANTS})")
+    P, Q, T = (a.ravel() for a in np.meshgrid(*axes, indexing="ij"))
+    bounds = range(0, len(P), CHUNK_SIZE)
+    chunks = [(P[i:i + CHUNK_SIZE], Q[i:i + CHUNK_SIZE], T[i:i + CHUNK_SIZE], diameter, length, t_soil, density,
+               options) for i in bounds]
+
+    if len(P) >= PARALLEL_THRESHOLD and len(chunks) > 1 and workers != 1:
+        workers = min(workers or os.cpu_count() or 1, len(chunks))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_solve_chunk, chunks))
+    else:
+        parts = [_solve_chunk(chunk) for chunk in chunks]
+
+    shape = tuple(len(a) for a in axes)
+    result = {"pressure": axes[0], "flow": axes[1], "t_gas": axes[2]}
+    for name in OUTPUTS:
+        result[name] = np.concatenate([part[name] for part in parts]).reshape(shape)
+    return result
+
+
+def capacity(surface, limit, output="loss"):
+    # Наибольший расход (тыс. м³/сут), при котором output не превышает limit, — для каждого
+    # давления и температуры сетки; NaN, если предел не выполняется ни при одном расходе
+    values = surface[output]
+    allowed = np.isfinite(values) & (values <= limit)
+    flows = np.where(allowed, surface["flow"][None, :, None], -np.inf).max(axis=1)
+    return np.where(np.isfinite(flows), flows, np.nan)
@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+from composition import MOLAR_MASSES
+from instrumentation import timed
+from gas_properties import (R, M_AIR, T_STD, P_STD, pseudo_critical, pseudo_critical_from_gravity,
+                            molar_mass_from_density, z_factor, gas_density)
+from property_tables import properties, z_lookup
+
+# Гидравлический расчёт газопровода: течение сжимаемого газа с трением.
+#  - коэффициент трения по Свами — Джейну или Колбруку (по числу Рейнольдса и шероховатости);
+#  - Z-фактор по плотности (корреляция Саттона, формула Папея) или, для одного состава газа,
+#    по таблице свойств этого состава (property_tables: правило Кея, Дранчук — Абу-Кассем);
+#  - скорость меняется вдоль трубы вместе с давлением и плотностью газа;
+#  - температура постоянна (изотермический режим) или остывает к температуре грунта по Шухову;
+#  - уравнение для p² интегрируется методом Рунге — Кутты 2(3) с адаптивным шагом,
+#    сразу для всех участков (входные параметры — числа или массивы, broadcast).
+
+ROUGHNESS_MM = 0.03      # Эквивалентная шероховатость стальных труб, мм
+VISCOSITY = 1.1e-5       # Динамическая вязкость газа, Па·с
+HEAT_TRANSFER = 1.5      # Коэффициент теплопередачи газ — грунт, Вт/(м²·К)
+HEAT_CAPACITY = 2500.0   # Удельная теплоёмкость газа, Дж/(кг·К)
+FRICTION_METHODS = ["swamee_jain", "colebrook"]
+
+# Колонки листа 'pipe' (в исходной таблице у части названий есть пробел в конце)
+REGION_COL = "Регион"
+FIELD_COL = "Месторождение "
+SECTION_COL = "Участок"
+OUTER_D_COL = "Диаметр внешний"
+WALL_COL = "Толщина стенки"
+LENGTH_COL = "Протяженность "
+
+
+def friction_factor(Re, relative_roughness, method="swamee_jain"):
+    # Коэффициент гидравлического сопротивления (Дарси). Ламинарный режим — 64/Re.
+    Re = np.asarray(Re, dtype=float)
+    eps = np.asarray(relative_roughness, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        turbulent = 0.25 / np.log10(eps / 3.7 + 5.74 / Re ** 0.9) ** 2
+        if method == "colebrook":
+            # Неявная формула Колбрука: несколько итераций от приближения Свами — Джейна
+            inv_sqrt = 1 / np.sqrt(turbulent)
+            for _ in range(20):
+                inv_sqrt = -2 * np.log10(eps / 3.7 + 2.51 * inv_sqrt / Re)
+            turbulent = 1 / inv_sqrt ** 2
+        return np.where(Re < 2300, 64 / np.maximum(Re, 1e-9), turbulent)
+
+
+def mass_flow(flow, molar_mass):
+    # Массовый расход (кг/с) по коммерческому расходу (тыс. м³/сут при стандартных условиях)
+    density_std = P_STD * np.asarray(molar_mass) / 1000 / (R * T_STD)
+    return np.asarray(flow, dtype=float) * 1000 / 86400 * density_std
+
+
+def gas_model(density=None, composition=None):
+    # Молярная масса (г/моль) и псевдокритические параметры газа: по составу (мольные доли) или по плотности
+    if composition is not None:
+        fractions = np.asarray(composition, dtype=float)
+        fractions = fractions / fractions.sum(axis=-1, keepdims=True)
+        Tpc, Ppc = pseudo_critical(fractions)
+        return fractions @ MOLAR_MASSES, Tpc, Ppc
+    molar_mass = molar_mass_from_density(density)
+    Tpc, Ppc = pseudo_critical_from_gravity(molar_mass / M_AIR)
+    return molar_mass, Tpc, Ppc
+
+
+@timed("hydraulics.solve_profile")
+def solve_profile(pressure, flow, diameter, length, t_gas, t_soil=None, density=0.9, composition=None,
+                  roughness=ROUGHNESS_MM, viscosity=VISCOSITY, friction="swamee_jain", isothermal=False,
+                  heat_transfer=HEAT_TRANSFER, rtol=1e-6, max_steps=10000):
+    # Профиль давления, температуры и скорости вдоль трубы.
+    # pressure — абсолютное давление на входе, МПа; flow — тыс. м³/сут; diameter — внутренний диаметр, м;
+    # length — длина, м; t_gas, t_soil — °C; density — плотность при стандартных условиях, кг/м³;
+    # composition — мольные доли по COMPONENTS вместо плотности; при одном составе и viscosity=None
+    # вязкость берётся из таблицы свойств состава при давлении и температуре на входе.
+    # Все параметры могут быть массивами одной формы (broadcast) — тогда считается каждый вариант.
+    molar_mass, Tpc, Ppc = gas_model(density, composition)
+    z_table = z_lookup(composition) if composition is not None and np.ndim(composition) == 1 else None
+    P0, Q, D, L, T_in, T_ground, M, Tpc, Ppc = (np.ravel(a).astype(float) for a in np.broadcast_arrays(
+        pressure, flow, diameter, length, t_gas, t_gas if t_soil is None else t_soil, molar_mass, Tpc, Ppc))
+    shape = np.broadcast_shapes(*(np.shape(a) for a in (pressure, flow, diameter, length, t_gas, molar_mass)),
+                                np.shape(t_soil) if t_soil is not None else ())
+
+    area = np.pi * D ** 2 / 4
+    m = mass_flow(Q, M)
+    if viscosity is None:
+        viscosity = properties(composition, P0, T_in + 273.15)["viscosity"] if z_table is not None else VISCOSITY
+    Re = 4 * m / (np.pi * D * viscosity)
+    f = friction_factor(Re, roughness / 1000 / D, friction)
+    T_in = T_in + 273.15
+    T_ground = T_ground + 273.15
+    # Показатель остывания газа по Шухову (на единицу относительной длины s = x / L)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cooling = np.where(m > 0, heat_transfer * np.pi * D * L / (m * HEAT_CAPACITY), 0.0)
+    if isothermal or t_soil is None:
+        cooling = np.zeros_like(cooling)
+
+    def compressibility(P_MPa, T, Tpc, Ppc):
+        return z_factor(P_MPa, T, Tpc, Ppc) if z_table is None else z_table(P_MPa, T)
+
+    def temperature(s):
+        return T_ground + (T_in - T_ground) * np.exp(-cooling * s)
+
+    def rhs(s, y):
+        # d(p²)/ds для квадрата давления y = p² (Па²), s — относительная координата 0…1.
+        # В переменной p² нет особенности 1/p у запирания потока, поэтому шаг не дробится
+        # из-за вариантов с расходом около пропускной способности.
+        T = temperature(s)
+        Z = compressibility(np.sqrt(np.maximum(y, 0.0)) / 1e6, T, Tpc, Ppc)
+        return -L * f * m ** 2 * Z * R * T / (D * area ** 2 * M / 1000)
+
+    # Адаптивное интегрирование методом Богацкого — Шампайна (Рунге — Кутта 2(3))
+    s, h = 0.0, 0.01
+    y = (P0 * 1e6) ** 2
+    y_min = (0.01 * P0 * 1e6) ** 2
+    points, squares = [0.0], [y.copy()]
+    k1 = rhs(s, y)
+    for _ in range(max_steps):
+        if s >= 1.0:
+            break
+        h = min(h, 1.0 - s)
+        k2 = rhs(s + h / 2, y + h / 2 * k1)
+        k3 = rhs(s + 3 * h / 4, y + 3 * h / 4 * k2)
+        y_new = y + h * (2 * k1 + 3 * k2 + 4 * k3) / 9
+        k4 = rhs(s + h, y_new)
+        error = h * (-5 * k1 / 72 + k2 / 12 + k3 / 9 - k4 / 8)
+        with np.errstate(invalid="ignore"):
+            # Допуск на p²: относительный rtol по давлению (δ(p²) ≈ 2p·δp) + 1 Па при давлении на входе
+            scale = 2 * rtol * np.abs(y_new) + 2 * P0 * 1e6
+            ratio = np.abs(error) / scale
+        norm = np.nanmax(ratio) if np.isfinite(ratio).any() else 0.0
+
+        if norm <= 1.0:
+            s += h
+            # Давление упало до нуля — расход больше пропускной способности участка
+            y = np.where(y_new > y_min, y_new, np.nan)
+            points.append(s)
+            squares.append(y.copy())
+            k1 = k4  # Первая стадия следующего шага совпадает с последней стадией текущего
+        h *= min(5.0, max(0.2, 0.9 * (norm if norm > 0 else 1e-12) ** (-1 / 3)))
+
+    s_points = np.array(points)
+    P = np.sqrt(np.array(squares).T)                    # (варианты × точки), Па
+    T = T_ground[:, None] + (T_in - T_ground)[:, None] * np.exp(-cooling[:, None] * s_points[None, :])
+    Z = compressibility(P / 1e6, T, Tpc[:, None], Ppc[:, None])
+    rho = gas_density(P / 1e6, T, M[:, None], Z)
+    velocity = m[:, None] / (rho * area[:, None])
+
+    return {
+        "shape": shape,
+        "s": s_points,
+        "x": s_points[None, :] * L[:, None],             # м
+        "pressure": P / 1e6,                            # МПа
+        "temperature": T - 273.15,                       # °C
+        "z": Z,
+        "density": rho,                                 # кг/м³
+        "velocity": velocity,                           # м/с
+        "reynolds": Re.reshape(shape),
+        "friction": f.reshape(shape),
+        "pressure_out": (P[:, -1] / 1e6).reshape(shape),
+        "loss": ((P[:, 0] - P[:, -1]) / 1e6).reshape(shape),
+        "velocity_in": velocity[:, 0].reshape(shape),
+        "velocity_out": velocity[:, -1].reshape(shape),
+    }
+
+
+def section_geometry(sections):
+    # Внутренний диаметр (м) и длина (м) участков листа 'pipe'
+    outer = pd.to_numeric(sections[OUTER_D_COL], errors="coerce").to_numpy(dtype=float)
+    wall = pd.to_numeric(sections[WALL_COL], errors="coerce").fillna(0).to_numpy(dtype=float)
+    length = pd.to_numeric(sections[LENGTH_COL], errors="coerce").to_numpy(dtype=float)
+    return (outer - 2 * wall) / 1000, length
+
+
+@timed("hydraulics.evaluate_sections")
+def evaluate_sections(sections, pressure, flow, t_gas, t_soil=None, density=0.9, **options):
+    # Расчёт всех участков таблицы одним проходом при одинаковых входных условиях
+    diameter, length = section_geometry(sections)
+    valid = (diameter > 0) & (length > 0)
+    result = sections[[col for col in [REGION_COL, FIELD_COL, SECTION_COL, OUTER_D_COL, WALL_COL, LENGTH_COL]
+                       if col in sections.columns]].copy()
+    for column in ["Давление на выходе (МПа)", "Потери давления (МПа)", "Скорость на входе (м/с)",
+                   "Скорость на выходе (м/с)", "Коэффициент трения"]:
+        result[column] = np.nan
+    if valid.any():
+        profile = solve_profile(pressure, flow, diameter[valid], length[valid], t_gas, t_soil, density, **options)
+        result.loc[valid, "Давление на выходе (МПа)"] = profile["pressure_out"]
+        result.loc[valid, "Потери давления (МПа)"] = profile["loss"]
+        result.loc[valid, "Скорость на входе (м/с)"] = profile["velocity_in"]
+        result.loc[valid, "Скорость на выходе (м/с)"] = profile["velocity_out"]
+        result.loc[valid, "Коэффициент трения"] = profile["friction"]
+    return result
@@ -0,0 +1,218 @@
+import contextlib
+import datetime
+import functools
+import json
+import os
+import threading
+from collections import deque
+from time import perf_counter
+
+# Замеры «горячих» участков дашборда: время, число вызовов и попадания в кэш по этапам каждого
+# перезапуска страницы. Этапы размечаются декораторами timed / cached и контекстом stage;
+# перезапуск страницы — контекстом page_run (или begin_run / end_run). Итог перезапуска пишется
+# строкой JSON в METRICS_PATH. Панель в боковом меню (show_panel) — при DASHBOARD_ADMIN=1.
+# Выключено по умолчанию (включается DASHBOARD_PROFILE=1 или в панели): обёртки проверяют
+# один флаг модуля и сразу вызывают исходную функцию. Streamlit импортируется только панелью.
+
+ENABLED = os.environ.get("DASHBOARD_PROFILE", "0") not in ("", "0")
+ADMIN = os.environ.get("DASHBOARD_ADMIN", "0") not in ("", "0")
+METRICS_PATH = os.environ.get("DASHBOARD_METRICS", os.path.join(".cache", "metrics.jsonl"))
+RUNS_KEEP = 200  # Сколько последних перезапусков держать в памяти процесса
+
+_local = threading.local()  # Текущий перезапуск страницы (скрипт каждой сессии выполняется в своём потоке)
+_lock = threading.Lock()
+_totals = {}                # Этап → {"calls", "seconds", "misses"} за всё время работы процесса
+_runs = deque(maxlen=RUNS_KEEP)
+_NOOP = contextlib.nullcontext()
+
+
+def set_enabled(flag):
+    global ENABLED
+    ENABLED = bool(flag)
+
+
+def _add(stats, name, seconds, miss, cache):
+    entry = stats.get(name)
+    if entry is None:
+        entry = stats[name] = {"calls": 0, "seconds": 0.0, "misses": 0 if cache else None}
+    if miss:
+        entry["misses"] = (entry["misses"] or 0) + 1
+    else:
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+
+
+def _record(name, seconds=0.0, miss=False, cache=False):
+    # miss=True — отметка промаха кэша (тело кэшированной функции выполнилось), без времени;
+    # cache=True — этап кэшированный, для него считается доля попаданий
+    run = getattr(_local, "run", None)
+    if run is not None:
+        _add(run["stages"], name, seconds, miss, cache)
+    with _lock:
+        _add(_totals, name, seconds, miss, cache)
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, perf_counter() - self.start)
+
+
+def stage(name):
+    # Участок кода: with stage("отрисовка"): ...
+    return _Stage(name) if ENABLED else _NOOP
+
+
+def timed(name=None):
+    # Декоратор: время и число вызовов функции (имя этапа по умолчанию — модуль.функция)
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(label, perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def cached(name, cache):
+    # Кэширующий декоратор (st.cache_data, st.cache_resource, functools.lru_cache) с замером
+    # попаданий: вызов считается снаружи кэша, промах — когда выполняется тело функции.
+    #   @cached("gidravlika.load_data", st.cache_data)
+    def decorate(func):
+        @functools.wraps(func)
+        def body(*args, **kwargs):
+            if ENABLED:
+                _record(name, miss=True, cache=True)
+            return func(*args, **kwargs)
+
+        cached_body = cache(body)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return cached_body(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return cached_body(*args, **kwargs)
+            finally:
+                _record(name, perf_counter() - start, cache=True)
+
+        for attr in ("clear", "cache_info", "cache_clear"):  # Управление кэшем остаётся доступным
+            if hasattr(cached_body, attr):
+                setattr(wrapper, attr, getattr(cached_body, attr))
+        return wrapper
+    return decorate
+
+
+def begin_run(page, session=None):
+    # Начало перезапуска страницы; этапы до end_run относятся к нему
+    _local.run = {"time": datetime.datetime.now().isoformat(timespec="seconds"), "page": page,
+                  "session": session, "stages": {}, "start": perf_counter()} if ENABLED else None
+
+
+def end_run():
+    # Конец перезапуска: запись в память процесса и в METRICS_PATH; возвращает итог (или None)
+    run = getattr(_local, "run", None)
+    _local.run = None
+    if run is None:
+        return None
+    run["seconds"] = perf_counter() - run.pop("start")
+    with _lock:
+        _runs.append(run)
+    try:
+        os.makedirs(os.path.dirname(METRICS_PATH) or ".", exist_ok=True)
+        with open(METRICS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run, ensure_ascii=False) + "\n")
+    except OSError:
+        pass  # Замеры не должны ронять страницу
+    return run
+
+
+@contextlib.contextmanager
+def page_run(page, session=None):
+    # Перезапуск страницы целиком; итог записывается и при исключении (в том числе st.stop / st.rerun)
+    begin_run(page, session)
+    try:
+        yield
+    finally:
+        end_run()
+
+
+def runs(page=None):
+    # Последние перезапуски (все или одной страницы), от старых к новым
+    with _lock:
+        return [run for run in _runs if page is None or run["page"] == page]
+
+
+def totals():
+    with _lock:
+        return {name: dict(entry) for name, entry in _totals.items()}
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _runs.clear()
+
+
+def stage_table(stages, total=None):
+    # Таблица этапов: вызовы, время, доля от перезапуска, доля попаданий в кэш
+    import pandas as pd
+
+    rows = []
+    for name, entry in stages.items():
+        calls, misses = entry["calls"], entry["misses"]
+        rows.append({
+            "Этап": name,
+            "Вызовов": calls,
+            "Время, мс": entry["seconds"] * 1000,
+            "Доля, %": entry["seconds"] / total * 100 if total else None,
+            "Попаданий в кэш, %": (1 - (misses or 0) / calls) * 100 if calls and misses is not None else None,
+        })
+    table = pd.DataFrame(rows, columns=["Этап", "Вызовов", "Время, мс", "Доля, %", "Попаданий в кэш, %"])
+    return table.sort_values("Время, мс", ascending=False).round(1)
+
+
+def show_panel(session=None):
+    # Панель в боковом меню: включение замеров, последний перезапуск сессии, итоги процесса, выгрузка JSONL
+    import streamlit as st
+
+    with st.sidebar.expander("⏱️ Профилирование"):
+        # Флаг общий для процесса: меняется только при переключении (on_change), а положение
+        # переключателя в каждой сессии подтягивается к текущему значению флага
+        st.session_state["instrumentation_enabled"] = ENABLED
+        st.toggle("Замерять перезапуски", key="instrumentation_enabled",
+                  on_change=lambda: set_enabled(st.session_state["instrumentation_enabled"]))
+        if not ENABLED:
+            st.caption("Замеры выключены.")
+            return
+        mine = [run for run in runs() if session is None or run["session"] == session]
+        if mine:
+            last = mine[-1]
+            st.markdown(f"**{last['page']}** — {last['seconds'] * 1000:.0f} мс ({last['time']})")
+            st.dataframe(stage_table(last["stages"], last["seconds"]), hide_index=True)
+        else:
+            st.caption("Перезапусков ещё нет — результат появится после следующего.")
+        st.markdown("**Все сессии с запуска процесса**")
+        st.dataframe(stage_table(totals()), hide_index=True)
+        if os.path.exists(METRICS_PATH):
+            with open(METRICS_PATH, "rb") as f:
+                st.download_button("Скачать замеры (JSONL)", f.read(), file_name="metrics.jsonl",
+                                   mime="application/jsonl")
+        if st.button("Сбросить"):
+            reset()
@@ -0,0 +1,26 @@
+import numpy as np
+
+# Интерполяция по предрасчитанным таблицам на прямоугольной сетке.
+
+
+def bilinear(x_grid, y_grid, values, x, y):
+    # Билинейная интерполяция values[len(x_grid), len(y_grid)] в точках (x, y).
+    # x и y могут быть числами или массивами (broadcast); точки вне сетки прижимаются к границе.
+    x_grid = np.asarray(x_grid, dtype=float)
+    y_grid = np.asarray(y_grid, dtype=float)
+    x = np.clip(np.asarray(x, dtype=float), x_grid[0], x_grid[-1])
+    y = np.clip(np.asarray(y, dtype=float), y_grid[0], y_grid[-1])
+
+    # Номер ячейки и относительное положение точки внутри неё
+    i = np.clip(np.searchsorted(x_grid, x, side="right") - 1, 0, len(x_grid) - 2)
+    j = np.clip(np.searchsorted(y_grid, y, side="right") - 1, 0, len(y_grid) - 2)
+    tx = (x - x_grid[i]) / (x_grid[i + 1] - x_grid[i])
+    ty = (y - y_grid[j]) / (y_grid[j + 1] - y_grid[j])
+
+    return ((1 - tx) * (1 - ty) * values[i, j] + tx * (1 - ty) * values[i + 1, j]
+            + (1 - tx) * ty * values[i, j + 1] + tx * ty * values[i + 1, j + 1])
+
+
+def in_domain(x_grid, y_grid, x, y):
+    # Попадает ли точка (x, y) в область сетки
+    return bool(x_grid[0] <= x <= x_grid[-1] and y_grid[0] <= y <= y_grid[-1])
@@ -1,64 +1,271 @@
-import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+import numpy as np
 import pandas as pd
+import streamlit as st
 import folium
+from branca.colormap import LinearColormap
+from folium.features import ColorLine
+from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
 from folium import Element
-from geopy.distance import geodesic
+from geodesy import cumulative_lengths, segment_lengths
+from simplify import vertex_importance, tolerance_for_zoom, simplify
+from route_store import ensure_store
+from spatial_index import SegmentIndex, read_points, link_points
+from section_routes import METRICS, sheet_region, match_routes, network_profiles, route_values, segment_values
+from data_store import file_fingerprint
+import instrumentation
+from instrumentation import cached, stage
 
 st.set_page_config(layout="wide")
+# Замеры перезапуска карты (при включённом профилировании); итог пишется перед обработкой масштаба карты
+instrumentation.begin_run("maps_pipe")
 st.title("Схема трубопроводов с точкой соединения и фильтрацией")
 
 # ===== Загрузка данных =====
 uploaded_file = "pipe.xlsx"  # Путь к файлу
+points_file = "coords_nsk.xlsx"  # Точки отбора проб
 sheet_options = ["ХКЦ", "МГПЗ", "ВГПЗ", "ВяКЦ", "ОГМ", "ВТГМ"]
+OVERVIEW = "Все регионы"  # Обзор всех вкладок на одной карте
+DETAIL_ZOOM = 10          # С этого масштаба в обзоре подгружается полная геометрия вкладок в поле зрения
+sheet_colors = ["blue", "green", "orange", "purple", "darkred", "cadetblue"]  # Цвет вкладки в обзоре
 
-selected_sheet = st.selectbox("Выберите участок (вкладку):", sheet_options)
+selected_sheet = st.selectbox("Выберите участок (вкладку):", sheet_options + [OVERVIEW])
+overview_mode = selected_sheet == OVERVIEW
 
-@st.cache_data
-def load_pipeline_data(sheet_name):
-    df = pd.read_excel(uploaded_file, sheet_name=sheet_name, skiprows=2)
-    columns = df.columns
-    route_names = [columns[i] for i in range(0, len(columns), 2)]
+@st.cache_resource
+def open_route_store(source):
+    # Бинарное хранилище маршрутов всех вкладок (memory map); пересобирается при изменении pipe.xlsx
+    return ensure_store(uploaded_file)
 
+def sheet_pipelines(store, sheet_name):
     colors = ["blue", "green", "orange", "purple", "gray", "black", "red"]
 
     pipeline_data = []
 
-    for idx, name in enumerate(route_names):
-        lat_col = columns[idx * 2]
-        lon_col = columns[idx * 2 + 1]
+    for idx, (no, route, path) in enumerate(store.sheet_routes(sheet_name)):
+        pipeline_data.append({
+            "name": route["name"],  # Подпись (в обзоре дополняется названием вкладки); имена могут повторяться
+            "sheet": sheet_name,
+            "route": no,  # Номер маршрута в хранилище: вместе с вкладкой — ключ длин, линий и гидравлики
+            "label": route["label"],  # Типоразмер трубы, например «530 х 8»
+            "path": path,  # Координаты (широта, долгота) — срез memory map без копирования
+            "start": path[0].tolist(),
+            "color": colors[idx % len(colors)],
+            "importance": vertex_importance(path)  # Значимость вершин для упрощения линий по масштабу
+        })
+    return pipeline_data
 
-        coords = df[[lat_col, lon_col]].dropna()
-        path = list(zip(coords[lat_col], coords[lon_col]))
-
-        if path:
-            pipeline_data.append({
-                "name": name,
-                "path": path,
-                "start": path[0],
-                "color": colors[idx % len(colors)]
-            })
+@cached("maps_pipe.load_pipeline_data", st.cache_resource)
+def load_pipeline_data(sheet_name, source):
+    pipeline_data = sheet_pipelines(open_route_store(source), sheet_name)
 
     # Общая точка соединения — конец последнего маршрута
-    common_point = pipeline_data[-1]["path"][-1] if pipeline_data else [63.300, 75.500]
+    common_point = pipeline_data[-1]["path"][-1].tolist() if pipeline_data else [63.300, 75.500]
     return pipeline_data, common_point
 
-pipeline_data, common_point = load_pipeline_data(selected_sheet)
+@cached("maps_pipe.load_overview", st.cache_resource)
+def load_overview(source):
+    # Все вкладки одной структурой: вкладки готовятся одновременно в пуле потоков. У маршрутов остаются
+    # только вершины, заметные при масштабе меньше DETAIL_ZOOM; полная геометрия — load_pipeline_data
+    store = open_route_store(source)
+    with ThreadPoolExecutor(max_workers=len(sheet_options)) as pool:
+        sheets = list(pool.map(lambda name: sheet_pipelines(store, name), sheet_options))
+
+    overview = {}
+    for name, color, pipes in zip(sheet_options, sheet_colors, sheets):
+        if not pipes:
+            continue
+        coarse = tolerance_for_zoom(DETAIL_ZOOM, pipes[0]["start"][0])
+        routes = []
+        for pipe in pipes:
+            keep = pipe["importance"] > coarse
+            routes.append({**pipe, "name": f"{name}: {pipe['name']}", "color": color,
+                           "path": np.asarray(pipe["path"])[keep], "importance": pipe["importance"][keep],
+                           "vertices": np.flatnonzero(keep)})  # Номера оставленных вершин полного маршрута
+        coords = np.concatenate([pipe["path"] for pipe in pipes])
+        overview[name] = {"color": color, "routes": routes,
+                          "bounds": [coords.min(axis=0).tolist(), coords.max(axis=0).tolist()]}
+    return overview
+
+@cached("maps_pipe.hydraulic_overlay", st.cache_data)
+def hydraulic_overlay(sheets, flow, pressure, density, t_gas, t_soil, source):
+    # Давление, удельные потери и скорость в вершинах маршрутов по расчёту сети региона каждой вкладки:
+    # {(вкладка, номер маршрута): {метрика: значения по вершинам}} и список вкладок, где расчёт не удался.
+    # Зависит только от условий расчёта — перемещение и масштаб карты его не пересчитывают.
+    from pipe_network import build_network, NetworkSolver, boundary_template, boundary_conditions
+
+    sections = pd.read_excel(uploaded_file, sheet_name="pipe").dropna(subset=["Регион", "Участок"])
+    store = open_route_store(source)
+    overlay, failed = {}, []
+    for sheet in sheets:
+        region = sheet_region(sections, sheet)
+        routes = store.sheet_routes(sheet)
+        if region is None or not routes:
+            continue
+        network = build_network(sections, region)
+        boundary = boundary_template(network, flow=flow, pressure=pressure)
+        try:
+            nodes, edges = NetworkSolver(network, density=density, t_gas=t_gas).solve(*boundary_conditions(boundary))
+        except ValueError:
+            failed.append(sheet)
+            continue
+        profiles = network_profiles(network, nodes, edges, t_gas, t_soil, density)
+        names = [route["name"] for _, route, _ in routes]
+        matched = match_routes(names, network.sections, sheet)
+        # Участки сопоставляются по имени, поэтому маршруты с одинаковым именем получают одни и те же участки
+        assignment = {i: matched[name] for i, name in enumerate(names) if name in matched}
+        values = route_values([path for *_, path in routes], assignment, network.length, profiles)
+        overlay.update({(sheet, routes[i][0]): route for i, route in values.items()})
+    return overlay, failed
+
+def visible_sheets(overview, view):
+    # Вкладки, рамка маршрутов которых пересекает видимую область карты
+    (south, west), (north, east) = view.get("bounds") or (view["center"], view["center"])
+    return [name for name, entry in overview.items()
+            if entry["bounds"][0][0] <= north and entry["bounds"][1][0] >= south
+            and entry["bounds"][0][1] <= east and entry["bounds"][1][1] >= west]
+
+@cached("maps_pipe.segment_index", st.cache_resource)
+def segment_index(sheet_name, source):
+    # Пространственный индекс отрезков вкладки (sheet_name=None — всех вкладок); строится один раз
+    return SegmentIndex.from_store(open_route_store(source), None if sheet_name is None else [sheet_name])
+
+@cached("maps_pipe.sampling_points", st.cache_data)
+def sampling_points(max_distance, source, points_source):
+    # Точки отбора проб, привязанные к ближайшей ветке любой вкладки
+    return link_points(segment_index(None, source), read_points(points_file), max_distance)
+
+pipe_source = file_fingerprint(uploaded_file)  # Отпечаток pipe.xlsx: ключ кэшей карты
+if overview_mode:
+    overview = load_overview(pipe_source)
+    common_point = (np.mean([np.mean(entry["bounds"], axis=0) for entry in overview.values()], axis=0).tolist()
+                    if overview else [63.300, 75.500])
+else:
+    pipeline_data, common_point = load_pipeline_data(selected_sheet, pipe_source)
 
 # ===== Интерфейс фильтрации =====
-all_names = [pipe["name"] for pipe in pipeline_data]
-selected_names = st.multiselect("Выберите отображаемые ветки", all_names, default=all_names)
-selected_pipelines = [pipe for pipe in pipeline_data if pipe["name"] in selected_names]
+if overview_mode:
+    # В обзоре выбираются регионы целиком
+    selected_regions = st.multiselect("Выберите отображаемые регионы", list(overview), default=list(overview))
+    selected_pipelines = [pipe for name in selected_regions for pipe in overview[name]["routes"]]
+else:
+    # Ветки выбираются по номеру: одинаковые имена на вкладке не склеиваются
+    all_routes = list(range(len(pipeline_data)))
+    selected_routes = st.multiselect("Выберите отображаемые ветки", all_routes, default=all_routes,
+                                     format_func=lambda i: pipeline_data[i]["name"])
+    selected_pipelines = [pipeline_data[i] for i in selected_routes]
 
 # ===== Расчёт протяжённости =====
-def calculate_length(path):
-    return sum(geodesic(path[i], path[i + 1]).km for i in range(len(path) - 1))
+def calculate_length(path, method="geodesic"):
+    return float(segment_lengths(path, method).sum())
+
+@cached("maps_pipe.route_lengths", st.cache_data)
+def route_cumulative_lengths(sheet_name, method, source):
+    # Накопленные длины всех маршрутов вкладки (км) по номеру маршрута, считаются одним векторным проходом
+    pipeline_data, _ = load_pipeline_data(sheet_name, source)
+    cumulative = cumulative_lengths([pipe["path"] for pipe in pipeline_data], method)
+    return {pipe["route"]: lengths for pipe, lengths in zip(pipeline_data, cumulative)}
 
-total_length = round(sum(calculate_length(pipe["path"]) for pipe in selected_pipelines), 2)
+length_methods = {"Точный (эллипсоид WGS-84)": "geodesic", "Быстрый (гаверсинус)": "haversine"}
+length_method = st.radio("Расчёт протяжённости:", list(length_methods), horizontal=True)
+
+# При переключении веток только суммируются закэшированные длины маршрутов
+route_lengths = {sheet: route_cumulative_lengths(sheet, length_methods[length_method], pipe_source)
+                 for sheet in {pipe["sheet"] for pipe in selected_pipelines}}
+total_length = round(sum(route_lengths[pipe["sheet"]][pipe["route"]][-1] for pipe in selected_pipelines), 2)
 st.markdown(f"**Протяжённость выбранных веток:** {total_length} км")
 
+# ===== Уровень детализации линий =====
+# Масштаб и центр карты запоминаются после каждого взаимодействия; линии упрощаются
+# под текущий масштаб (допуск ~1 пиксель), полная геометрия — по выбору пользователя
+view_key = f"map_view_{selected_sheet}"
+view = st.session_state.get(view_key, {"zoom": 7 if overview_mode else 10, "center": common_point})
+detail = st.radio("Детализация линий:", ["Авто (по масштабу)", "Полная"], horizontal=True)
+tolerance = tolerance_for_zoom(view["zoom"], view["center"][0]) if detail == "Авто (по масштабу)" else 0
+
+def detailed_sheets(view):
+    # Вкладки обзора, для которых нужна полная геометрия: в поле зрения при крупном масштабе или все
+    if detail == "Полная":
+        return selected_regions
+    return [name for name in visible_sheets(overview, view) if name in selected_regions] \
+        if view["zoom"] >= DETAIL_ZOOM else []
+
+if overview_mode:
+    # Полная геометрия вкладок подгружается по требованию, остальные — упрощённые линии обзора
+    detailed = detailed_sheets(view)
+    selected_pipelines = [
+        {**pipe, "name": f"{name}: {pipe['name']}", "color": overview[name]["color"]} if name in detailed else pipe
+        for name in selected_regions
+        for pipe in (load_pipeline_data(name, pipe_source)[0] if name in detailed else overview[name]["routes"])
+    ]
+    if detailed:
+        st.caption("Подробная геометрия: " + ", ".join(detailed))
+
+with stage("maps_pipe.simplify"):
+    display_paths = {(pipe["sheet"], pipe["route"]): simplify(pipe["path"], pipe["importance"], tolerance).tolist()
+                     for pipe in selected_pipelines}
+total_points = sum(len(pipe["path"]) for pipe in selected_pipelines)
+shown_points = sum(len(path) for path in display_paths.values())
+st.caption(f"Точек на карте: {shown_points} из {total_points}")
+
+# ===== Ближайшая ветка к точке щелчка =====
+search_scope = "На всех вкладках" if overview_mode else st.radio(
+    "Ближайшая ветка к точке щелчка:", ["На этой вкладке", "На всех вкладках"], horizontal=True)
+click_key = f"map_click_{selected_sheet}"
+click = st.session_state.get(click_key)
+nearest = None
+if click:
+    index = segment_index(selected_sheet if search_scope == "На этой вкладке" else None, pipe_source)
+    with stage("maps_pipe.nearest"):
+        started = perf_counter()
+        found = index.nearest(click[0], click[1])
+        elapsed_ms = (perf_counter() - started) * 1000
+    if found["route"][0] >= 0:
+        route = index.routes[found["route"][0]]
+        nearest = [found["lat"][0], found["lon"][0]]
+        st.markdown(f"**Ближайшая ветка:** {route['name']} ({route['sheet']}) — "
+                    f"{found['distance'][0] * 1000:.0f} м до трубы, {found['along'][0]:.2f} км от начала ветки")
+        st.caption(f"Точка щелчка: {click[0]:.5f}, {click[1]:.5f}; поиск {elapsed_ms:.1f} мс")
+    else:
+        st.caption("На вкладке нет маршрутов для поиска.")
+
+show_points = st.checkbox(f"Точки отбора проб ({points_file})")
+if show_points:
+    max_distance = st.number_input("Привязывать точки к ветке не дальше, км", min_value=0.1, value=5.0, step=0.5)
+    points = sampling_points(max_distance, pipe_source, file_fingerprint(points_file))
+    st.caption(f"Точек: {len(points)}, привязано к веткам: {points['Ветка'].notna().sum()}")
+    with st.expander("Привязка точек к веткам"):
+        st.dataframe(points, hide_index=True)
+
+# ===== Гидравлика на карте =====
+show_hydraulics = st.checkbox("Раскрасить ветки по гидравлическому расчёту сети")
+overlay = {}
+if show_hydraulics:
+    col1, col2, col3, col4, col5 = st.columns(5)
+    source_flow = col1.number_input("Подача ДНС (тыс. м³/сут)", min_value=0.0, value=300.0, step=50.0)
+    sink_pressure = col2.number_input("Давление приёма (МПа)", min_value=0.1, value=0.6, step=0.1)
+    gas_density = col3.number_input("Плотность газа (кг/м³)", min_value=0.5, value=0.9, step=0.05)
+    gas_temp = col4.number_input("Температура газа (°C)", value=20.0, step=1.0)
+    soil_temp = col5.number_input("Температура грунта (°C)", value=5.0, step=1.0)
+    metric = st.radio("Раскраска:", list(METRICS), format_func=METRICS.get, horizontal=True)
+    sheets = tuple(selected_regions) if overview_mode else (selected_sheet,)
+    overlay, failed = hydraulic_overlay(sheets, source_flow, sink_pressure, gas_density, gas_temp, soil_temp,
+                                        pipe_source)
+    colored = [pipe for pipe in selected_pipelines if (pipe["sheet"], pipe["route"]) in overlay]
+    st.caption(f"Сопоставлено с участками листа 'pipe': {len(colored)} из {len(selected_pipelines)} веток "
+               "(по имени начала участка и таблице route_sections.csv)")
+    if failed:
+        st.warning("Расчёт сети не сошёлся: " + ", ".join(failed))
+    values = np.concatenate([overlay[(pipe["sheet"], pipe["route"])][metric] for pipe in colored]) \
+        if colored else np.zeros(0)
+    values = values[np.isfinite(values)]
+    colormap = LinearColormap(["#2c7bb6", "#ffffbf", "#d7191c"], vmin=float(values.min()) if len(values) else 0.0,
+                              vmax=float(values.max()) if len(values) else 1.0, caption=METRICS[metric])
+
 # ===== Создание карты =====
-m = folium.Map(location=common_point, zoom_start=10, tiles=None, control_scale=True)
+m = folium.Map(location=view["center"], zoom_start=view["zoom"], tiles=None, control_scale=True)
 
 folium.TileLayer(
     tiles='https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png',
@@ -67,27 +274,61 @@ folium.TileLayer(
     control=False
 ).add_to(m)
 
+# В обзоре маркеры начала веток объединяются в кластеры при мелком масштабе
+markers = MarkerCluster(name="Начала веток").add_to(m) if overview_mode else m
+
 for pipe in selected_pipelines:
-    folium.PolyLine(
-        locations=pipe["path"],
-        color=pipe["color"],
-        weight=5,
-        opacity=0.8,
-        tooltip=pipe["name"]
-    ).add_to(m)
+    hydraulics = overlay.get((pipe["sheet"], pipe["route"]))
+    if hydraulics is None:
+        folium.PolyLine(
+            locations=display_paths[(pipe["sheet"], pipe["route"])],
+            color=pipe["color"],
+            weight=5,
+            opacity=0.8,
+            tooltip=pipe["name"]
+        ).add_to(m)
+    else:
+        # Отрезки отображаемой линии — значения в оставленных вершинах полного маршрута
+        vertices = pipe.get("vertices", np.arange(len(pipe["path"])))
+        kept = vertices if tolerance <= 0 else vertices[np.asarray(pipe["importance"]) > tolerance]
+        segment = segment_values(hydraulics[metric], kept)
+        segment = np.where(np.isfinite(segment), segment, colormap.vmax)  # Запирание потока — как максимум
+        line = ColorLine(display_paths[(pipe["sheet"], pipe["route"])], segment, colormap=colormap, weight=6,
+                         opacity=0.9)
+        folium.Tooltip(f"{pipe['name']}: {METRICS[metric]} {np.nanmin(hydraulics[metric]):.4g}"
+                       f"–{np.nanmax(hydraulics[metric]):.4g}").add_to(line)
+        line.add_to(m)
 
     folium.Marker(
         location=pipe["start"],
         tooltip=f"Начало: {pipe['name']}",
         icon=folium.Icon(color=pipe["color"])
-    ).add_to(m)
+    ).add_to(markers)
 
 # Узел соединения
-folium.Marker(
-    location=common_point,
-    tooltip="Узел соединения",
-    icon=folium.Icon(color="red", icon="glyphicon glyphicon-map-marker")
-).add_to(m)
+if not overview_mode:
+    folium.Marker(
+        location=common_point,
+        tooltip="Узел соединения",
+        icon=folium.Icon(color="red", icon="glyphicon glyphicon-map-marker")
+    ).add_to(m)
+
+# Точка щелчка и ближайшая точка на трубе
+if click and nearest:
+    folium.PolyLine(locations=[click, nearest], color="red", weight=2, dash_array="5, 5").add_to(m)
+    folium.CircleMarker(location=nearest, radius=6, color="red", fill=True,
+                        tooltip="Ближайшая точка на трубе").add_to(m)
+
+if show_points:
+    for _, point in points.iterrows():
+        tooltip = (f"{point['Ветка']}: {point['Расстояние до трубы (м)']:.0f} м до трубы, "
+                   f"{point['От начала ветки (км)']:.2f} км от начала" if isinstance(point["Ветка"], str)
+                   else f"Дальше {max_distance:g} км от труб")
+        folium.CircleMarker(location=[point["Широта"], point["Долгота"]], radius=4, color="darkgreen",
+                            fill=True, tooltip=tooltip).add_to(m)
+
+if overlay:
+    colormap.add_to(m)
 
 css_hide = Element("""
     <style>
@@ -99,4 +340,26 @@ css_hide = Element("""
 m.get_root().html.add_child(css_hide)
 
 # ===== Отображение карты =====
-st_folium(m, width=1200, height=700)
+with stage("maps_pipe.render"):
+    map_state = st_folium(m, width=1200, height=700)
+instrumentation.end_run()
+if instrumentation.ADMIN:
+    instrumentation.show_panel()
+# Новый щелчок по карте — запоминаем точку и перестраиваем карту с найденной веткой
+if map_state and map_state.get("last_clicked"):
+    new_click = [map_state["last_clicked"]["lat"], map_state["last_clicked"]["lng"]]
+    if new_click != click:
+        st.session_state[click_key] = new_click
+        st.rerun()
+if map_state and map_state.get("zoom") and map_state.get("center"):
+    new_view = {"zoom": map_state["zoom"], "center": [map_state["center"]["lat"], map_state["center"]["lng"]]}
+    bounds = map_state.get("bounds") or {}
+    if bounds.get("_southWest") and bounds.get("_northEast"):
+        new_view["bounds"] = [[bounds["_southWest"]["lat"], bounds["_southWest"]["lng"]],
+                              [bounds["_northEast"]["lat"], bounds["_northEast"]["lng"]]]
+    if new_view != view:
+        st.session_state[view_key] = new_view
+        if new_view["zoom"] != view["zoom"] and detail == "Авто (по масштабу)":
+            st.rerun()  # Перестраиваем линии под новый масштаб
+        if overview_mode and detailed_sheets(new_view) != detailed:
+            st.rerun()  # В поле зрения попали другие вкладки — подгружаем их полную геометрию
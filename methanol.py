@@ -1,11 +1,48 @@
 import streamlit as st
 import numpy as np                          # для массивов и графиков
 import pandas as pd                         # для таблиц и экспорта
-import matplotlib.pyplot as plt             # построение графиков
-from CoolProp.CoolProp import HAPropsSI     # расчет точки росы и влажности
+from humidity import water_content, saturation_water_content  # расчет точки росы и влажности (кэшированный CoolProp)
 import math
-from io import BytesIO                      # для хранения файла в памяти
-import xlsxwriter                           # экспорт Excel
+from data_store import load_grid, protocol_groups, select_grid  # база протоколов: вся таблица, группы, выборка
+from protocol_store import ingest_file      # дозагрузка новых выгрузок в базу
+from hydrates import (hydrate_risk, methanol_for_water, INHIBITOR_METHODS, HAMMERSCHMIDT_LIMIT, HYDRATE_T, MARGIN,
+                      RISK, METHANOL_WT, IN_DOMAIN)  # гидратообразование по составу газа, векторно по всем протоколам
+from methanol_batch import (methanol_demand, latest_protocols, conditions_template, compute_batch,
+                            read_table)  # пакетный расчёт по всем группам
+from gas_properties import mole_fractions   # мольные доли компонентов протокола
+from property_tables import properties, standard_density, in_domain  # Z, плотность и вязкость по составу (таблицы P × T)
+from reports import fingerprint             # отпечаток входных данных отчёта
+from otchety import report_download         # Excel-отчёт только по запросу, с кэшем по отпечатку
+
+
+def run_batch_mode(df, ground_temp, density_source):
+    # Пакетный режим: последний протокол по каждой группе Месторождение / ДНС / Ступень отбора,
+    # условия задаются таблицей, расчёт — одним векторным проходом по всем группам
+    latest = latest_protocols(df)
+    st.markdown(f"### Пакетный расчёт: {len(latest)} групп")
+
+    conditions_file = st.sidebar.file_uploader("Таблица условий по группам (необязательно)",
+                                               type=["xlsx", "csv"])  # Колонки: Месторождение, ДНС, Ступень отбора, Расход газа, Давление, Температура газа, Содержание воды
+    if conditions_file:
+        conditions = read_table(conditions_file)
+    else:
+        conditions = conditions_template(latest)
+    conditions = st.data_editor(conditions, width="stretch", hide_index=True,
+                                key="methanol_batch_conditions")  # Условия можно поправить прямо в таблице
+
+    result = compute_batch(latest, conditions, ground_temp=ground_temp, density_source=density_source)
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Групп с подачей метанола", int((result["Метанол, л/сут"] > 0).sum()))
+    col2.metric("Метанол всего, л/сут", f"{result['Метанол, л/сут'].sum():.1f}")
+    col3.metric("Оптимальный расход, л/сут", f"{result['Оптимальный расход метанола (л/сут)'].sum():.1f}")
+    st.dataframe(result, width="stretch")
+
+    totals = result[["Метанол, кг/сут", "Метанол, л/сут", "Оптимальный расход метанола (л/сут)",
+                     "Потенциальная экономия (л/сут)"]].sum().to_frame("Итого").T
+    sheets = [("Расчет", result, None), ("Итого", totals, None), ("Условия", conditions, None)]
+    report_download("Скачать пакетный отчет в Excel", fingerprint(result, conditions), "xlsx",
+                    [lambda: iter(sheets)], "отчет_метанол_пакет.xlsx")
+
 
 def run_methanol_calc():
     # Установка ширины страницы на всю ширину экрана
@@ -32,36 +69,52 @@ def run_methanol_calc():
         except Exception as e:
             st.sidebar.error("Ошибка при получении данных о погоде")
 
-            # --- Загрузка данных Excel ---
-    uploaded_file = st.sidebar.file_uploader("Загрузите Excel файл с данными",
-                                             type="xlsx")  # Размещаем в боковой панели slidebar
-    if uploaded_file:  # Проверяем загружен ли файл. Если файл действительно загружен (то есть uploaded_file не None), тогда выполняется следующий блок кода.
-        excel_data = pd.ExcelFile(
-            uploaded_file)  # Загружает Excel-файл в оперативную память и позволяет работать с ним без немедленного считывания всех листов.
-
-        df = excel_data.parse(
-            'dhtmlxGrid')  # Загружает в память конкретный лист Excel-файла с названием dhtmlxGrid, результат сохраняется в переменной df, которая становится таблицей данных
+            # --- Дозагрузка выгрузки Excel в базу протоколов ---
+    uploaded_file = st.sidebar.file_uploader("Добавить выгрузку протоколов (xlsx)",
+                                             type="xlsx")  # Новые протоколы дописываются в общую базу, повторы пропускаются
+    if uploaded_file:
+        try:
+            report = ingest_file(uploaded_file)  # Тот же файл повторно не разбирается (проверка по хэшу)
+            if not report["skipped"]:
+                st.session_state["ingest_report"] = report
+        except ValueError as e:
+            st.sidebar.error(f"Выгрузка не загружена: {e}")
+    report = st.session_state.get("ingest_report")
+    if report:
+        st.sidebar.success(f"Добавлено протоколов: {report['added']}, уже в базе: {report['duplicates']}, "
+                           f"отклонено: {report['rejected']}")
+        if report["rejected"]:
+            with st.sidebar.expander("Отклонённые строки"):
+                st.dataframe(report["rejected_rows"][["Номер протокола", "Дата протокола", "Причина"]],
+                             hide_index=True)
 
-        if 'Дата протокола' in df.columns:  # Проверяет, есть ли в таблице столбец с названием Дата протокола
-            df['Дата протокола'] = pd.to_datetime(df['Дата протокола'],
-                                                  errors='coerce')  # Приводит значения этого столбца к формату даты и времени, т.е. преобразует строки или числа в даты
+    index = protocol_groups()  # Группы Месторождение → ДНС → Ступень из базы (без чтения строк протоколов)
+    if index.groups:  # База не пуста: протоколы берутся из неё, 'Дата протокола' уже приведена к datetime
+        calc_mode = st.sidebar.radio("Режим расчёта", ["Выбранная ступень",
+                                                       "Все группы (пакетный)"])  # Пакетный режим считает все группы сразу
+        density_names = {"composition": "По составу (ст. условия)", "protocol": "Из протокола"}
+        density_source = st.sidebar.radio("Плотность газа", list(density_names),
+                                          format_func=density_names.get)  # По составу — одинаково со страницей гидравлики; в протоколе бывают ошибки ввода
+        if calc_mode == "Все группы (пакетный)":
+            run_batch_mode(load_grid(), ground_temp, density_source)
+            return
 
         # --- Выбор Месторождения, ДНС и ступени ---
         st.sidebar.subheader("Выбор параметров")
-        field = st.sidebar.selectbox("Выберите месторождение", df[
-            'Месторождение'].unique())  # Создаёт выпадающий список в сайдбаре с надписью: "Выберите месторождение". df['Месторождение'].unique() — извлекает список уникальных месторождений из исходного DataFrame df
-        df_field = df[df[
-                          'Месторождение'] == field]  # Отфильтровывает DataFrame, оставляя только строки, соответствующие выбранному месторождению
+        field = st.sidebar.selectbox("Выберите месторождение", index.options(
+            'Месторождение'))  # Создаёт выпадающий список в сайдбаре с надписью: "Выберите месторождение". Список уникальных месторождений берётся из индекса, а не из полного прохода по таблице
 
-        dns = st.sidebar.selectbox("Выберите объект подготовки (ДНС)", df_field[
-            'ДНС'].unique())  # Создаёт второй выпадающий список. Извлекает уникальные значения ДНС, только среди строк выбранного месторождения (df_field)
-        df_dns = df_field[df_field[
-                              'ДНС'] == dns]  # Ещё одно фильтрование: оставляет только те строки, где объект подготовки соответствует выбранному (dns)
+        dns = st.sidebar.selectbox("Выберите объект подготовки (ДНС)", index.options(
+            'ДНС', {'Месторождение': [field]}))  # Создаёт второй выпадающий список. Значения ДНС — только для выбранного месторождения
 
-        stage = st.sidebar.selectbox("Укажите ступень отбора",
-                                     df_dns['Ступень отбора'].unique())  # Аналогично выбору объекта подготовки
-        selected_df = df_dns[df_dns['Ступень отбора'] == stage]
+        stage = st.sidebar.selectbox("Укажите ступень отбора", index.options(
+            'Ступень отбора', {'Месторождение': [field], 'ДНС': [dns]}))  # Аналогично выбору объекта подготовки
+        selected_df = select_grid({'Месторождение': [field], 'ДНС': [dns],
+                                   'Ступень отбора': [stage]})  # Строки выбранной группы — запрос к базе по индексу групп
 
+        if selected_df.empty:
+            st.warning("Нет протоколов для выбранной группы.")
+            st.stop()  # Пустой выбор (нет месторождений, ДНС или ступеней) — дальше считать не по чему
         selected_row = selected_df.iloc[
             -1]  # Берётся последняя строка из selected_df — предположительно, самая последняя (актуальная) запись. Потому что, как правило, данные хранятся в хронологическом порядке.
 
@@ -96,6 +149,14 @@ def run_methanol_calc():
         T_K = effective_temp + 273.15  # Переводит температуру из градусов Цельсия в Кельвины
         P_Pa = pressure * 1e6  # Переводит давление из мегапаскалей (МПа) в паскали (Па), потому что в инженерных библиотеках (как CoolProp) давление часто указывается в паскалях
 
+        # Свойства газа по составу последнего протокола: плотность при стандартных условиях и Z, ρ, μ при P и T
+        fractions = mole_fractions(selected_df.iloc[[-1]])[0]
+        gas_props = None
+        if not np.isnan(fractions).any():
+            gas_props = {name: float(value) for name, value in properties(fractions, pressure, T_K).items()}
+            if density_source == "composition":
+                gas_density = float(standard_density(fractions))
+
         # Влажность
         st.sidebar.subheader("Влажность газа")
         dew_mode = st.sidebar.radio("Источник данных о воде", ["Измеренное содержание (г/м³)",
@@ -107,17 +168,17 @@ def run_methanol_calc():
                                                 value=0.0)  # Расчет по точке росы, то пользователь вводит её значение (например, 0 °C)
             try:
                 RH = 1.0  # Выполняется расчет концентрации воды с помощью библиотеки CoolProp,
-                w_kg_kgdryair = HAPropsSI("W", "T", dew_point + 273.15, "P", P_Pa, "R",
-                                          RH)  # HAPropsSI(...) — функция расчета влажности воздуха по параметрам
-                measured_water_content = w_kg_kgdryair * 1000 * 18.015
+                measured_water_content = water_content(dew_point + 273.15, P_Pa,
+                                                       RH)  # HAPropsSI с кэшем по квантованным (T, P, RH): повторные перезапуски не вызывают CoolProp
             except:
                 measured_water_content = 0.0
                 st.warning("Ошибка расчета по точке росы")
 
+        use_table = st.sidebar.checkbox("Табличный расчёт насыщения",
+                                        value=True)  # Интерполяция по предрасчитанной таблице 1–10 МПа × 0–60 °C вместо прямого вызова CoolProp
         try:
-            max_w_kg_kgdryair = HAPropsSI("W", "T", T_K, "P", P_Pa, "R",
-                                          1.0)  # Вычисляется максимальное влагосодержание при текущей температуре и давлении (100% влажность), предельно допустимая концентрация водяного пара в газе, выше которой начинается конденсация (конденсат в трубопроводе).
-            max_water_g_m3 = max_w_kg_kgdryair * 1000 * 18.015
+            max_water_g_m3 = saturation_water_content(T_K, P_Pa,
+                                                      use_table)  # Вычисляется максимальное влагосодержание при текущей температуре и давлении (100% влажность), предельно допустимая концентрация водяного пара в газе, выше которой начинается конденсация (конденсат в трубопроводе).
         except:
             max_water_g_m3 = None
 
@@ -125,26 +186,22 @@ def run_methanol_calc():
             "Давление (МПа)": pressure,
             "Температура (°C)": effective_temp,
             "Содержание воды (г/м³)": measured_water_content,
-            "Макс. допустимое содержание воды (г/м³)": max_water_g_m3
+            "Макс. допустимое содержание воды (г/м³)": max_water_g_m3,
+            "Плотность газа (ст. условия), кг/м³": gas_density
         }  # Сохраняем базовые данные в словарь result, который потом отобразим в таблице
+        if gas_props is not None:  # Свойства газа при давлении и температуре расчёта (те же таблицы, что на странице гидравлики)
+            result.update({"Z при P, T": gas_props["z"], "Плотность при P, T (кг/м³)": gas_props["density"],
+                           "Вязкость газа (мкПа·с)": gas_props["viscosity"] * 1e6})
+            if not in_domain(fractions, T_K):
+                st.caption("Газ ниже области корреляции Дранчука — Абу-Кассема по приведённой температуре: "
+                           "возможна конденсация, Z и плотность приближённые.")
 
         if max_water_g_m3 is not None:  # Если расчет допустимой влаги выполнен (max_water_g_m3 не None) и фактическое содержание воды превышает допустимое, начинаем расчет
             if measured_water_content > max_water_g_m3:
-                excess_water = measured_water_content - max_water_g_m3  # Разница между фактическим и допустимым уровнем
-                excess_water_kg = (
-                                              excess_water / 1000) * gas_flow * gas_density  # Перевод избытка влаги в массу в килограммах: excess_water / 1000 — в кг/м³, gas_flow — объем газа в м³/сут, gas_density — масса 1 м³ газа
-                methanol_mass_kg = excess_water_kg * 1.1  # На подачу метанола берется 110% от массы воды — технологический запас 10%
-                methanol_density = 792.0  # Плотность метанола кг/м3
-                methanol_vol_liters = methanol_mass_kg / (methanol_density / 1000)  # Перевод массы метанола в литры.
-                optimal_methanol = methanol_vol_liters * 0.85  # Оптимизация расхода метанола. Можно уменьшить подачу на 15%, чтобы избежать перерасхода.
-                economy = methanol_vol_liters - optimal_methanol  # Сколько литров можно сэкономить.
-
-                result[
-                    "Избыток влаги (г/м³)"] = excess_water  # Все расчеты добавляются в словарь result, затем он выводится в таблицу
-                result["Метанол, кг/сут"] = methanol_mass_kg
-                result["Метанол, л/сут"] = methanol_vol_liters
-                result["Оптимальный расход метанола (л/сут)"] = optimal_methanol
-                result["Потенциальная экономия (л/сут)"] = economy
+                demand = methanol_demand(measured_water_content, max_water_g_m3, gas_flow,
+                                         gas_density)  # Избыток влаги, масса и объём метанола (запас 10%), оптимальный расход (−15%) и экономия — общий расчёт с пакетным режимом
+                result.update({k: float(v) for k, v in
+                               demand.items()})  # Все расчеты добавляются в словарь result, затем он выводится в таблицу
 
                 st.success(
                     "💧 Требуется подача метанола")  # Преобразуем словарь result в таблицу и выводим в интерфейсе.
@@ -153,6 +210,25 @@ def run_methanol_calc():
         else:
             st.warning("Не удалось рассчитать максимально допустимое содержание влаги.")
 
+        # --- Гидратообразование по составу последнего протокола ---
+        inhibitor_names = {"auto": "Авто (Хаммершмидт до 25 %, выше — Нильсен — Баклин)",
+                           "hammerschmidt": "Хаммершмидт", "nielsen_bucklin": "Нильсен — Баклин"}
+        inhibitor_method = st.sidebar.selectbox("Расчёт концентрации метанола", INHIBITOR_METHODS,
+                                                format_func=inhibitor_names.get)  # Хаммершмидт — до ~25 масс. %, выше — Нильсен — Баклин
+        hydrate = hydrate_risk(selected_df.iloc[[-1]], pressure, effective_temp, method=inhibitor_method).iloc[0]
+        result[HYDRATE_T] = hydrate[HYDRATE_T]
+        result[METHANOL_WT] = hydrate[METHANOL_WT]
+        if hydrate[RISK]:
+            excess_water_kg = max(measured_water_content - (max_water_g_m3 or 0.0), 0.0) * gas_flow / 1000  # Выпавшая вода, кг/сут
+            result["Метанол от гидратов, кг/сут"] = float(methanol_for_water(excess_water_kg, hydrate[METHANOL_WT]))
+            st.warning(f"🧊 Риск гидратообразования: температура гидратообразования {hydrate[HYDRATE_T]:.1f} °C, "
+                       f"нужен метанол {hydrate[METHANOL_WT]:.1f} масс. % в водной фазе")
+        if inhibitor_method == "hammerschmidt" and hydrate[METHANOL_WT] > HAMMERSCHMIDT_LIMIT:
+            st.caption(f"Концентрация метанола выше области формулы Хаммершмидта ({HAMMERSCHMIDT_LIMIT:g} масс. %) — "
+                       "оценка занижена, точнее — по Нильсену — Баклину.")
+        if not hydrate[IN_DOMAIN]:
+            st.caption("Относительная плотность газа вне области корреляции Мотиея (0.55–1.0) — оценка приближённая.")
+
         st.subheader("📋 Результаты расчета")  # Преобразуем словарь result в таблицу и выводим в интерфейсе.
         result_df = pd.DataFrame([result])
         st.dataframe(result_df, use_container_width=True)
@@ -160,6 +236,7 @@ def run_methanol_calc():
         st.subheader(
             "📊 График расхода метанола")  # Если метанол рассчитан: Строится столбчатая диаграмма. Сравниваются: фактический расчёт и оптимальный (экономичный) расход.
         if "Метанол, л/сут" in result:
+            import matplotlib.pyplot as plt     # построение графиков (импорт только при выводе графика)
             fig, ax = plt.subplots(figsize=(12, 6))
             ax.bar(["Фактический"], [result["Метанол, л/сут"]], color='blue', label='Фактический')
             ax.bar(["Оптимальный"], [result["Оптимальный расход метанола (л/сут)"]], color='green', label='Оптимальный')
@@ -173,16 +250,25 @@ def run_methanol_calc():
             "Дата протокола", "Номер протокола", "Метан", "Этан", "Пропан", "и-Бутан", "н-Бутан",
             "и-Пентан", "н-Пентан", "Гексаны", "Гептаны", "Октаны", "Кислород", "Водород", "Гелий", "Азот"
         ]
-        output = BytesIO()  # BytesIO() создаёт буфер в оперативной памяти — по сути, "виртуальный файл", который не записывается на диск. Он нужен для временного хранения Excel-файла перед тем, как передать его пользователю через кнопку скачивания.
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:  # Создание Excel-файла с двумя листами
-            result_df.to_excel(writer, index=False, sheet_name='Расчет')
-            selected_df[display_columns].to_excel(writer, index=False, sheet_name='Компоненты')
-        st.download_button(
-            label="Скачать отчет в Excel",
-            data=output.getvalue(),
-            file_name=f"отчет_метанол_{field}_{dns}_{stage}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )  # Кнопка скачивания Excel-файла. mime=... — MIME-тип для Excel-файлов (нужно, чтобы браузер понял тип содержимого).
+        # Файл с двумя листами собирается только после нажатия «Подготовить» (а не при каждом перезапуске)
+        # и берётся из дискового кэша отчётов, пока результаты и исходные данные не изменились
+        sheets = [("Расчет", result_df, None), ("Компоненты", selected_df[display_columns], None)]
+        report_download("Скачать отчет в Excel", fingerprint(result_df, selected_df[display_columns]), "xlsx",
+                        [lambda: iter(sheets)], f"отчет_метанол_{field}_{dns}_{stage}.xlsx")
+
+        # --- Риск гидратообразования по всем протоколам месторождения (один векторный проход) ---
+        with st.expander(f"🧊 Риск гидратообразования: все протоколы месторождения {field}"):
+            field_df = select_grid({'Месторождение': [field]})
+            risk = hydrate_risk(field_df, pressure, effective_temp, method=inhibitor_method)
+            info_columns = [col for col in ["ДНС", "Ступень отбора", "Дата протокола", "Номер протокола"]
+                            if col in field_df.columns]
+            st.caption(f"Протоколов: {len(risk)}, с риском при {pressure:.1f} МПа и {effective_temp:.1f} °C: "
+                       f"{int(risk[RISK].sum())}")
+            if inhibitor_method == "hammerschmidt" and (risk[METHANOL_WT] > HAMMERSCHMIDT_LIMIT).any():
+                st.caption(f"У {int((risk[METHANOL_WT] > HAMMERSCHMIDT_LIMIT).sum())} протоколов концентрация метанола "
+                           f"выше области формулы Хаммершмидта ({HAMMERSCHMIDT_LIMIT:g} масс. %).")
+            st.dataframe(pd.concat([field_df[info_columns], risk], axis=1).sort_values(MARGIN),
+                         width="stretch", hide_index=True)
 
         # --- Отображение таблицы компонентов ---
         st.subheader("📑 Исходные данные")
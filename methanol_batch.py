@@ -0,0 +1,180 @@
+import argparse
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from protocol_store import GRID_SHEET, STORE_PATH, query
+from grid_index import LEVELS
+from humidity import saturation_water_content_array
+from hydrates import HYDRATE_T, MARGIN, METHANOL_WT, hydrate_risk, methanol_for_water
+from gas_properties import mole_fractions
+from property_tables import standard_density
+
+# Пакетный расчёт потребности в метаноле по всем группам Месторождение / ДНС / Ступень отбора.
+# Для каждой группы берётся последний протокол, условия (расход, давление, температура, влага)
+# задаются таблицей, а избыток влаги и расход метанола считаются одним векторным проходом.
+# Плотность газа для пересчёта расхода в массу — из протокола или по его составу при стандартных
+# условиях (property_tables); у протоколов без состава остаётся плотность из протокола.
+# Используется страницей «Метанол» и из командной строки для ночных расчётов:
+#   python methanol_batch.py grid.xlsx --conditions условия.xlsx -o метанол.xlsx
+#   python methanol_batch.py --conditions условия.xlsx -o метанол.xlsx   (протоколы из базы)
+
+METHANOL_RESERVE = 1.1      # На подачу метанола берется 110% от массы воды — технологический запас 10%
+METHANOL_DENSITY = 792.0    # Плотность метанола кг/м3
+OPTIMAL_SHARE = 0.85        # Оптимальный расход — на 15% меньше расчётного
+
+# Колонки таблицы условий и значения по умолчанию (как на странице одиночного расчёта)
+FLOW = "Расход газа (м³/сут)"
+PRESSURE = "Давление (МПа)"
+GAS_TEMP = "Температура газа (°C)"
+WATER = "Содержание воды (г/м³)"
+CONDITION_DEFAULTS = {FLOW: 100000.0, PRESSURE: 6.0, GAS_TEMP: 5.0, WATER: 20.0}
+
+DATE_COLUMN = "Дата протокола"
+DENSITY_COLUMN = "Плотность реального газа"
+STD_DENSITY = "Плотность по составу (кг/м³)"
+DENSITY_SOURCES = ["composition", "protocol"]
+HYDRATE_METHANOL = "Метанол от гидратов, кг/сут"
+
+
+def methanol_demand(measured_water, max_water, gas_flow, gas_density):
+    # Избыток влаги и расход метанола (числа или массивы). Если влага в норме — нули.
+    measured_water = np.asarray(measured_water, dtype=float)
+    max_water = np.asarray(max_water, dtype=float)
+    excess_water = np.where(measured_water > max_water, measured_water - max_water, 0.0)
+    excess_water_kg = (excess_water / 1000) * gas_flow * gas_density  # Перевод избытка влаги в массу, кг/сут
+    methanol_mass_kg = excess_water_kg * METHANOL_RESERVE
+    methanol_vol_liters = methanol_mass_kg / (METHANOL_DENSITY / 1000)  # Перевод массы метанола в литры
+    optimal_methanol = methanol_vol_liters * OPTIMAL_SHARE
+    return {
+        "Избыток влаги (г/м³)": excess_water,
+        "Метанол, кг/сут": methanol_mass_kg,
+        "Метанол, л/сут": methanol_vol_liters,
+        "Оптимальный расход метанола (л/сут)": optimal_methanol,
+        "Потенциальная экономия (л/сут)": methanol_vol_liters - optimal_methanol,
+    }
+
+
+def latest_protocols(df):
+    # Последний протокол в каждой группе (по дате протокола, при равных датах — последний в таблице)
+    levels = [col for col in LEVELS if col in df.columns]
+    ordered = df
+    if DATE_COLUMN in df.columns:
+        ordered = df.sort_values(DATE_COLUMN, kind="stable", na_position="first")
+    latest = ordered.groupby(levels, observed=True, dropna=False, sort=False).tail(1)
+    return latest.sort_values(levels).reset_index(drop=True)
+
+
+def conditions_template(latest, defaults=None):
+    # Таблица условий по группам, заполненная значениями по умолчанию (для редактирования или выгрузки)
+    values = {**CONDITION_DEFAULTS, **(defaults or {})}
+    levels = [col for col in LEVELS if col in latest.columns]
+    template = latest[levels].copy()
+    for column, value in values.items():
+        template[column] = value
+    return template
+
+
+def compute_batch(latest, conditions=None, defaults=None, ground_temp=None, use_table=True,
+                  density_source="composition"):
+    # Расчёт для всех групп. conditions — таблица условий по группам (колонки LEVELS + условия);
+    # группы без строки в conditions и пустые ячейки берут значения по умолчанию.
+    # density_source — плотность газа из протокола ("protocol") или по составу ("composition").
+    levels = [col for col in LEVELS if col in latest.columns]
+    values = {**CONDITION_DEFAULTS, **(defaults or {})}
+    table = latest[levels + [col for col in [DATE_COLUMN, "Номер протокола", DENSITY_COLUMN] if col in latest.columns]]
+    table = table.astype({col: object for col in levels})
+
+    if conditions is not None and len(conditions):
+        given = conditions[levels + [col for col in values if col in conditions.columns]]
+        given = given.astype({col: object for col in levels}).drop_duplicates(levels, keep="last")
+        table = table.merge(given, on=levels, how="left")
+    for column, value in values.items():
+        table[column] = pd.to_numeric(table[column], errors="coerce").fillna(value) if column in table else value
+
+    # Расчётная температура — минимум из температуры газа и грунта (при ней возможна конденсация)
+    effective_temp = table[GAS_TEMP].to_numpy(dtype=float)
+    if ground_temp is not None:
+        effective_temp = np.minimum(effective_temp, ground_temp)
+    max_water = saturation_water_content_array(effective_temp + 273.15, table[PRESSURE].to_numpy(dtype=float) * 1e6,
+                                               use_table)
+
+    table["Температура (°C)"] = effective_temp
+    table["Макс. допустимое содержание воды (г/м³)"] = max_water
+    density = table[DENSITY_COLUMN].to_numpy(dtype=float) if DENSITY_COLUMN in table else np.full(len(table), np.nan)
+    if density_source == "composition":
+        table[STD_DENSITY] = standard_density(mole_fractions(latest))
+        density = np.where(np.isnan(table[STD_DENSITY]), density, table[STD_DENSITY])
+    demand = methanol_demand(table[WATER].to_numpy(dtype=float), max_water,
+                             table[FLOW].to_numpy(dtype=float), density)
+    for column, value in demand.items():
+        table[column] = value
+
+    # Гидратообразование по составу последнего протокола группы и метанол для водной фазы
+    hydrate = hydrate_risk(latest, table[PRESSURE].to_numpy(dtype=float), effective_temp)
+    for column in [HYDRATE_T, MARGIN, METHANOL_WT]:
+        table[column] = hydrate[column].to_numpy()
+    water_kg = demand["Избыток влаги (г/м³)"] * table[FLOW].to_numpy(dtype=float) / 1000  # Выпавшая вода, кг/сут
+    table[HYDRATE_METHANOL] = methanol_for_water(water_kg, table[METHANOL_WT].fillna(0))
+    return table
+
+
+def batch_workbook(result, conditions=None):
+    # Excel-отчёт пакетного расчёта: лист с результатами по группам и лист с итогами
+    totals = result[["Метанол, кг/сут", "Метанол, л/сут", "Оптимальный расход метанола (л/сут)",
+                     "Потенциальная экономия (л/сут)"]].sum().to_frame("Итого").T
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        result.to_excel(writer, index=False, sheet_name="Расчет")
+        totals.to_excel(writer, index=False, sheet_name="Итого")
+        if conditions is not None:
+            conditions.to_excel(writer, index=False, sheet_name="Условия")
+    return output.getvalue()
+
+
+def read_table(path):
+    # Таблица условий из xlsx или csv (путь или загруженный файл)
+    if str(getattr(path, "name", path)).lower().endswith(".csv"):
+        return pd.read_csv(path)
+    return pd.read_excel(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный расчёт потребности в метаноле по всем группам протоколов")
+    parser.add_argument("grid", nargs="?", help="Выгрузка протоколов (xlsx, лист dhtmlxGrid); без неё — база протоколов")
+    parser.add_argument("--db", default=STORE_PATH, help="Файл базы протоколов")
+    parser.add_argument("--conditions", help="Таблица условий по группам (xlsx/csv)")
+    parser.add_argument("-o", "--output", default="метанол_пакет.xlsx", help="Итоговый Excel-файл")
+    parser.add_argument("--template", action="store_true", help="Только выгрузить шаблон таблицы условий в --output")
+    parser.add_argument("--ground-temp", type=float, help="Температура грунта, °C")
+    parser.add_argument("--flow", type=float, default=CONDITION_DEFAULTS[FLOW], help=FLOW)
+    parser.add_argument("--pressure", type=float, default=CONDITION_DEFAULTS[PRESSURE], help=PRESSURE)
+    parser.add_argument("--temperature", type=float, default=CONDITION_DEFAULTS[GAS_TEMP], help=GAS_TEMP)
+    parser.add_argument("--water", type=float, default=CONDITION_DEFAULTS[WATER], help=WATER)
+    parser.add_argument("--density", choices=DENSITY_SOURCES, default="composition",
+                        help="Плотность газа: из протокола или по составу при стандартных условиях")
+    args = parser.parse_args(argv)
+
+    if args.grid:
+        from data_store import prepare_grid  # Разбор выгрузки тянет Streamlit — только когда она передана
+        df = prepare_grid(pd.read_excel(args.grid, sheet_name=GRID_SHEET))
+    else:
+        df = query(path=args.db)
+    latest = latest_protocols(df)
+    defaults = {FLOW: args.flow, PRESSURE: args.pressure, GAS_TEMP: args.temperature, WATER: args.water}
+
+    if args.template:
+        conditions_template(latest, defaults).to_excel(args.output, index=False)
+        print(f"Шаблон условий для {len(latest)} групп сохранён в {args.output}")
+        return
+
+    conditions = read_table(args.conditions) if args.conditions else None
+    result = compute_batch(latest, conditions, defaults, ground_temp=args.ground_temp, density_source=args.density)
+    with open(args.output, "wb") as f:
+        f.write(batch_workbook(result, conditions))
+    print(f"Рассчитано групп: {len(result)}, метанол всего: {result['Метанол, л/сут'].sum():.1f} л/сут → {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import functools
+
+import streamlit as st
+import pandas as pd
+
+from data_store import protocol_groups, select_grid, store_revision, file_fingerprint  # база протоколов
+from reports import (ReportJobs, FORMATS, fingerprint, build_report, composition_section, hydraulics_section,
+                     methanol_section)
+
+PIPE_PATH = "pipe.xlsx"
+
+# Разделы отчёта: ключ → название
+SECTIONS = {
+    "composition": "Компонентный состав",
+    "hydraulics": "Гидравлика участков",
+    "methanol": "Потребность в метаноле",
+}
+
+
+@st.cache_resource
+def report_jobs():
+    # Фоновые задания отчётов — одни на процесс, общие для всех сессий
+    return ReportJobs()
+
+
+@st.cache_data
+def load_pipe():
+    return pd.read_excel(PIPE_PATH, sheet_name="pipe")
+
+
+def report_download(label, key, fmt, sections, file_name, title="Отчет"):
+    # Отчёт по требованию: файл собирается только после нажатия «Подготовить» и берётся из
+    # дискового кэша по отпечатку key, пока входные данные не изменились
+    state_key = f"report_ready_{file_name}"
+    if st.session_state.get(state_key) != key:
+        if not st.button(f"📄 Подготовить: {label}", key=f"prepare_{file_name}"):
+            return
+        st.session_state[state_key] = key
+    with st.spinner("Формирование отчёта..."):
+        path = build_report(key, fmt, sections, title)
+    with open(path, "rb") as f:
+        st.download_button(label=label, data=f.read(), file_name=file_name, mime=FORMATS[fmt])
+
+
+def read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+@st.fragment(run_every=1.0)
+def show_jobs():
+    # Задания текущей сессии: прогресс обновляется раз в секунду, готовые — кнопка скачивания
+    jobs = report_jobs()
+    session_jobs = st.session_state.get("report_jobs", [])
+    for job_id in reversed(list(session_jobs)):
+        job = jobs.get(job_id)
+        if job is None:  # Файл отчёта удалён при очистке кэша — задание убирается из списка
+            session_jobs.remove(job_id)
+            continue
+        st.markdown(f"**{job.title}** ({job.fmt.upper()})")
+        if job.status == "error":
+            st.error(f"❌ {job.error}")
+        elif job.status == "done":
+            # Файл читается только при нажатии «Скачать», а не при каждом обновлении фрагмента
+            st.download_button("Скачать", data=functools.partial(read_file, job.path),
+                               file_name=f"{job.title}.{job.fmt}", mime=FORMATS[job.fmt],
+                               key=f"download_{job.id}")
+        else:
+            st.progress(job.progress, text=job.message)
+
+
+def run_reports():
+    st.title("✅ Отчеты")
+    st.markdown("Выберите параметры и скачайте PDF/Excel.")
+
+    index = protocol_groups()
+    fields = st.multiselect("Месторождения (пусто — все):", index.options("Месторождение", {}))
+    selection = {"Месторождение": fields}
+    selected_df = select_grid(selection)
+    sections = st.multiselect("Разделы отчёта:", list(SECTIONS), default=list(SECTIONS), format_func=SECTIONS.get)
+    fmt = st.radio("Формат:", list(FORMATS), format_func=str.upper, horizontal=True)
+
+    params = {}
+    if "hydraulics" in sections:
+        with st.expander("⚙️ Условия гидравлического расчёта"):
+            col1, col2, col3 = st.columns(3)
+            params["hydraulics"] = dict(
+                pressure=col1.number_input("Давление газа (МПа)", min_value=0.1, value=2.0),
+                flow=col2.number_input("Расход газа (тыс. м³/сут)", min_value=1.0, value=500.0),
+                density=col3.number_input("Плотность газа (кг/м³)", min_value=0.5, value=0.9),
+                t_gas=col1.number_input("Температура газа (°C)", value=30.0),
+                t_soil=col2.number_input("Температура грунта (°C)", value=-2.0),
+            )
+    if "methanol" in sections:
+        with st.expander("⚙️ Условия расчёта метанола"):
+            use_ground = st.checkbox("Учитывать температуру грунта")
+            density_names = {"composition": "По составу (ст. условия)", "protocol": "Из протокола"}
+            params["methanol"] = dict(ground_temp=st.number_input("Температура грунта (°C)", value=-2.0)
+                                      if use_ground else None,
+                                      density_source=st.radio("Плотность газа", list(density_names),
+                                                              format_func=density_names.get, horizontal=True))
+
+    if not sections:
+        st.info("Выберите хотя бы один раздел.")
+        return
+
+    # Отпечаток отчёта: версия базы протоколов, файл участков, выбор фильтров, разделы и их параметры
+    key = fingerprint(store_revision(), file_fingerprint(PIPE_PATH), selection, sections, params)
+    builders, steps = [], 0
+    if "composition" in sections:
+        builders.append(lambda: composition_section(selected_df))
+        steps += 1 + selected_df["Месторождение"].nunique()
+    if "hydraulics" in sections:
+        pipe = load_pipe()
+        builders.append(lambda: hydraulics_section(pipe, **params["hydraulics"]))
+        steps += 1
+    if "methanol" in sections:
+        builders.append(lambda: methanol_section(selected_df, **params["methanol"]))
+        steps += 2
+
+    title = "Отчет " + (", ".join(fields) if fields else "все месторождения")
+    if st.button("🚀 Сформировать отчет"):
+        job = report_jobs().submit(key, title[:80], fmt, builders, steps)
+        jobs = st.session_state.setdefault("report_jobs", [])
+        if job.id not in jobs:
+            jobs.append(job.id)
+
+    if st.session_state.get("report_jobs"):
+        st.subheader("📥 Отчеты")
+        show_jobs()
@@ -0,0 +1,293 @@
+import re
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix, diags
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+from gas_properties import R, z_factor
+from hydraulics import (ROUGHNESS_MM, VISCOSITY, REGION_COL, FIELD_COL, SECTION_COL, friction_factor,
+                        gas_model, mass_flow, section_geometry)
+from property_tables import properties
+
+# Сеть газосбора региона по листу 'pipe': узлы — начала и концы участков (ДНС, точки врезки Т…, КС, ГПЗ),
+# рёбра — участки с длиной и внутренним диаметром. Установившееся изотермическое течение:
+#   p_i² − p_j² = K·m·|m|,  K = λ·Z·R·T·L / (D·A²·M)
+# Неизвестные — квадраты давлений в узлах без заданного давления; система баланса расходов
+# решается методом Ньютона с разреженной матрицей Якоби (LU-разложение scipy.sparse).
+# Разложение сохраняется: при изменении только граничных расходов решение сначала уточняется
+# упрощённым методом Ньютона со старой матрицей и пересобирается лишь при медленной сходимости.
+
+# Начало имени узла на правой стороне дефиса: точки врезки, объекты подготовки и приёма газа
+_NODE_START = re.compile(r"^\s*(Т\s*\d|ДНС|ЦПС|ЦППН|КС|УПГ|УПСВ|к\.\s*\d|котельная|[А-Я]\w*ГПЗ|[А-Я]\w*КЦ|ХКЦ)")
+# Объекты приёма газа, которые в названии участка встречаются без дефиса («ДНС-2 ВынМР ВГПЗ (I)»)
+_TERMINALS = re.compile(r"\s(МГПЗ|ВГПЗ|ХКЦ|[А-Я]\w*КЦ)\b")
+# Суффиксы месторождений («ММР», «СутМР», «Ет-ПМР», «Еты-Пур») и пояснения в скобках
+# («(кр.уз 3)», «(УСК №2)», номера параллельных ниток «(I)», «(II)»)
+_FIELD_SUFFIX = re.compile(r"(\b[А-Я][а-яА-Я]*-?[А-Я]*МР\b|\b[А-Я][а-я]+-[А-Я][а-я]+\b|\([^)]*\))")
+# Точки врезки (Т1, Т2 …) нумеруются в пределах региона, объекты приёма газа — общие для региона;
+# остальные узлы (ДНС-2, ЦПС, к.12) различаются только вместе с месторождением
+_TAP = re.compile(r"^т\d+")
+_REGION_NODE = re.compile(r"(гпз|кц|кс|упг|котельная)")
+
+
+def split_section(name):
+    # Начальный и конечный узел по названию участка «Начало - Конец».
+    # Дефис перед цифрой — часть имени (ДНС-3, ЦППН-2), разделитель — дефис перед началом нового узла.
+    text = str(name)
+    candidates = [m.start() for m in re.finditer(r"-(?!\s*\d)", text)]
+    spaced = [pos for pos in candidates if text[pos - 1:pos] == " " or text[pos + 1:pos + 2] == " "]
+    for pos in spaced + candidates:
+        if _NODE_START.match(text[pos + 1:]):
+            return text[:pos].strip(), text[pos + 1:].strip()
+    for pos in spaced:
+        return text[:pos].strip(), text[pos + 1:].strip()
+    terminal = _TERMINALS.search(text)
+    if terminal:
+        return text[:terminal.start()].strip(), text[terminal.start():].strip()
+    return None
+
+
+def node_key(label, region="", field=""):
+    # Ключ узла: имя без суффиксов месторождений, пояснений в скобках, пробелов и регистра
+    key = re.sub(r"[\s\-]+", "", _FIELD_SUFFIX.sub("", label)).lower()
+    tap = _TAP.match(key)
+    if tap:
+        return f"{region}/{tap.group()}"
+    if _REGION_NODE.search(key):
+        return f"{region}/{key}"
+    return f"{region}/{field}/{key}"
+
+
+class Network:
+    # Граф участков: узлы, матрица инцидентности (узлы × участки) и геометрия участков
+    def __init__(self, sections):
+        sections = sections.dropna(subset=[SECTION_COL])
+        diameter, length = section_geometry(sections)
+        valid = (diameter > 0) & (length > 0)
+        sections = sections[valid]
+
+        self.nodes = []          # ключи узлов
+        self.labels = {}         # ключ узла → название из таблицы (первое встреченное)
+        index = {}
+        rows, starts, ends = [], [], []
+        for row_no, (region, field, name) in enumerate(zip(sections[REGION_COL], sections[FIELD_COL],
+                                                           sections[SECTION_COL])):
+            ends_pair = split_section(name)
+            if ends_pair is None:
+                continue
+            pair = []
+            for label in ends_pair:
+                key = node_key(label, region, str(field).strip())
+                if key not in index:
+                    index[key] = len(self.nodes)
+                    self.nodes.append(key)
+                    self.labels[key] = label
+                pair.append(index[key])
+            if pair[0] == pair[1]:
+                continue
+            rows.append(row_no)
+            starts.append(pair[0])
+            ends.append(pair[1])
+
+        self.sections = sections.iloc[rows].reset_index(drop=True)
+        self.start = np.array(starts, dtype=int)
+        self.end = np.array(ends, dtype=int)
+        self.diameter = diameter[valid][rows]
+        self.length = length[valid][rows]
+        # Матрица инцидентности: +1 в узле начала участка, −1 в узле конца
+        n_edges = len(rows)
+        edge_no = np.arange(n_edges)
+        self.incidence = csc_matrix(
+            (np.r_[np.ones(n_edges), -np.ones(n_edges)], (np.r_[self.start, self.end], np.r_[edge_no, edge_no])),
+            shape=(len(self.nodes), n_edges))
+
+    @property
+    def sources(self):
+        # Узлы, из которых участки только выходят (ДНС, УПСВ …) — точки подачи газа
+        return [self.nodes[n] for n in sorted(set(self.start) - set(self.end))]
+
+    @property
+    def sinks(self):
+        # Узлы, в которые участки только входят (КС, ГПЗ, КЦ …) — точки приёма газа
+        return [self.nodes[n] for n in sorted(set(self.end) - set(self.start))]
+
+
+BOUNDARY_FLOW = "Подача (тыс. м³/сут)"
+BOUNDARY_PRESSURE = "Давление (МПа)"
+BOUNDARY_TYPES = [BOUNDARY_FLOW, BOUNDARY_PRESSURE]
+
+
+def boundary_template(network, flow=300.0, pressure=0.6):
+    # Граничные условия по умолчанию: подача газа в начальных узлах, давление в узлах приёма
+    # (ГПЗ, КЦ, КС …); в части сети без такого узла давление задаётся во всех её конечных узлах.
+    sources, sinks = network.sources, network.sinks
+    rows = {key: (BOUNDARY_FLOW, flow) for key in sources}
+    for key in sinks:
+        rows[key] = (BOUNDARY_PRESSURE, pressure) if _REGION_NODE.search(key.rsplit("/", 1)[-1]) else (BOUNDARY_FLOW, 0.0)
+
+    _, labels = connected_components(network.incidence @ network.incidence.T, directed=False)
+    index = {key: i for i, key in enumerate(network.nodes)}
+    fixed = {labels[index[key]] for key, (kind, _) in rows.items() if kind == BOUNDARY_PRESSURE}
+    for key in sinks:
+        if labels[index[key]] not in fixed:
+            rows[key] = (BOUNDARY_PRESSURE, pressure)
+
+    keys = sources + sinks
+    return pd.DataFrame({
+        "Узел": [network.labels[key] for key in keys],
+        "Условие": [rows[key][0] for key in keys],
+        "Значение": [rows[key][1] for key in keys],
+    }, index=pd.Index(keys, name="Ключ"))
+
+
+def boundary_conditions(table):
+    # Таблица граничных условий → (подачи {узел: тыс. м³/сут}, давления {узел: МПа})
+    values = pd.to_numeric(table["Значение"], errors="coerce").fillna(0.0)
+    is_pressure = table["Условие"] == BOUNDARY_PRESSURE
+    return values[~is_pressure].to_dict(), values[is_pressure].to_dict()
+
+
+def build_network(sections, region=None):
+    # Сеть по листу 'pipe' (при необходимости — только для одного региона)
+    sections = sections.dropna(subset=[REGION_COL, FIELD_COL, SECTION_COL])
+    if region is not None:
+        sections = sections[sections[REGION_COL] == region]
+    return Network(sections)
+
+
+class NetworkSolver:
+    # Решатель потокораспределения для одной сети и одного газа
+    def __init__(self, network, density=0.9, t_gas=20.0, composition=None, roughness=ROUGHNESS_MM,
+                 viscosity=VISCOSITY):
+        self.network = network
+        self.molar_mass, self.Tpc, self.Ppc = (float(v) for v in gas_model(density, composition))
+        # Для состава газа Z и вязкость (если viscosity=None) — по таблице свойств состава
+        # при среднем давлении участка, как в solve_profile
+        self.composition = None if composition is None else np.asarray(composition, dtype=float)
+        self.T = t_gas + 273.15
+        self.roughness = roughness
+        self.viscosity = viscosity
+        area = np.pi * network.diameter ** 2 / 4
+        # K без λ и Z: p_i² − p_j² = λ·Z·base·m|m|
+        self._base = R * self.T * network.length / (network.diameter * area ** 2 * self.molar_mass / 1000)
+        self._lu = None
+        self._free = None
+        self._pi = None
+        self._m = None
+        self.refactorizations = 0
+
+    def _resistance(self, m, pi):
+        # Коэффициент K участков при текущих расходах (λ по Re) и давлениях (Z по среднему давлению)
+        net = self.network
+        p_mean = np.sqrt(np.maximum((pi[net.start] + pi[net.end]) / 2, 1.0)) / 1e6
+        if self.composition is None:
+            Z = z_factor(p_mean, self.T, self.Tpc, self.Ppc)
+            viscosity = VISCOSITY if self.viscosity is None else self.viscosity
+        else:
+            gas = properties(self.composition, p_mean, self.T)
+            Z = gas["z"]
+            viscosity = gas["viscosity"] if self.viscosity is None else self.viscosity
+        Re = 4 * np.abs(m) / (np.pi * net.diameter * viscosity)
+        f = friction_factor(np.maximum(Re, 1.0), self.roughness / 1000 / net.diameter)
+        return f * Z * self._base
+
+    def _flows(self, pi, K, m_ref):
+        # Расходы и производные dm/d(Δπ) участков; около нуля — линеаризация, чтобы якобиан не вырождался
+        dpi = self.network.incidence.T @ pi
+        delta = K * m_ref ** 2 * 1e-4
+        m = np.sign(dpi) * np.sqrt(np.abs(dpi) / K)
+        g = 1 / (2 * np.sqrt(K * (np.abs(dpi) + delta)))
+        return m, g
+
+    def _jacobian(self, g, free):
+        A = self.network.incidence[free]
+        return csc_matrix(A @ diags(g) @ A.T)
+
+    def solve(self, injections, pressures, tol=1e-6, max_iter=50, chord_iter=8):
+        # injections — {узел: подача, тыс. м³/сут} (подача в сеть > 0, отбор < 0);
+        # pressures — {узел: давление, МПа} (хотя бы один узел в каждой связной части сети).
+        net = self.network
+        n = len(net.nodes)
+        index = {key: i for i, key in enumerate(net.nodes)}
+        supply = np.zeros(n)
+        for key, flow in injections.items():
+            supply[index[key]] = float(mass_flow(flow, self.molar_mass))
+        fixed = np.zeros(n, dtype=bool)
+        pi = np.zeros(n)
+        for key, value in pressures.items():
+            fixed[index[key]] = True
+            pi[index[key]] = (value * 1e6) ** 2
+        free = np.flatnonzero(~fixed)
+
+        # В каждой связной части сети должно быть задано давление
+        _, labels = connected_components(net.incidence @ net.incidence.T, directed=False)
+        missing = set(labels) - set(labels[fixed])
+        if missing:
+            raise ValueError("Не задано давление ни в одном узле части сети: "
+                             + ", ".join(net.labels[net.nodes[i]] for i in range(n) if labels[i] in missing)[:300])
+
+        # Начальное приближение: предыдущее решение или давление узлов приёма
+        if self._pi is not None and len(self._pi) == n and np.array_equal(self._free, free):
+            pi[free] = self._pi[free]
+            fresh = False
+        else:
+            fresh = True
+            pi[free] = pi[fixed].max()
+            self._lu = None
+        m_ref = max(np.abs(supply).max(), 1e-3)
+
+        m = self._m if self._m is not None and not fresh else np.full(len(net.start), m_ref)
+        converged = False
+        chord_left = chord_iter if self._lu is not None else 0
+        previous = np.inf
+        for _ in range(max_iter):
+            # λ зависит от расхода: два прохода «K по расходу → расход по K» на итерацию
+            for _ in range(2):
+                K = self._resistance(m, pi)
+                m, g = self._flows(pi, K, m_ref)
+            if fresh:
+                # Первый шаг из равного давления — линейная модель m = Δπ / (2·K·m_ref)
+                g = 1 / (2 * K * m_ref)
+                fresh = False
+            residual = (net.incidence @ m - supply)[free]
+            norm = np.abs(residual).max()
+            if norm <= tol * m_ref:
+                converged = True
+                break
+            # Упрощённый Ньютон со старым LU-разложением, пока невязка уменьшается хотя бы вдвое
+            if chord_left > 0 and norm < 0.5 * previous:
+                chord_left -= 1
+            else:
+                self._lu = splu(self._jacobian(g, free))
+                self.refactorizations += 1
+                chord_left = 0
+            previous = norm
+            step = self._lu.solve(residual)
+            # Демпфирование: квадраты давлений должны оставаться положительными
+            alpha = 1.0
+            while np.any(pi[free] - alpha * step <= 0) and alpha > 1e-4:
+                alpha /= 2
+            pi[free] -= alpha * step
+        if not converged:
+            raise ValueError("Расчёт сети не сошёлся: проверьте расходы и давления в узлах")
+
+        self._pi, self._m, self._free = pi.copy(), m, free
+        return self._result(pi, m, supply)
+
+    def _result(self, pi, m, supply):
+        net = self.network
+        to_flow = 1 / float(mass_flow(1.0, self.molar_mass))  # кг/с → тыс. м³/сут
+        pressure = np.sqrt(pi) / 1e6
+        nodes = pd.DataFrame({
+            "Узел": [net.labels[key] for key in net.nodes],
+            "Давление (МПа)": pressure,
+            "Подача (тыс. м³/сут)": supply * to_flow,
+        })
+        edges = net.sections[[col for col in [FIELD_COL, SECTION_COL] if col in net.sections.columns]].copy()
+        edges["Начало"] = [net.labels[net.nodes[i]] for i in net.start]
+        edges["Конец"] = [net.labels[net.nodes[i]] for i in net.end]
+        edges["Расход (тыс. м³/сут)"] = m * to_flow
+        edges["Потери давления (МПа)"] = np.abs(pressure[net.start] - pressure[net.end])
+        return nodes, edges
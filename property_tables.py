@@ -0,0 +1,143 @@
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+from composition import MOLAR_MASSES
+from gas_properties import (P_STD, T_STD, gas_density, mole_fractions, pseudo_critical, viscosity_lge,
+                            z_factor_dak)
+from interpolation import bilinear
+from instrumentation import cached, timed
+
+# Свойства газа по составу протокола (колонки компонентов grid.xlsx) при давлении P и температуре T:
+# коэффициент сжимаемости Z (Дранчук — Абу-Кассем по псевдокритическим параметрам Кея), плотность
+# и динамическая вязкость (Ли — Гонсалес — Икин).
+#  - Для каждого состава один раз строится таблица на сетке TABLE_P × TABLE_T; значения в рабочей
+#    области — билинейная интерполяция, вне её — прямой расчёт.
+#  - При Tpr < TPR_MIN (жирные газы ступеней сепарации на холоде) корреляция описывает конденсацию
+#    и свойства меняются скачком — страницы показывают предупреждение (in_domain).
+#  - Таблицы хранятся в LRU-кэше (TABLE_ENTRIES составов); ключ — мольные доли, округлённые
+#    до KEY_DIGITS знаков, так что повторные протоколы одного состава делят одну таблицу.
+# Страницы гидравлики и метанола берут свойства отсюда, поэтому при одном составе и одних
+# условиях они совпадают. Проверка точности таблиц: python property_tables.py
+
+KEY_DIGITS = 4          # Округление мольных долей в ключе кэша
+TABLE_ENTRIES = 64      # Максимум таблиц (составов) в LRU-кэше
+
+# Сетка таблиц: давление, МПа × температура, К
+TABLE_P = np.linspace(0.1, 15.0, 150)          # шаг 0.1 МПа
+TABLE_T = np.linspace(243.15, 353.15, 111)     # −30…80 °C, шаг 1 °C
+
+PROPERTIES = ["z", "density", "viscosity"]     # Z, кг/м³, Па·с
+TPR_MIN = 1.05          # Нижняя граница приведённой температуры в области корреляции
+
+
+def composition_key(fractions):
+    # Ключ кэша: мольные доли (по COMPONENTS), нормированные на сумму и округлённые
+    fractions = np.nan_to_num(np.asarray(fractions, dtype=float).ravel())
+    return tuple(np.round(fractions / fractions.sum(), KEY_DIGITS).tolist())
+
+
+def direct_properties(fractions, P_MPa, T_K):
+    # Свойства без таблицы (числа или массивы P и T, broadcast)
+    fractions = np.asarray(fractions, dtype=float)
+    molar_mass = fractions @ MOLAR_MASSES
+    Tpc, Ppc = pseudo_critical(fractions)
+    Z = z_factor_dak(P_MPa, T_K, Tpc, Ppc)
+    density = gas_density(P_MPa, T_K, molar_mass, Z)
+    return {"z": Z, "density": density, "viscosity": viscosity_lge(T_K, density, molar_mass)}
+
+
+@cached("property_tables.table", lru_cache(maxsize=TABLE_ENTRIES))
+def property_table(key):
+    # Таблицы свойств состава key в узлах сетки TABLE_P × TABLE_T
+    return direct_properties(np.array(key), TABLE_P[:, None], TABLE_T[None, :])
+
+
+def cache_info():
+    # Статистика LRU-кэша таблиц (hits, misses, maxsize, currsize)
+    return property_table.cache_info()
+
+
+@timed("property_tables.properties")
+def properties(fractions, P_MPa, T_K, use_table=True):
+    # Z, плотность (кг/м³) и вязкость (Па·с) газа состава fractions (мольные доли по COMPONENTS)
+    # при давлении P_MPa и температуре T_K (числа или массивы, broadcast)
+    key = composition_key(fractions)
+    P_MPa, T_K = np.broadcast_arrays(np.asarray(P_MPa, dtype=float), np.asarray(T_K, dtype=float))
+    inside = np.zeros(P_MPa.shape, dtype=bool)
+    if use_table:
+        inside = (P_MPa >= TABLE_P[0]) & (P_MPa <= TABLE_P[-1]) & (T_K >= TABLE_T[0]) & (T_K <= TABLE_T[-1])
+    if inside.all():
+        table = property_table(key)
+        return {name: bilinear(TABLE_P, TABLE_T, table[name], P_MPa, T_K) for name in PROPERTIES}
+
+    result = direct_properties(np.array(key), P_MPa, T_K)
+    if inside.any():
+        table = property_table(key)
+        for name in PROPERTIES:
+            result[name][inside] = bilinear(TABLE_P, TABLE_T, table[name], P_MPa[inside], T_K[inside])
+    return result
+
+
+def z_lookup(fractions):
+    # Функция Z(P_MPa, T_K) для состава fractions — для интегрирования профиля давления
+    return lambda P_MPa, T_K: properties(fractions, P_MPa, T_K)["z"]
+
+
+def standard_density(fractions):
+    # Плотность газа при стандартных условиях (ГОСТ 2939), кг/м³; fractions — состав или строки составов
+    fractions = np.asarray(fractions, dtype=float)
+    return direct_properties(fractions, P_STD / 1e6, T_STD)["density"]
+
+
+def in_domain(fractions, T_K):
+    # Попадает ли температура в область корреляции Дранчука — Абу-Кассема (Tpr ≥ TPR_MIN);
+    # ниже её у жирных газов уравнение описывает конденсацию, и свойства меняются скачком
+    Tpc, _ = pseudo_critical(np.array(composition_key(fractions)))
+    return np.asarray(T_K, dtype=float) / Tpc >= TPR_MIN
+
+
+def check_accuracy(fractions, samples=1000, seed=0):
+    # Сравнение интерполяции по таблице с прямым расчётом в случайных точках сетки в области корреляции.
+    # Возвращает максимальную и среднюю относительную погрешность по каждому свойству (None — сетка
+    # целиком вне области корреляции).
+    fractions = np.array(composition_key(fractions))
+    Tpc, _ = pseudo_critical(fractions)
+    T_min = max(TABLE_T[0], TPR_MIN * Tpc)
+    if T_min >= TABLE_T[-1]:
+        return None
+    rng = np.random.default_rng(seed)
+    P_MPa = rng.uniform(TABLE_P[0], TABLE_P[-1], samples)
+    T_K = rng.uniform(T_min, TABLE_T[-1], samples)
+    table = properties(fractions, P_MPa, T_K)
+    direct = direct_properties(fractions, P_MPa, T_K)
+    result = {}
+    for name in PROPERTIES:
+        rel_error = np.abs(table[name] - direct[name]) / np.abs(direct[name])
+        result[name] = {"max_rel_error": float(rel_error.max()), "mean_rel_error": float(rel_error.mean())}
+    return result
+
+
+if __name__ == "__main__":
+    from protocol_store import STORE_PATH, query
+
+    parser = argparse.ArgumentParser(description="Точность таблиц свойств газа по составам протоколов")
+    parser.add_argument("--db", default=STORE_PATH, help="Файл базы протоколов")
+    parser.add_argument("--limit", type=int, default=10, help="Сколько последних протоколов проверить")
+    args = parser.parse_args()
+
+    fractions = mole_fractions(query(path=args.db))
+    fractions = fractions[~np.isnan(fractions).any(axis=1)][-args.limit:]
+    worst = {name: 0.0 for name in PROPERTIES}
+    checked = 0
+    for row in fractions:
+        accuracy = check_accuracy(row)
+        if accuracy is None:
+            continue
+        checked += 1
+        for name, error in accuracy.items():
+            worst[name] = max(worst[name], error["max_rel_error"])
+    print(f"Составов: {len(fractions)}, проверено в области корреляции: {checked}")
+    for name in PROPERTIES:
+        print(f"Максимальная относительная погрешность таблицы ({name}): {worst[name]:.3%}")
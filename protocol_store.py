@@ -0,0 +1,303 @@
+import argparse
+import datetime
+import hashlib
+import os
+import sqlite3
+from contextlib import contextmanager
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from composition import COMPONENTS
+from grid_index import LEVELS
+
+# Хранилище протоколов (SQLite): одна база для всех страниц вместо разбора выгрузок Excel в каждой сессии.
+# Новые выгрузки (лист 'dhtmlxGrid') дописываются в базу: протокол, который уже есть, пропускается,
+# строки с некорректным составом отклоняются и попадают в отчёт о загрузке.
+# Фильтры страниц (Месторождение / ДНС / Ступень отбора, дата) выполняются запросом по индексам.
+# Загрузка из командной строки:
+#   python protocol_store.py ingest выгрузка.xlsx [--db protocols.db]
+#   python protocol_store.py info
+
+STORE_PATH = "protocols.db"
+GRID_SHEET = "dhtmlxGrid"
+SCHEMA_VERSION = 1
+
+PROTOCOL = "Номер протокола"
+DATE = "Дата протокола"
+OBJECT = "Объект"
+# Протокол в базе один раз. Номер лаборатории повторяется (нумерация каждый год начинается заново,
+# а один протокол может описывать несколько точек отбора), поэтому ключ — номер вместе с датой и точкой.
+KEY_COLUMNS = [PROTOCOL, DATE, *LEVELS, OBJECT]
+TEXT_COLUMNS = ["ДО", "ПНГ/ПГ", *LEVELS, OBJECT, PROTOCOL]
+DATE_COLUMNS = [DATE, "Дата приема пробы"]
+REAL_COLUMNS = [*COMPONENTS, "Плотность реального газа", "ИТОГО"]
+REQUIRED_COLUMNS = [*LEVELS, PROTOCOL, DATE, *COMPONENTS]
+SUM_TOLERANCE = 10.0  # Допустимое отклонение суммы компонентов от 100 % об.
+
+_ready = set()  # Базы, в которых схема уже проверена этим процессом
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def connect(path=STORE_PATH):
+    # Соединение с базой (создаётся при первом обращении). WAL: чтение страниц не ждёт загрузку выгрузки.
+    connection = sqlite3.connect(path, timeout=30)
+    if path in _ready and os.path.exists(path):
+        return connection
+    connection.execute("PRAGMA journal_mode=WAL")
+    columns = ([f"{_quote(col)} TEXT NOT NULL DEFAULT ''" for col in TEXT_COLUMNS]
+               + [f"{_quote(col)} TEXT" for col in DATE_COLUMNS]
+               + [f"{_quote(col)} REAL" for col in REAL_COLUMNS])
+    keys = ", ".join(_quote(col) for col in KEY_COLUMNS)
+    levels = ", ".join(_quote(col) for col in LEVELS)
+    connection.executescript(f"""
+        CREATE TABLE IF NOT EXISTS protocols (
+            id INTEGER PRIMARY KEY,
+            {", ".join(columns)},
+            ingest_id INTEGER NOT NULL,
+            UNIQUE ({keys})
+        );
+        CREATE INDEX IF NOT EXISTS protocols_group ON protocols ({levels});
+        CREATE INDEX IF NOT EXISTS protocols_date ON protocols ({_quote(DATE)});
+        CREATE TABLE IF NOT EXISTS ingests (
+            id INTEGER PRIMARY KEY,
+            sha1 TEXT NOT NULL UNIQUE,
+            source TEXT,
+            loaded_at TEXT,
+            added INTEGER,
+            duplicates INTEGER,
+            rejected INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS rejected (
+            ingest_id INTEGER NOT NULL,
+            {_quote(PROTOCOL)} TEXT,
+            {_quote(DATE)} TEXT,
+            {", ".join(f"{_quote(col)} TEXT" for col in LEVELS)},
+            reason TEXT
+        );
+        PRAGMA user_version = {SCHEMA_VERSION};
+    """)
+    _ready.add(path)
+    return connection
+
+
+@contextmanager
+def opened(path=STORE_PATH):
+    # Соединение на один запрос или загрузку: транзакция фиксируется при выходе, соединение закрывается
+    connection = connect(path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def validate(df):
+    # Проверка выгрузки. Нет обязательных колонок — ValueError (выгрузка не того формата).
+    # Возвращает (годные строки, отклонённые строки с колонкой «Причина»).
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"В выгрузке нет колонок: {', '.join(missing)}")
+
+    reasons = pd.Series("", index=df.index)
+
+    def reject(mask, reason):
+        reasons[mask & (reasons == "")] = reason
+
+    reject(df[PROTOCOL].isna() | (df[PROTOCOL].astype(str).str.strip() == ""), "нет номера протокола")
+    dates = pd.to_datetime(df[DATE], format="%d.%m.%Y", errors="coerce") \
+        if not pd.api.types.is_datetime64_any_dtype(df[DATE]) else df[DATE]
+    reject(dates.isna(), "нет даты протокола")
+
+    components = df[COMPONENTS].apply(pd.to_numeric, errors="coerce")
+    reject((components.isna() & df[COMPONENTS].notna()).any(axis=1), "нечисловое содержание компонента")
+    reject(((components < 0) | (components > 100)).any(axis=1), "содержание компонента вне 0–100 %")
+    total = components.sum(axis=1, min_count=1)
+    reject(total.isna(), "состав не заполнен")
+    reject((total - 100).abs() > SUM_TOLERANCE,
+           f"сумма компонентов отличается от 100 % больше чем на {SUM_TOLERANCE:g}")
+
+    valid = df[reasons == ""].copy()
+    valid[DATE] = dates[reasons == ""]
+    valid[COMPONENTS] = components[reasons == ""]
+    rejected = df[reasons != ""].assign(Причина=reasons[reasons != ""])
+    return valid, rejected
+
+
+def _records(df):
+    # Строки для INSERT в порядке колонок таблицы; пустые текстовые поля — '' (иначе UNIQUE не ловит повтор).
+    # Значения сохраняются как в выгрузке (без обрезки пробелов): по ним строятся фильтры страниц.
+    table = pd.DataFrame(index=df.index)
+    for col in TEXT_COLUMNS:
+        values = df[col].astype(object) if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        table[col] = values.where(values.notna(), "").astype(str)
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            values = df[col] if pd.api.types.is_datetime64_any_dtype(df[col]) \
+                else pd.to_datetime(df[col], format="%d.%m.%Y", errors="coerce")
+            table[col] = values.dt.strftime("%Y-%m-%d").astype(object).where(values.notna(), None)
+        else:
+            table[col] = None
+    for col in REAL_COLUMNS:
+        values = pd.to_numeric(df[col], errors="coerce") if col in df.columns else pd.Series(np.nan, index=df.index)
+        table[col] = values.astype(object).where(values.notna(), None)
+    return table.itertuples(index=False, name=None)
+
+
+def ingest(df, source="", sha1=None, path=STORE_PATH):
+    # Дописывает выгрузку в базу. Повторная загрузка того же файла (sha1) ничего не меняет.
+    # Возвращает отчёт: добавлено, уже было в базе, отклонено (и таблицу отклонённых строк).
+    valid, rejected = validate(df)
+    report = {"added": 0, "duplicates": 0, "rejected": len(rejected), "rejected_rows": rejected, "skipped": False}
+    with opened(path) as connection:
+        if sha1 and connection.execute("SELECT 1 FROM ingests WHERE sha1 = ?", (sha1,)).fetchone():
+            report.update(skipped=True, rejected=0, rejected_rows=rejected.iloc[:0])
+            return report
+        try:
+            cursor = connection.execute(
+                "INSERT INTO ingests (sha1, source, loaded_at) VALUES (?, ?, ?)",
+                (sha1 or hashlib.sha1(os.urandom(16)).hexdigest(), source, datetime.datetime.now().isoformat()))
+        except sqlite3.IntegrityError:
+            # Тот же файл одновременно загрузил другой процесс или сессия — он уже в базе
+            report.update(skipped=True, rejected=0, rejected_rows=rejected.iloc[:0])
+            return report
+        ingest_id = cursor.lastrowid
+        columns = TEXT_COLUMNS + DATE_COLUMNS + REAL_COLUMNS
+        before = connection.total_changes
+        connection.executemany(
+            f"INSERT OR IGNORE INTO protocols ({', '.join(map(_quote, columns))}, ingest_id) "
+            f"VALUES ({', '.join('?' * len(columns))}, {ingest_id})",
+            _records(valid))
+        report["added"] = connection.total_changes - before
+        report["duplicates"] = len(valid) - report["added"]
+        connection.execute("UPDATE ingests SET added = ?, duplicates = ?, rejected = ? WHERE id = ?",
+                           (report["added"], report["duplicates"], report["rejected"], ingest_id))
+        # Отклонённые строки сохраняются в базе: отчёт о загрузке доступен и другим процессам
+        connection.executemany(
+            f"INSERT INTO rejected VALUES (?, ?, ?, {', '.join('?' * len(LEVELS))}, ?)",
+            ((ingest_id, *("" if pd.isna(value) else str(value) for value in values))
+             for values in rejected[[PROTOCOL, DATE, *LEVELS, "Причина"]].itertuples(index=False, name=None)))
+    return report
+
+
+def ingest_file(source, path=STORE_PATH, sheet_name=GRID_SHEET):
+    # Загрузка выгрузки Excel (путь или загруженный файл st.file_uploader)
+    if hasattr(source, "getvalue"):
+        data = source.getvalue()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+    sha1 = hashlib.sha1(data).hexdigest()
+    with opened(path) as connection:
+        if connection.execute("SELECT 1 FROM ingests WHERE sha1 = ?", (sha1,)).fetchone():
+            return {"added": 0, "duplicates": 0, "rejected": 0, "rejected_rows": pd.DataFrame(), "skipped": True,
+                    "sha1": sha1}
+    df = pd.read_excel(BytesIO(data), sheet_name=sheet_name)
+    name = getattr(source, "name", os.path.basename(str(source)))
+    return {**ingest(df, source=name, sha1=sha1, path=path), "sha1": sha1}
+
+
+def revision(path=STORE_PATH):
+    # Версия содержимого базы: меняется при каждой загрузке, добавившей строки (ключ кэшей страниц)
+    if not os.path.exists(path):
+        return "empty"
+    with opened(path) as connection:
+        count, last = connection.execute("SELECT count(*), max(ingest_id) FROM protocols").fetchone()
+    return f"{count}:{last}"
+
+
+def _where(selection, date_from=None, date_to=None):
+    # Условие WHERE по уровням группы (IN по индексу protocols_group) и диапазону дат (индекс protocols_date)
+    clauses, params = [], []
+    for level in LEVELS:
+        values = (selection or {}).get(level)
+        if values:
+            values = ["" if pd.isna(value) else str(value) for value in values]
+            clauses.append(f"{_quote(level)} IN ({', '.join('?' * len(values))})")
+            params += values
+    if date_from is not None:
+        clauses.append(f"{_quote(DATE)} >= ?")
+        params.append(pd.Timestamp(date_from).strftime("%Y-%m-%d"))
+    if date_to is not None:
+        clauses.append(f"{_quote(DATE)} <= ?")
+        params.append(pd.Timestamp(date_to).strftime("%Y-%m-%d"))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def query(selection=None, date_from=None, date_to=None, path=STORE_PATH):
+    # Протоколы по выбору ({уровень: значения}, пусто — все) в порядке загрузки, с типами как у выгрузки:
+    # уровни — category, даты — datetime, пустые текстовые поля — NaN
+    where, params = _where(selection, date_from, date_to)
+    with opened(path) as connection:
+        df = pd.read_sql_query(f"SELECT * FROM protocols{where} ORDER BY id", connection, params=params)
+    df = df.drop(columns=["id", "ingest_id"])
+    for col in TEXT_COLUMNS:
+        df[col] = df[col].replace("", np.nan)
+    for col in DATE_COLUMNS:
+        df[col] = pd.to_datetime(df[col], format="%Y-%m-%d")
+    for col in LEVELS:
+        df[col] = df[col].astype("category")
+    return df
+
+
+def ingest_log(path=STORE_PATH):
+    # История загрузок и отклонённые строки: (загрузки, отклонённые строки с источником и причиной)
+    with opened(path) as connection:
+        history = pd.read_sql_query("SELECT id, source, loaded_at, added, duplicates, rejected FROM ingests "
+                                    "ORDER BY id", connection)
+        rejected = pd.read_sql_query("SELECT ingests.source AS Файл, rejected.* FROM rejected "
+                                     "JOIN ingests ON ingests.id = rejected.ingest_id ORDER BY rejected.rowid", connection)
+    return history, rejected.drop(columns="ingest_id").rename(columns={"reason": "Причина"})
+
+
+def groups(path=STORE_PATH):
+    # Группы Месторождение / ДНС / Ступень отбора с числом протоколов (по индексу, без чтения строк)
+    levels = ", ".join(_quote(col) for col in LEVELS)
+    with opened(path) as connection:
+        table = pd.read_sql_query(f"SELECT {levels}, count(*) AS Протоколов FROM protocols "
+                                  f"GROUP BY {levels} ORDER BY min(id)", connection)
+    return table.replace({level: {"": np.nan} for level in LEVELS})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Хранилище протоколов компонентного состава газа")
+    parser.add_argument("--db", default=STORE_PATH, help="Файл базы SQLite")
+    commands = parser.add_subparsers(dest="command", required=True)
+    load = commands.add_parser("ingest", help="Дописать выгрузки протоколов (xlsx, лист dhtmlxGrid)")
+    load.add_argument("files", nargs="+")
+    load.add_argument("--rejected", help="Сохранить отклонённые строки в xlsx")
+    commands.add_parser("info", help="Число протоколов, групп и история загрузок")
+    args = parser.parse_args(argv)
+
+    if args.command == "ingest":
+        rejected = []
+        for name in args.files:
+            report = ingest_file(name, args.db)
+            if report["skipped"]:
+                print(f"{name}: уже загружен")
+                continue
+            print(f"{name}: добавлено {report['added']}, уже в базе {report['duplicates']}, "
+                  f"отклонено {report['rejected']}")
+            for _, row in report["rejected_rows"].iterrows():
+                print(f"  — {row[PROTOCOL]} ({row[DATE]}): {row['Причина']}")
+            rejected.append(report["rejected_rows"].assign(Файл=name))
+        if args.rejected and rejected:
+            pd.concat(rejected).to_excel(args.rejected, index=False)
+        return
+
+    with opened(args.db) as connection:
+        count, first, last = connection.execute(
+            f"SELECT count(*), min({_quote(DATE)}), max({_quote(DATE)}) FROM protocols").fetchone()
+    history, rejected = ingest_log(args.db)
+    print(f"Протоколов: {count} ({first} — {last}), групп: {len(groups(args.db))}")
+    print(history.drop(columns="id").to_string(index=False))
+    for _, row in rejected.iterrows():
+        print(f"  — {row['Файл']}: {row[PROTOCOL]} ({row[DATE]}): {row['Причина']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from composition import compute_fractions, CH4, C3PLUS, C5PLUS, MOLAR_MASS, DENSITY_NC
+from instrumentation import timed
+from data_store import CACHE_DIR
+from grid_index import LEVELS
+
+# Формирование отчётов (Excel и PDF) по составу газа, гидравлике и метанолу.
+#  - Отчёт собирается из разделов; раздел — генератор листов (название, таблица, график или None),
+#    поэтому листы считаются по одному и не держатся в памяти все сразу.
+#  - Excel пишется xlsxwriter в режиме constant_memory (строки сбрасываются на диск по мере записи),
+#    PDF — через PdfPages: страница графика и страницы таблицы по TABLE_ROWS строк (не больше TABLE_PAGES).
+#  - Готовый файл кэшируется на диске по отпечатку входных данных и параметров.
+#  - ReportJobs выполняет отчёты в фоновых потоках и хранит прогресс для страницы «Отчеты».
+
+REPORT_DIR = os.path.join(CACHE_DIR, "reports")
+REPORT_KEEP = 32            # Сколько готовых отчётов хранить на диске
+JOBS_KEEP = 2 * REPORT_KEEP # Сколько завершённых заданий помнить в памяти процесса
+TABLE_ROWS = 40             # Строк таблицы на странице PDF
+TABLE_PAGES = 5             # Страниц одной таблицы в PDF; полная таблица — в отчёте Excel
+TABLE_CELL = 28             # Наибольшая ширина колонки таблицы в PDF, знаков
+PDF_PAGE = (11.69, 8.27)    # A4, альбомная, дюймы
+FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+
+def fingerprint(*parts):
+    # Отпечаток входа отчёта: параметры (JSON) и таблицы (хэш строк pandas)
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=False).values.tobytes())
+            names = part.columns if isinstance(part, pd.DataFrame) else [part.name]
+            digest.update(json.dumps(list(map(str, names)), ensure_ascii=False).encode("utf-8"))
+        else:
+            digest.update(json.dumps(part, ensure_ascii=False, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _round(table, decimals):
+    # Округление только числовых колонок (даты и текст не трогаются)
+    return table.assign(**table.select_dtypes("number").round(decimals))
+
+
+def sheet_title(name, used):
+    # Имя листа Excel: до 31 символа, без запрещённых знаков, уникальное в книге
+    title = "".join("_" if ch in "[]:*?/\\" else ch for ch in str(name))[:31] or "Лист"
+    base, n = title, 2
+    while title in used:
+        suffix = f" ({n})"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title)
+    return title
+
+
+# ───── Разделы отчёта ─────
+
+def composition_section(df):
+    # Состав газа: сводка по группам и лист протоколов по каждому месторождению
+    levels = [col for col in LEVELS if col in df.columns]
+    fractions = compute_fractions(df)
+    metrics = [CH4, C3PLUS, C5PLUS, MOLAR_MASS, DENSITY_NC]
+    info = [col for col in levels + ["Дата протокола", "Номер протокола"] if col in df.columns]
+    table = pd.concat([df[info].reset_index(drop=True), fractions[metrics].reset_index(drop=True)], axis=1)
+
+    summary = (table.groupby(levels, observed=True, sort=True)[[CH4, C3PLUS, C5PLUS]]
+               .agg(["count", "mean", "min", "max"]).round(2))
+    summary.columns = [f"{metric}: {stat}" for metric, stat in summary.columns]
+    summary = summary.reset_index()
+
+    def chart(ax):
+        means = table.groupby(levels[0], observed=True)[[C3PLUS, C5PLUS]].mean()
+        means.plot.barh(ax=ax)
+        ax.set_xlabel("г/м³")
+        ax.set_title("Среднее содержание С3+в. и С5+в. по месторождениям")
+
+    yield "Состав — сводка", summary, chart if levels else None
+    del summary
+    if not levels:
+        yield "Состав — протоколы", _round(table, 3), None
+        return
+    for field, rows in table.groupby(levels[0], observed=True, sort=True):
+        yield f"Состав — {field}", _round(rows, 3), None
+
+
+def hydraulics_section(sections, pressure, flow, t_gas, t_soil=None, density=0.9, **options):
+    # Гидравлика: все участки листа 'pipe' при одинаковых входных условиях, по регионам
+    from hydraulics import REGION_COL, evaluate_sections
+
+    sections = sections.dropna(subset=[REGION_COL])
+    result = _round(evaluate_sections(sections, pressure, flow, t_gas, t_soil, density, **options), 4)
+
+    def chart(ax):
+        losses = result.groupby(REGION_COL)["Потери давления (МПа)"].max()
+        losses.plot.barh(ax=ax, color="tab:red")
+        ax.set_xlabel("МПа")
+        ax.set_title("Наибольшие потери давления на участке по регионам")
+
+    yield "Гидравлика", result, chart
+
+
+def methanol_section(df, ground_temp=None, conditions=None, density_source="composition"):
+    # Метанол: пакетный расчёт по последнему протоколу каждой группы и итоги
+    from methanol_batch import latest_protocols, compute_batch
+
+    result = compute_batch(latest_protocols(df), conditions, ground_temp=ground_temp, density_source=density_source)
+    totals = result[["Метанол, кг/сут", "Метанол, л/сут", "Оптимальный расход метанола (л/сут)",
+                     "Потенциальная экономия (л/сут)"]].sum().to_frame("Итого").T
+
+    def chart(ax):
+        need = result[result["Метанол, л/сут"] > 0].nlargest(30, "Метанол, л/сут")
+        levels = [col for col in LEVELS if col in need.columns]
+        labels = [" / ".join(map(str, row)) for row in need[levels].itertuples(index=False)]
+        ax.barh(labels, need["Метанол, л/сут"], color="tab:blue")
+        ax.tick_params(axis="y", labelsize=6)
+        ax.set_xlabel("л/сут")
+        ax.set_title("Группы с наибольшей подачей метанола")
+
+    yield "Метанол — расчет", _round(result, 3), chart
+    yield "Метанол — итого", _round(totals, 3), None
+
+
+# ───── Запись файлов ─────
+
+def _cell(value):
+    # Значение ячейки для xlsxwriter: пропуски — пустые ячейки, даты — datetime
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (float, np.floating)):
+        return None if not np.isfinite(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+@timed("reports.write_excel")
+def write_excel(path, sheets, progress=None):
+    # Книга Excel в режиме constant_memory: каждый лист пишется построчно сверху вниз
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True})
+    header = workbook.add_format({"bold": True, "bg_color": "#f0f2f6", "border": 1})
+    date = workbook.add_format({"num_format": "dd.mm.yyyy"})
+    used = set()
+    try:
+        for name, table, _ in sheets:
+            if progress:
+                progress(name)
+            worksheet = workbook.add_worksheet(sheet_title(name, used))
+            worksheet.write_row(0, 0, [str(col) for col in table.columns], header)
+            worksheet.set_column(0, len(table.columns) - 1, 16)
+            for row_no, row in enumerate(table.itertuples(index=False, name=None), start=1):
+                for col_no, value in enumerate(row):
+                    value = _cell(value)
+                    if isinstance(value, datetime.datetime):
+                        worksheet.write_datetime(row_no, col_no, value, date)
+                    elif value is not None:
+                        worksheet.write(row_no, col_no, value)
+    finally:
+        workbook.close()
+
+
+def _table_pages(name, table):
+    # Страницы PDF с таблицей: не больше TABLE_ROWS строк на странице. Таблица выводится одним
+    # блоком моноширинного текста на страницу — на порядок быстрее, чем ячейки matplotlib.table.
+    from matplotlib.figure import Figure
+
+    # Форматируются только строки, которые попадут в PDF (первые TABLE_PAGES страниц)
+    text = table.iloc[:TABLE_PAGES * TABLE_ROWS].copy()
+    for column in text.columns[[pd.api.types.is_datetime64_any_dtype(t) for t in text.dtypes]]:
+        text[column] = text[column].dt.strftime("%d.%m.%Y")
+    text = text.astype(object).where(text.notna(), "").astype(str)
+    # Ширина колонки — по самой длинной строке (не больше TABLE_CELL символов)
+    widths = [min(TABLE_CELL, max([len(str(col))] + [len(v) for v in text[col]])) for col in text.columns]
+
+    def line(values):
+        return " │ ".join(str(v)[:w].ljust(w) for v, w in zip(values, widths))
+
+    header = line(text.columns)
+    chars = max(len(header), 1)
+    fontsize = min(8.0, (PDF_PAGE[0] - 0.8) * 72 / (chars * 0.6))  # Моноширинный знак ≈ 0.6 кегля
+    pages = max(1, -(-len(table) // TABLE_ROWS))
+    for page in range(min(pages, TABLE_PAGES)):
+        rows = text.iloc[page * TABLE_ROWS:(page + 1) * TABLE_ROWS]
+        body = "\n".join([header, "─" * len(header)] + [line(row) for row in rows.itertuples(index=False)])
+        fig = Figure(figsize=PDF_PAGE)
+        fig.text(0.5, 0.96, f"{name} — стр. {page + 1} из {pages}", ha="center", va="top", fontsize=10)
+        fig.text(0.03, 0.91, body, ha="left", va="top", family="monospace", fontsize=fontsize)
+        if page + 1 == TABLE_PAGES < pages:
+            fig.text(0.5, 0.03, f"Показаны первые {TABLE_PAGES * TABLE_ROWS} строк из {len(table)}; "
+                                "полная таблица — в отчёте Excel", ha="center", fontsize=9, style="italic")
+        yield fig
+
+
+@timed("reports.write_pdf")
+def write_pdf(path, sheets, title="Отчет", progress=None):
+    # PDF: титульная страница, затем для каждого листа — график (если есть) и страницы таблицы
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+
+    with PdfPages(path) as pdf:
+        fig = Figure(figsize=PDF_PAGE)
+        fig.text(0.5, 0.6, title, ha="center", fontsize=20)
+        fig.text(0.5, 0.5, datetime.datetime.now().strftime("Сформирован %d.%m.%Y %H:%M"), ha="center")
+        pdf.savefig(fig)
+        for name, table, chart in sheets:
+            if progress:
+                progress(name)
+            if chart is not None and len(table):
+                fig = Figure(figsize=PDF_PAGE)
+                chart(fig.subplots())
+                fig.tight_layout()
+                pdf.savefig(fig)
+            for fig in _table_pages(name, table):
+                pdf.savefig(fig)
+
+
+def _prune(keep=REPORT_KEEP):
+    # Удаление самых старых готовых отчётов сверх keep
+    files = sorted((os.path.join(REPORT_DIR, name) for name in os.listdir(REPORT_DIR)), key=os.path.getmtime)
+    for path in files[:-keep]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def build_report(key, fmt, sections, title="Отчет", progress=None):
+    # Файл отчёта по отпечатку key: готовый берётся из кэша, иначе собирается из разделов.
+    # sections — список функций без аргументов, каждая возвращает генератор листов раздела.
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, f"{key}.{fmt}")
+    if os.path.exists(path):
+        return path
+
+    def sheets():
+        for section in sections:
+            yield from section()
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        if fmt == "xlsx":
+            write_excel(tmp_path, sheets(), progress)
+        elif fmt == "pdf":
+            write_pdf(tmp_path, sheets(), title, progress)
+        else:
+            raise ValueError(f"Неизвестный формат отчёта: {fmt}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _prune()
+    return path
+
+
+# ───── Фоновые задания ─────
+
+class ReportJob:
+    # Состояние одного отчёта: queued → running → done / error
+    def __init__(self, key, title, fmt, steps):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.title = title
+        self.fmt = fmt
+        self.steps = max(steps, 1)
+        self.done_steps = 0
+        self.status = "queued"
+        self.message = "В очереди"
+        self.path = None
+        self.error = None
+
+    @property
+    def progress(self):
+        return 1.0 if self.status == "done" else min(self.done_steps / self.steps, 0.99)
+
+
+class ReportJobs:
+    # Пул фоновых потоков для отчётов, общий для всех сессий. Одинаковые запросы (один отпечаток
+    # и формат) не считаются повторно: возвращается уже идущее или готовое задание.
+    def __init__(self, workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._by_key = {}
+
+    def submit(self, key, title, fmt, sections, steps):
+        # steps — ожидаемое число листов (для индикатора прогресса)
+        with self._lock:
+            self._evict()
+            job_id = self._by_key.get((key, fmt))
+            job = self._jobs.get(job_id)
+            if job is not None and job.status != "error" and (job.status != "done" or os.path.exists(job.path)):
+                return job
+            job = ReportJob(key, title, fmt, steps)
+            self._jobs[job.id] = job
+            self._by_key[(key, fmt)] = job.id
+        self._pool.submit(self._run, job, sections)
+        return job
+
+    def get(self, job_id):
+        # Задание по номеру; готовое задание, файл которого уже удалён (_prune), забывается — None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job.status == "done" and not os.path.exists(job.path):
+                self._drop(job)
+                return None
+            return job
+
+    def _drop(self, job):
+        self._jobs.pop(job.id, None)
+        if self._by_key.get((job.key, job.fmt)) == job.id:
+            del self._by_key[(job.key, job.fmt)]
+
+    def _evict(self):
+        # Забыть готовые задания без файла и самые старые завершённые сверх JOBS_KEEP (вызов под _lock)
+        finished = [job for job in self._jobs.values() if job.status in ("done", "error")]
+        gone = [job for job in finished if job.status == "done" and not os.path.exists(job.path)]
+        kept = [job for job in finished if job not in gone]
+        for job in gone + kept[:max(len(kept) - JOBS_KEEP, 0)]:
+            self._drop(job)
+
+    def _run(self, job, sections):
+        job.status = "running"
+
+        def progress(name):
+            job.message = f"Лист «{name}»"
+            job.done_steps += 1
+
+        try:
+            job.path = build_report(job.key, job.fmt, sections, job.title, progress)
+            job.status = "done"
+            job.message = "Готово"
+        except Exception as e:  # Ошибка показывается на странице отчётов
+            job.status = "error"
+            job.error = str(e)
+            job.message = "Ошибка"
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import file_fingerprint
+
+# Компактное бинарное хранилище маршрутов трубопроводов из всех вкладок pipe.xlsx.
+# Вместо разбора Excel (и вместо сгенерированного .py-файла с литералами) координаты всех маршрутов
+# хранятся одним плоским массивом float64 [точек × 2] с индексом смещений; файл открывается
+# через memory map без разбора. Формат файла:
+#   MAGIC (8 байт) | длина заголовка (uint64) | заголовок JSON | выравнивание до 8 байт
+#   | смещения int64[маршрутов + 1] | координаты float64[точек, 2] (широта, долгота)
+# Экспорт: python route_store.py pipe.xlsx -o pipe_routes.bin
+
+MAGIC = b"BDGPIPE1"
+PIPE_PATH = "pipe.xlsx"
+STORE_PATH = "pipe_routes.bin"
+SHEETS = ["ХКЦ", "МГПЗ", "ВГПЗ", "ВяКЦ", "ОГМ", "ВТГМ"]   # Вкладки с координатами маршрутов
+
+
+def read_sheet_routes(xlsx_path, sheet_name):
+    # Маршруты одной вкладки: пары колонок (широта, долгота). Над строкой «Latitude / Longitude»
+    # лежат название маршрута и типоразмер трубы (например «530 х 8»). xlsx_path — путь или открытый pd.ExcelFile.
+    raw = pd.read_excel(xlsx_path, sheet_name=sheet_name, header=None)
+    if raw.empty:
+        return []
+    header_rows = raw.index[raw.iloc[:, 0].astype(str).str.strip().str.lower() == "latitude"]
+    header_row = int(header_rows[0]) if len(header_rows) else -1
+
+    routes = []
+    for col in range(0, raw.shape[1] - 1, 2):
+        name = raw.iat[0, col] if header_row > 0 else f"Маршрут {col // 2 + 1}"
+        label = raw.iat[1, col] if header_row > 1 else None
+        coords = raw.iloc[header_row + 1:, [col, col + 1]].apply(pd.to_numeric, errors="coerce").dropna()
+        if len(coords):
+            routes.append({
+                "name": str(name).strip() if not pd.isna(name) else f"Маршрут {col // 2 + 1}",
+                "label": str(label).strip() if label is not None and not pd.isna(label) else "",
+                "coords": coords.to_numpy(dtype=np.float64),
+            })
+    return routes
+
+
+def export_store(xlsx_path=PIPE_PATH, store_path=STORE_PATH, sheets=SHEETS):
+    # Чтение всех вкладок и запись хранилища (атомарно, через временный файл)
+    # Книга открывается один раз для всех вкладок (pd.read_excel на каждую вкладку разбирает файл заново)
+    with pd.ExcelFile(xlsx_path) as book:
+        sheet_routes = {sheet_name: read_sheet_routes(book, sheet_name) if sheet_name in book.sheet_names else []
+                        for sheet_name in sheets}  # Вкладки, которой нет в файле, — без маршрутов
+
+    sheet_entries, route_entries, arrays = [], [], []
+    for sheet_name, routes in sheet_routes.items():
+        sheet_entries.append({"name": sheet_name, "start": len(route_entries),
+                              "stop": len(route_entries) + len(routes)})
+        for route in routes:
+            route_entries.append({"name": route["name"], "label": route["label"], "sheet": sheet_name})
+            arrays.append(route["coords"])
+
+    sizes = np.array([len(a) for a in arrays], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(sizes))).astype(np.int64)
+    coords = np.concatenate(arrays) if arrays else np.zeros((0, 2))
+
+    header = json.dumps({
+        "version": 1,
+        "source": file_fingerprint(xlsx_path),
+        "sheets": sheet_entries,
+        "routes": route_entries,
+        "points": int(offsets[-1]),
+    }, ensure_ascii=False).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % 8)  # Выравнивание массивов по 8 байт
+
+    tmp_path = store_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(np.uint64(len(header)).tobytes())
+        f.write(header)
+        f.write(offsets.tobytes())
+        f.write(np.ascontiguousarray(coords, dtype=np.float64).tobytes())
+    os.replace(tmp_path, store_path)
+
+
+class RouteStore:
+    # Открытое хранилище: заголовок в памяти, смещения и координаты — memory map
+    def __init__(self, store_path=STORE_PATH):
+        with open(store_path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{store_path}: не хранилище маршрутов")
+            header_len = int(np.frombuffer(f.read(8), dtype=np.uint64)[0])
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        self.path = store_path
+        self.source = header["source"]
+        self.sheets = {entry["name"]: entry for entry in header["sheets"]}
+        self.routes = header["routes"]
+        data_offset = len(MAGIC) + 8 + header_len
+        self.offsets = np.memmap(store_path, dtype=np.int64, mode="r", offset=data_offset,
+                                 shape=(len(self.routes) + 1,))
+        points = header["points"]
+        self.coords = (np.memmap(store_path, dtype=np.float64, mode="r",
+                                 offset=data_offset + self.offsets.nbytes, shape=(points, 2))
+                       if points else np.zeros((0, 2)))
+
+    def route_coords(self, route_no):
+        # Координаты маршрута — срез memory map без копирования
+        return self.coords[self.offsets[route_no]:self.offsets[route_no + 1]]
+
+    def sheet_routes(self, sheet_name):
+        # Маршруты вкладки: список (номер маршрута, описание, координаты)
+        entry = self.sheets.get(sheet_name)
+        if entry is None:
+            return []
+        return [(no, self.routes[no], self.route_coords(no)) for no in range(entry["start"], entry["stop"])]
+
+
+def ensure_store(xlsx_path=PIPE_PATH, store_path=STORE_PATH):
+    # Открывает хранилище; если его нет или pipe.xlsx изменился — сначала пересобирает
+    try:
+        store = RouteStore(store_path)
+        if store.source == file_fingerprint(xlsx_path):
+            return store
+    except (OSError, ValueError, KeyError):
+        pass
+    export_store(xlsx_path, store_path)
+    return RouteStore(store_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Экспорт маршрутов всех вкладок pipe.xlsx в бинарное хранилище")
+    parser.add_argument("xlsx", nargs="?", default=PIPE_PATH, help="Файл с координатами маршрутов")
+    parser.add_argument("-o", "--output", default=STORE_PATH, help="Файл хранилища")
+    args = parser.parse_args()
+
+    export_store(args.xlsx, args.output)
+    store = RouteStore(args.output)
+    print(f"Маршрутов: {len(store.routes)}, точек: {len(store.coords)} → {args.output}")
@@ -0,0 +1,131 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from geodesy import cumulative_lengths
+from hydraulics import REGION_COL, SECTION_COL, solve_profile
+from instrumentation import timed
+from pipe_network import split_section
+
+# Связь участков листа 'pipe' (колонка «Участок») с маршрутами вкладок карты и раскраска маршрутов
+# по результатам гидравлического расчёта.
+#  - Явное сопоставление — таблица MAPPING_PATH: вкладка, маршрут, участок (строки маршрута — в порядке
+#    от начала маршрута); для маршрутов без строк в таблице участок подбирается по имени: имя маршрута
+#    совпадает с началом участка («ДНС-3» → «ДНС-3 УПСВ-3 ХМР - Т7») в регионе вкладки.
+#  - Несколько участков одного маршрута делят его длину пропорционально протяжённости из таблицы.
+#  - Давление и скорость вдоль всех сопоставленных участков считаются одним вызовом solve_profile
+#    и интерполируются в вершины маршрута; раскраска отрезков — по значениям в их концах.
+
+MAPPING_PATH = "route_sections.csv"
+MAPPING_COLUMNS = ["Вкладка", "Маршрут", "Участок"]
+
+METRICS = {
+    "pressure": "Давление (МПа)",
+    "gradient": "Удельные потери давления (МПа/км)",
+    "velocity": "Скорость газа (м/с)",
+}
+
+
+def _name_key(text):
+    # Имя без пробелов, дефисов и регистра: «ДНС-3» и «днс 3» совпадают
+    return re.sub(r"[\s\-]+", "", str(text)).lower()
+
+
+def load_mapping(path=MAPPING_PATH):
+    # Явное сопоставление маршрутов и участков (пустая таблица, если файла нет)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=MAPPING_COLUMNS)
+    return pd.read_csv(path, dtype=str).dropna(subset=MAPPING_COLUMNS)
+
+
+def sheet_region(sections, sheet_name):
+    # Регион вкладки: тот, в участках которого встречается название вкладки (объект приёма газа «ХКЦ», «МГПЗ»)
+    names = sections[SECTION_COL].astype(str)
+    regions = sections.loc[names.str.contains(sheet_name, regex=False), REGION_COL].dropna()
+    return regions.mode().iloc[0] if len(regions) else None
+
+
+def match_routes(routes, sections, sheet_name, mapping=None):
+    # Маршрут вкладки → номера строк sections (участков) в порядке от начала маршрута
+    mapping = load_mapping() if mapping is None else mapping
+    names = sections[SECTION_COL].astype(str).str.strip()
+    explicit = mapping[mapping["Вкладка"] == sheet_name]
+
+    region = sheet_region(sections, sheet_name)
+    start_keys = {}
+    for row, (name, section_region) in enumerate(zip(names, sections[REGION_COL])):
+        pair = split_section(name)
+        if pair is None or section_region != region:
+            continue
+        # Ключи начала участка: всё название начала и его первое слово («ДНС-3 УПСВ-3 ХМР» → «днс3»)
+        for key in {_name_key(pair[0]), _name_key(pair[0].split()[0])}:
+            start_keys.setdefault(key, row)
+
+    result = {}
+    for route in routes:
+        given = explicit.loc[explicit["Маршрут"].str.strip() == route, "Участок"].str.strip()
+        if len(given):
+            rows = [int(np.flatnonzero(names == name)[0]) for name in given if (names == name).any()]
+        else:
+            row = start_keys.get(_name_key(route))
+            rows = [] if row is None else [row]
+        if rows:
+            result[route] = rows
+    return result
+
+
+@timed("section_routes.section_profiles")
+def section_profiles(diameter, length, pressure, flow, t_gas, t_soil=None, density=0.9, points=101, **options):
+    # Давление, скорость и удельные потери на равномерной сетке s = 0…1 вдоль каждого участка,
+    # все участки — одним вызовом solve_profile. Возвращает массивы (участки × points).
+    profile = solve_profile(pressure, np.abs(flow), diameter, length, t_gas, t_soil, density, **options)
+    grid = np.linspace(0.0, 1.0, points)
+    result = {key: np.array([np.interp(grid, profile["s"], row) for row in profile[key]])
+              for key in ("pressure", "velocity")}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result["gradient"] = -np.gradient(result["pressure"], grid, axis=1) / (np.asarray(length)[:, None] / 1000)
+    result["s"] = grid
+    return result
+
+
+def network_profiles(network, nodes, edges, t_gas, t_soil=None, density=0.9, **options):
+    # Профили участков сети по решению NetworkSolver.solve: давление на входе — в узле, откуда идёт газ,
+    # расход — по модулю; у участков с обратным течением профиль разворачивается к направлению участка
+    pressure = nodes["Давление (МПа)"].to_numpy(dtype=float)
+    flow = edges["Расход (тыс. м³/сут)"].to_numpy(dtype=float)
+    reverse = flow < 0
+    inlet = np.where(reverse, pressure[network.end], pressure[network.start])
+    profiles = section_profiles(network.diameter, network.length, inlet, flow, t_gas, t_soil, density, **options)
+    for metric in METRICS:
+        profiles[metric][reverse] = profiles[metric][reverse, ::-1]
+    return profiles
+
+
+def route_values(paths, assignment, section_lengths, profiles):
+    # Значения METRICS в вершинах маршрутов: {индекс маршрута: {метрика: массив по вершинам}}.
+    # assignment — {индекс маршрута: номера участков (строк profiles) по порядку}.
+    along = cumulative_lengths([paths[no] for no in assignment])
+    result = {}
+    for (no, rows), distance in zip(assignment.items(), along):
+        fraction = distance / distance[-1] if len(distance) and distance[-1] > 0 else np.zeros(len(distance))
+        bounds = np.concatenate(([0.0], np.cumsum(section_lengths[rows])))
+        bounds = bounds / bounds[-1]
+        # Номер участка и относительная координата в нём для каждой вершины
+        part = np.clip(np.searchsorted(bounds, fraction, side="right") - 1, 0, len(rows) - 1)
+        local = (fraction - bounds[part]) / (bounds[part + 1] - bounds[part])
+        values = {metric: np.full(len(distance), np.nan) for metric in METRICS}
+        for k, row in enumerate(rows):
+            inside = part == k
+            for metric in METRICS:
+                values[metric][inside] = np.interp(local[inside], profiles["s"], profiles[metric][row])
+        result[no] = values
+    return result
+
+
+def segment_values(vertex_values, keep=None):
+    # Значение на отрезках (среднее по концам) для вершин keep (маска упрощённой линии)
+    values = vertex_values if keep is None else vertex_values[keep]
+    return (values[:-1] + values[1:]) / 2
+
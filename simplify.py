@@ -0,0 +1,66 @@
+import numpy as np
+
+# Упрощение полилиний маршрутов (Дуглас — Пекер) с уровнями детализации по масштабу карты.
+# Для каждой вершины один раз считается «значимость» — допуск в метрах, при котором вершина ещё
+# сохраняется. Упрощение для любого масштаба — это отбор вершин со значимостью больше допуска,
+# без повторного прохода алгоритма. Длины маршрутов по-прежнему считаются по полной геометрии.
+
+EARTH_RADIUS_M = 6371008.8
+TILE_METERS_PER_PIXEL = 156543.03392   # Метров в пикселе на экваторе при масштабе 0 (тайлы 256 px)
+PIXEL_TOLERANCE = 1.0                  # Допуск упрощения в пикселях экрана
+
+
+def _project(coords):
+    # Локальная равнопромежуточная проекция (широта, долгота) → метры
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    lat0 = np.radians(coords[:, 0].mean()) if len(coords) else 0.0
+    x = EARTH_RADIUS_M * np.radians(coords[:, 1]) * np.cos(lat0)
+    y = EARTH_RADIUS_M * np.radians(coords[:, 0])
+    return np.column_stack([x, y])
+
+
+def _distances_to_segment(points, a, b):
+    # Расстояния от точек до отрезка a–b, м
+    ab = b - a
+    length2 = ab @ ab
+    if length2 == 0:
+        return np.hypot(*(points - a).T)
+    t = np.clip((points - a) @ ab / length2, 0.0, 1.0)
+    return np.hypot(*(points - (a + t[:, None] * ab)).T)
+
+
+def vertex_importance(coords):
+    # Значимость вершин по Дугласу — Пекеру, м. Концы маршрута всегда сохраняются (inf).
+    # Значимость дочерней вершины не больше родительской, поэтому уровни детализации вложены.
+    xy = _project(coords)
+    n = len(xy)
+    importance = np.zeros(n)
+    if n == 0:
+        return importance
+    importance[[0, -1]] = np.inf
+
+    stack = [(0, n - 1, np.inf)]
+    while stack:
+        i, j, parent = stack.pop()
+        if j - i < 2:
+            continue
+        distances = _distances_to_segment(xy[i + 1:j], xy[i], xy[j])
+        k = i + 1 + int(np.argmax(distances))
+        value = min(distances[k - i - 1], parent)
+        importance[k] = value
+        stack.append((i, k, value))
+        stack.append((k, j, value))
+    return importance
+
+
+def tolerance_for_zoom(zoom, lat, pixels=PIXEL_TOLERANCE):
+    # Допуск упрощения в метрах для масштаба карты zoom на широте lat
+    return pixels * TILE_METERS_PER_PIXEL * np.cos(np.radians(lat)) / 2 ** zoom
+
+
+def simplify(coords, importance, tolerance):
+    # Вершины маршрута со значимостью больше допуска (м); tolerance=0 — полная геометрия
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if tolerance <= 0:
+        return coords
+    return coords[np.asarray(importance) > tolerance]
@@ -0,0 +1,159 @@
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from geodesy import EARTH_RADIUS_KM, cumulative_lengths, vincenty
+from instrumentation import timed
+
+# Пространственный индекс отрезков маршрутов: ближайшая ветка к точке (щелчок по карте, место
+# инцидента, точка отбора проб), расстояние до трубы и расстояние вдоль ветки от её начала.
+# Координаты переводятся в плоские (км, равнопромежуточная проекция около средней широты),
+# по началам и серединам отрезков строятся KD-деревья (scipy.spatial.cKDTree):
+#  - ближайшее начало отрезка даёт верхнюю оценку d расстояния до ближайшего отрезка;
+#  - любой отрезок ближе d лежит серединой в круге радиуса d + половина самого длинного отрезка;
+#  - среди этих кандидатов расстояние до отрезка считается точно, для всех точек запроса разом.
+# Итоговое расстояние до найденной точки на трубе — по эллипсоиду WGS-84 (Винсенти).
+# Привязка точек из файла: python spatial_index.py coords_nsk.xlsx -o привязка.xlsx
+
+LAT_NAMES = ["широта", "latitude", "lat"]
+LON_NAMES = ["долгота", "longitude", "lon", "lng"]
+
+
+class SegmentIndex:
+    def __init__(self, paths, routes=None):
+        # paths — координаты маршрутов [точек × 2] (широта, долгота); routes — их описания
+        # (словари с "name", "label", "sheet"), по умолчанию — «Маршрут N»
+        from scipy.spatial import cKDTree  # scipy нужен только при построении индекса
+
+        arrays = [np.asarray(path, dtype=float).reshape(-1, 2) for path in paths]
+        self.routes = list(routes) if routes is not None else [{"name": f"Маршрут {i + 1}"} for i in range(len(arrays))]
+        sizes = np.array([len(a) for a in arrays], dtype=np.int64)
+        self.coords = np.concatenate(arrays) if arrays else np.zeros((0, 2))
+        self.lat0 = float(self.coords[:, 0].mean()) if len(self.coords) else 0.0
+        # Накопленная длина вдоль маршрута в каждой точке, км (по эллипсоиду)
+        self.along = np.concatenate(cumulative_lengths(arrays)) if arrays else np.zeros(0)
+
+        # Отрезки — пары соседних точек одного маршрута (номер отрезка = номер его начальной точки)
+        route_of_point = np.repeat(np.arange(len(arrays)), sizes)
+        self.start = np.nonzero(route_of_point[:-1] == route_of_point[1:])[0]
+        self.route = route_of_point[self.start]
+        xy = self._project(self.coords)
+        self._a = xy[self.start]
+        self._ab = xy[self.start + 1] - self._a
+        self._ab2 = np.einsum("ij,ij->i", self._ab, self._ab)
+        self._reach = float(np.sqrt(self._ab2.max()) / 2) if len(self.start) else 0.0
+        self._starts = cKDTree(self._a) if len(self.start) else None
+        self._middles = cKDTree(self._a + self._ab / 2) if len(self.start) else None
+
+    @classmethod
+    def from_store(cls, store, sheets=None):
+        # Индекс по хранилищу маршрутов (route_store): по выбранным вкладкам или по всем
+        numbers = [no for name, entry in store.sheets.items() if sheets is None or name in sheets
+                   for no in range(entry["start"], entry["stop"])]
+        return cls([store.route_coords(no) for no in numbers], [store.routes[no] for no in numbers])
+
+    def __len__(self):
+        return len(self.start)
+
+    def _project(self, coords):
+        # (широта, долгота) → плоские координаты, км
+        rad = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+        return np.column_stack([EARTH_RADIUS_KM * np.cos(np.radians(self.lat0)) * rad[:, 1],
+                                EARTH_RADIUS_KM * rad[:, 0]])
+
+    def _unproject(self, xy):
+        return np.column_stack([np.degrees(xy[:, 1] / EARTH_RADIUS_KM),
+                                np.degrees(xy[:, 0] / (EARTH_RADIUS_KM * np.cos(np.radians(self.lat0))))])
+
+    @timed("spatial_index.nearest")
+    def nearest(self, lat, lon):
+        # Ближайший отрезок для каждой точки (числа или массивы). Возвращает массивы:
+        # route — номер маршрута в индексе (-1, если индекс пуст), segment — номер начальной точки отрезка,
+        # distance — до трубы, км; along — от начала маршрута до ближайшей точки на трубе, км;
+        # lat, lon — ближайшая точка на трубе
+        lat, lon = np.broadcast_arrays(np.atleast_1d(np.asarray(lat, dtype=float)),
+                                       np.atleast_1d(np.asarray(lon, dtype=float)))
+        query = np.column_stack([lat.ravel(), lon.ravel()])
+        count = len(query)
+        result = {"route": np.full(count, -1), "segment": np.full(count, -1),
+                  **{key: np.full(count, np.nan) for key in ("distance", "along", "lat", "lon")}}
+        valid = np.isfinite(query).all(axis=1)
+        if self._starts is None or not valid.any():
+            return result
+
+        q = self._project(query[valid])
+        bound, _ = self._starts.query(q)
+        candidates = self._middles.query_ball_point(q, bound + self._reach + 1e-9)
+        owner = np.repeat(np.arange(len(q)), [len(c) for c in candidates])
+        segment = np.concatenate(candidates).astype(np.int64)
+
+        # Проекция точки на отрезок (параметр t ∈ [0, 1]) и расстояние до неё
+        ap = q[owner] - self._a[segment]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            t = np.clip(np.einsum("ij,ij->i", ap, self._ab[segment]) / self._ab2[segment], 0.0, 1.0)
+        t = np.nan_to_num(t)  # Отрезок нулевой длины (повторённая точка)
+        gap = np.hypot(*(ap - t[:, None] * self._ab[segment]).T)
+
+        # Для каждой точки запроса — кандидат с наименьшим расстоянием
+        order = np.lexsort((gap, owner))
+        best = order[np.r_[True, owner[order][1:] != owner[order][:-1]]]
+        segment, t = segment[best], t[best]
+        foot = self._unproject(self._a[segment] + t[:, None] * self._ab[segment])
+        first = self.start[segment]
+
+        result["route"][valid] = self.route[segment]
+        result["segment"][valid] = first
+        result["distance"][valid] = vincenty(query[valid, 0], query[valid, 1], foot[:, 0], foot[:, 1])
+        result["along"][valid] = self.along[first] + t * (self.along[first + 1] - self.along[first])
+        result["lat"][valid], result["lon"][valid] = foot[:, 0], foot[:, 1]
+        return result
+
+
+def read_points(path):
+    # Точки из таблицы (xlsx/csv) с колонками широты и долготы (Latitude/Longitude или Широта/Долгота);
+    # остальные колонки сохраняются, строки без координат отбрасываются
+    points = pd.read_csv(path) if str(getattr(path, "name", path)).lower().endswith(".csv") else pd.read_excel(path)
+    names = {str(col).strip().lower(): col for col in points.columns}
+    lat_col = next((names[name] for name in LAT_NAMES if name in names), None)
+    lon_col = next((names[name] for name in LON_NAMES if name in names), None)
+    if lat_col is None or lon_col is None:
+        raise ValueError("В таблице нет колонок широты и долготы (Latitude / Longitude)")
+    points = points.rename(columns={lat_col: "Широта", lon_col: "Долгота"})
+    points[["Широта", "Долгота"]] = points[["Широта", "Долгота"]].apply(pd.to_numeric, errors="coerce")
+    return points.dropna(subset=["Широта", "Долгота"]).reset_index(drop=True)
+
+
+def link_points(index, points, max_distance=None):
+    # Привязка точек (колонки «Широта», «Долгота») к ближайшей ветке.
+    # Точки дальше max_distance (км) от всех труб остаются без ветки.
+    found = index.nearest(points["Широта"].to_numpy(), points["Долгота"].to_numpy())
+    linked = found["route"] >= 0
+    if max_distance is not None:
+        linked &= found["distance"] <= max_distance
+    routes = [index.routes[no] if ok else {} for no, ok in zip(found["route"], linked)]
+    result = points.copy()
+    result["Вкладка"] = [route.get("sheet") for route in routes]
+    result["Ветка"] = [route.get("name") for route in routes]
+    result["Расстояние до трубы (м)"] = np.where(linked, found["distance"] * 1000, np.nan)
+    result["От начала ветки (км)"] = np.where(linked, found["along"], np.nan)
+    result["Широта на трубе"] = np.where(linked, found["lat"], np.nan)
+    result["Долгота на трубе"] = np.where(linked, found["lon"], np.nan)
+    return result
+
+
+if __name__ == "__main__":
+    from route_store import PIPE_PATH, ensure_store
+
+    parser = argparse.ArgumentParser(description="Привязка точек (отбор проб, инциденты) к ближайшей ветке трубопровода")
+    parser.add_argument("points", help="Таблица точек (xlsx/csv) с колонками Latitude / Longitude")
+    parser.add_argument("--pipe", default=PIPE_PATH, help="Файл с координатами маршрутов")
+    parser.add_argument("--sheet", action="append", help="Только эта вкладка (можно несколько раз)")
+    parser.add_argument("--max-distance", type=float, help="Не привязывать точки дальше, км")
+    parser.add_argument("-o", "--output", default="привязка_точек.xlsx", help="Итоговый Excel-файл")
+    args = parser.parse_args()
+
+    index = SegmentIndex.from_store(ensure_store(args.pipe), args.sheet)
+    result = link_points(index, read_points(args.points), args.max_distance)
+    result.to_excel(args.output, index=False)
+    print(f"Точек: {len(result)}, привязано: {result['Ветка'].notna().sum()} → {args.output}")
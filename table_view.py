@@ -0,0 +1,78 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from instrumentation import cached
+
+# Постраничный вывод таблиц результатов. В браузер уходит только видимая страница строк;
+# поиск и сортировка выполняются на сервере, а порядок строк кэшируется (общий для всех сессий кэш)
+# по ключу выборки, колонке сортировки и строке поиска. Внизу — число строк и сводка по числовым колонкам.
+
+PAGE_SIZES = [25, 50, 100, 250]
+CACHE_ENTRIES = 128
+
+
+def frame_key(df):
+    # Отпечаток таблицы — когда ключ выборки не передан
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()
+
+
+@cached("table_view.row_order", st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False))
+def row_order(key, sort_column, ascending, query, _df):
+    # Позиции строк после поиска (подстрока без учёта регистра в любой колонке) и сортировки.
+    # Ключ кэша — key, колонка, направление и строка поиска; сама таблица (_df) не хэшируется.
+    positions = np.arange(len(_df))
+    if query:
+        text = _df.astype(str).apply(lambda column: column.str.lower())
+        mask = np.zeros(len(_df), dtype=bool)
+        for column in text.columns:
+            mask |= text[column].str.contains(query.lower(), regex=False).to_numpy()
+        positions = positions[mask]
+    if sort_column:
+        values = _df[sort_column].iloc[positions].reset_index(drop=True)
+        order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+        positions = positions[order]
+    return positions
+
+
+def summary(df, columns):
+    # Сводка по числовым колонкам: количество значений, среднее, минимум, максимум
+    numeric = df[[col for col in columns if pd.api.types.is_numeric_dtype(df[col])]]
+    return pd.DataFrame({
+        "Значений": numeric.count(),
+        "Среднее": numeric.mean(),
+        "Минимум": numeric.min(),
+        "Максимум": numeric.max(),
+    }).round(2)
+
+
+def show_table(df, key, summary_columns=None, data_key=None):
+    # Таблица df со страницами, поиском и сортировкой; key — префикс ключей виджетов,
+    # data_key — отпечаток выборки для кэша порядка строк (по умолчанию — хэш таблицы)
+    data_key = data_key or frame_key(df)
+
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    query = col1.text_input("Поиск:", key=f"{key}_query").strip()
+    sort_column = col2.selectbox("Сортировка:", [None] + list(df.columns), key=f"{key}_sort",
+                                 format_func=lambda column: "—" if column is None else column)
+    ascending = col3.radio("Порядок:", ["↑", "↓"], key=f"{key}_ascending", horizontal=True) == "↑"
+    page_size = col4.selectbox("Строк:", PAGE_SIZES, key=f"{key}_page_size")
+
+    positions = row_order(data_key, sort_column, ascending, query, df)
+    pages = max(1, -(-len(positions) // page_size))
+    page = st.number_input("Страница:", min_value=1, max_value=pages, value=1, step=1, key=f"{key}_page") \
+        if pages > 1 else 1
+    page = min(int(page), pages)
+    start = (page - 1) * page_size
+
+    st.dataframe(df.iloc[positions[start:start + page_size]], width="stretch", hide_index=True)
+
+    # Подвал: число строк и сводка по отобранным (не только видимым) строкам
+    shown = min(start + page_size, len(positions))
+    st.caption(f"Строки {start + 1 if len(positions) else 0}–{shown} из {len(positions)}"
+               + (f" (найдено по «{query}», всего {len(df)})" if query else "")
+               + f" · страница {page} из {pages}")
+    if summary_columns:
+        st.dataframe(summary(df.iloc[positions], summary_columns), width="stretch")
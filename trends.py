@@ -0,0 +1,180 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from composition import compute_fractions, CH4, C3PLUS, C5PLUS
+from grid_index import LEVELS
+from instrumentation import timed
+
+# Динамика состава газа по дате протокола.
+# Хранятся суточные агрегаты (число, сумма, сумма квадратов, минимум, максимум) каждой величины
+# для группы Месторождение → ДНС → Ступень отбора. Новые протоколы добавляются инкрементально:
+# агрегируются только новые строки, а затем сливаются с агрегатами затронутых групп и дат.
+# Недели, месяцы, кварталы и скользящие окна собираются из суточных агрегатов без обращения к протоколам.
+
+DATE = "Дата протокола"
+DENSITY = "Плотность реального газа"
+METRICS = [CH4, C3PLUS, C5PLUS, DENSITY]
+METRIC_NAMES = {
+    CH4: "Метан, %",
+    C3PLUS: "С₃+в., г/м³",
+    C5PLUS: "С₅+в., г/м³",
+    DENSITY: "Плотность газа, кг/м³",
+}
+FREQUENCIES = {"W": "Неделя", "M": "Месяц", "Q": "Квартал", "Y": "Год"}
+STATS = ["count", "sum", "sumsq", "min", "max"]
+KEY_COLUMNS = ["Номер протокола", DATE, *LEVELS, "Объект"]  # Строка протокола однозначно по этим колонкам
+MISSING = "—"  # Пустое значение уровня (например, не указана ступень отбора)
+
+
+def row_keys(df):
+    # Хэш строки протокола по ключевым колонкам — по нему отличаются уже учтённые строки
+    columns = [col for col in KEY_COLUMNS if col in df.columns]
+    return pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+
+
+def metric_frame(df):
+    # Уровни группы, дата (сутки) и величины динамики; строки без даты не учитываются
+    fractions = compute_fractions(df)
+    frame = pd.DataFrame(index=df.index)
+    for level in LEVELS:
+        values = df[level].astype(object) if level in df.columns else pd.Series(np.nan, index=df.index)
+        frame[level] = values.where(values.notna(), MISSING)
+    frame[DATE] = pd.to_datetime(df[DATE], errors="coerce").dt.normalize()
+    for metric in (CH4, C3PLUS, C5PLUS):
+        frame[metric] = fractions[metric]
+    frame[DENSITY] = pd.to_numeric(df[DENSITY], errors="coerce") if DENSITY in df.columns else np.nan
+    return frame[frame[DATE].notna()]
+
+
+def _aggregate(frame, keys):
+    # Агрегаты величин по ключам; колонки — (статистика, величина)
+    values = frame[METRICS]
+    grouped = values.groupby([frame[key] for key in keys], sort=False)
+    return pd.concat({
+        "count": grouped.count(),
+        "sum": grouped.sum(),
+        "sumsq": (values ** 2).groupby([frame[key] for key in keys], sort=False).sum(),
+        "min": grouped.min(),
+        "max": grouped.max(),
+    }, axis=1)
+
+
+def _merge(old, new):
+    # Слияние агрегатов одних и тех же ключей: суммы складываются, экстремумы — по fmin/fmax (NaN не мешает)
+    return pd.concat({
+        "count": old["count"] + new["count"],
+        "sum": old["sum"] + new["sum"],
+        "sumsq": old["sumsq"] + new["sumsq"],
+        "min": np.fmin(old["min"], new["min"]),
+        "max": np.fmax(old["max"], new["max"]),
+    }, axis=1)
+
+
+class TrendAggregates:
+    # Суточные агрегаты по группам. Один экземпляр на процесс (общий для сессий), изменения — под блокировкой;
+    # таблица агрегатов при обновлении заменяется целиком, поэтому читатели видят согласованный снимок.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.table = None         # Индекс: LEVELS + DATE, колонки: (STATS, METRICS)
+        self._keys = np.empty(0, dtype=np.uint64)
+        self.digest = None        # Отпечаток последнего синхронизированного набора данных
+        self.version = 0
+
+    def update(self, df):
+        # Добавляет новые строки протоколов (уже учтённые пропускаются); возвращает затронутые группы
+        with self._lock:
+            return self._update(df, row_keys(df))
+
+    def _update(self, df, keys):
+        new = ~np.isin(keys, self._keys) & ~pd.Series(keys).duplicated().to_numpy()
+        if not new.any():
+            return []
+        part = _aggregate(metric_frame(df[new]), LEVELS + [DATE])
+        table = self.table
+        if table is None:
+            table = part
+        else:
+            common = part.index.intersection(table.index)
+            fresh = part.index.difference(table.index)
+            pieces = [table.drop(common), part.loc[fresh]]
+            if len(common):
+                pieces.append(_merge(table.loc[common], part.loc[common]))
+            table = pd.concat(pieces)
+        self.table = table.sort_index()
+        self._keys = np.union1d(self._keys, keys[new])
+        self.version += 1
+        return list(part.index.droplevel(DATE).unique())
+
+    @timed("trends.sync")
+    def sync(self, df, digest):
+        # Приводит агрегаты к набору данных df. Если в нём пропали учтённые строки (файл заменён, а не дополнен),
+        # агрегаты пересчитываются заново; иначе добавляются только новые строки.
+        with self._lock:
+            if digest == self.digest:
+                return []
+            keys = row_keys(df)
+            if not np.isin(self._keys, keys).all():
+                self.reset()
+            groups = self._update(df, keys)
+            self.digest = digest
+            return groups
+
+    def series(self, metric, selection=None, freq="M", window=3, by=None):
+        # Ряд величины metric по периодам freq для выбора selection ({уровень: значения}, пусто — все);
+        # by — уровень, по значениям которого строятся отдельные ряды. Скользящее среднее — по window
+        # последним периодам (взвешенное числом протоколов; периоды без протоколов входят в окно).
+        columns = ([by] if by else []) + ["Период", "Протоколов", "Среднее", "Минимум", "Максимум",
+                                          "Ст. откл.", "Скользящее среднее"]
+        table = self.table
+        if table is None:
+            return pd.DataFrame(columns=columns)
+        mask = np.ones(len(table), dtype=bool)
+        for level, values in (selection or {}).items():
+            if values and level in table.index.names:
+                mask &= table.index.isin(values, level=level)
+        part = table[mask]
+        part = part[part[("count", metric)] > 0]
+        if part.empty:
+            return pd.DataFrame(columns=columns)
+
+        periods = part.index.get_level_values(DATE).to_period(freq)
+        keys = ([part.index.get_level_values(by)] if by else []) + [periods]
+        stats = part.xs(metric, axis=1, level=1)
+        grouped = stats.groupby(keys)
+        totals = grouped[["count", "sum", "sumsq"]].sum()
+        totals["min"] = grouped["min"].min()
+        totals["max"] = grouped["max"].max()
+
+        # Полный ряд периодов (от первого до последнего протокола группы) — чтобы окно считалось
+        # по времени, а не по строкам
+        if by:
+            spans = totals.index.to_frame(index=False).groupby(by, sort=False)[DATE].agg(["min", "max"])
+            full = pd.MultiIndex.from_tuples([(group, period) for group, first, last in spans.itertuples()
+                                              for period in pd.period_range(first, last, freq=freq)])
+        else:
+            full = pd.period_range(periods.min(), periods.max(), freq=freq)
+        totals = totals.reindex(full)
+        count = totals["count"].fillna(0)
+        total = totals["sum"].fillna(0)
+        rolling = (lambda s: s.groupby(level=0).transform(lambda g: g.rolling(window, min_periods=1).sum())) \
+            if by else (lambda s: s.rolling(window, min_periods=1).sum())
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            variance = (totals["sumsq"] - total * mean) / (count - 1)
+            result = pd.DataFrame({
+                "Протоколов": count.astype(int),
+                "Среднее": mean,
+                "Минимум": totals["min"],
+                "Максимум": totals["max"],
+                "Ст. откл.": np.sqrt(variance.clip(lower=0)).where(count > 1),
+                "Скользящее среднее": rolling(total) / rolling(count),
+            })
+        result = result.reset_index(names=([by] if by else []) + ["Период"])
+        result["Период"] = result["Период"].dt.to_timestamp()
+        return result[columns]
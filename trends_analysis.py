@@ -0,0 +1,48 @@
+import streamlit as st
+
+from data_store import load_grid, store_revision
+from grid_index import LEVELS
+from table_view import show_table  # Постраничный вывод таблиц
+from trends import TrendAggregates, METRICS, METRIC_NAMES, FREQUENCIES
+
+
+@st.cache_resource
+def trend_aggregates():
+    # Суточные агрегаты динамики — один экземпляр на процесс; после загрузки выгрузки в базу
+    # досчитываются только новые протоколы
+    return TrendAggregates()
+
+
+def run():
+    selection = st.session_state.get("filter_selection", {})
+    aggregates = trend_aggregates()
+    aggregates.sync(load_grid(), store_revision())
+
+    st.subheader("Динамика состава газа")
+
+    col1, col2, col3, col4 = st.columns(4)
+    metric = col1.selectbox("Показатель:", METRICS, format_func=METRIC_NAMES.get, key="trend_metric")
+    freq = col2.selectbox("Период:", list(FREQUENCIES), index=1, format_func=FREQUENCIES.get, key="trend_freq")
+    window = col3.number_input("Окно скользящего среднего (периодов):", min_value=1, max_value=24, value=3,
+                               key="trend_window")
+    by = col4.selectbox("Разбивка:", [None] + LEVELS, key="trend_by",
+                        format_func=lambda level: "Без разбивки" if level is None else level)
+
+    series = aggregates.series(metric, selection, freq, int(window), by)
+    if series.empty:
+        st.warning("Нет протоколов с датой для выбранных фильтров.")
+        return
+    st.info(f"🔢 Протоколов в ряду: {series['Протоколов'].sum()}")
+
+    # График: скользящее среднее (по одному ряду на значение разбивки)
+    st.markdown(f"### 📈 {METRIC_NAMES[metric]} — скользящее среднее за {int(window)} пер.")
+    if by:
+        chart = series.pivot(index="Период", columns=by, values="Скользящее среднее")
+    else:
+        chart = series.set_index("Период")[["Среднее", "Скользящее среднее"]]
+    st.line_chart(chart)
+
+    # Таблица по периодам
+    table = series.assign(**series.select_dtypes("float").round(3))
+    show_table(table, key="trend_table", summary_columns=["Протоколов", "Среднее"],
+               data_key=f"{st.session_state.get('filter_key')}:{aggregates.version}:{metric}:{freq}:{window}:{by}")